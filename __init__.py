@@ -7,17 +7,27 @@ Description: A ComfyUI plugin that parses Civitai image metadata and generates w
 
 from .nodes.metadata_parser import MetadataParserNode
 from .nodes.workflow_generator import WorkflowGeneratorNode
+from .nodes.workflow_merge import WorkflowMergeNode
+from .nodes.workflow_sweep import WorkflowSweepNode
+from .nodes.server_routes import register_routes
 
 NODE_CLASS_MAPPINGS = {
     "MetadataParserNode": MetadataParserNode,
     "WorkflowGeneratorNode": WorkflowGeneratorNode,
+    "WorkflowSweepNode": WorkflowSweepNode,
+    "WorkflowMergeNode": WorkflowMergeNode,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "MetadataParserNode": "Metadata Parser",
     "WorkflowGeneratorNode": "Workflow Generator",
+    "WorkflowSweepNode": "Workflow Sweep",
+    "WorkflowMergeNode": "Workflow Merge",
 }
 
 WEB_DIRECTORY = "./js"
 
+# POST /metadata2workflow/convert, only when loaded by a running ComfyUI server
+register_routes()
+
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS', 'WEB_DIRECTORY']
\ No newline at end of file
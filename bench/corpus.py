@@ -0,0 +1,153 @@
+"""
+Reproducible synthetic Civitai metadata for the benchmarks
+
+Every case is generated from a seeded random.Random, so the same seed
+yields byte-identical texts on every machine and Python version.
+"""
+
+import random
+from typing import List, Tuple
+
+# Prompt lengths in comma-separated tokens
+PROMPT_LENGTHS = {"short": 12, "medium": 75, "long": 400}
+
+LORA_COUNTS = (0, 5, 50)
+
+# Parameter densities: which optional fields follow the required Steps line
+PARAM_DENSITIES = ("minimal", "full", "extras")
+
+_WORDS = (
+    "masterpiece", "best quality", "1girl", "solo", "detailed face", "beautiful eyes", "long hair",
+    "cinematic lighting", "depth of field", "sunset", "city street", "rain", "neon", "portrait",
+    "highly detailed", "sharp focus", "octane render", "film grain", "bokeh", "wide shot",
+)
+
+_SAMPLERS = ("Euler a", "Euler", "DPM++ 2M", "DPM++ 2M Karras", "DPM++ SDE Karras", "DDIM", "UniPC")
+
+_SCHEDULERS = ("Karras", "Exponential", "SGM Uniform", "Normal")
+
+
+def _prompt(rng: random.Random, length: int) -> str:
+    """
+    Comma-separated prompt tokens, some with attention weights
+    """
+    tokens = []
+    for _ in range(length):
+        word = rng.choice(_WORDS)
+        if rng.random() < 0.25:
+            word = f"({word}:{rng.uniform(0.5, 1.5):.1f})"
+        tokens.append(word)
+    return ", ".join(tokens)
+
+
+def _lora_tag(rng: random.Random, index: int) -> str:
+    """
+    One extra network tag in any of the supported forms
+    """
+    name = f"lora_{index:02d}_v{rng.randint(1, 9)}"
+    form = rng.randrange(6)
+    if form == 0:
+        return f"<lora:{name}>"
+    if form == 1:
+        return f"<lora:{name}:{rng.uniform(0.2, 1.2):.2f}>"
+    if form == 2:
+        return f"<lora:{name}:{rng.uniform(0.2, 1.2):.2f}:{rng.uniform(0.2, 1.2):.2f}>"
+    if form == 3:
+        return f"<lora:{name}:te={rng.uniform(0.2, 1.2):.2f}:unet={rng.uniform(0.2, 1.2):.2f}>"
+    if form == 4:
+        return f"<lyco:{name}:{rng.uniform(0.2, 1.2):.2f}>"
+    return f"<hypernet:{name}:{rng.uniform(0.2, 1.2):.2f}>"
+
+
+def _positive_prompt(rng: random.Random, length: int, lora_count: int) -> str:
+    """
+    Prompt with LoRA tags scattered between the tokens
+    """
+    tokens = _prompt(rng, length).split(", ")
+    for i in range(lora_count):
+        tokens.insert(rng.randint(0, len(tokens)), _lora_tag(rng, i))
+    return ", ".join(tokens)
+
+
+def _parameters(rng: random.Random, density: str) -> str:
+    """
+    The "Steps: ..." parameter line
+    """
+    params = [
+        f"Steps: {rng.randint(10, 60)}",
+        f"Sampler: {rng.choice(_SAMPLERS)}",
+        f"CFG scale: {rng.choice((4, 5.5, 7, 7.5, 9))}",
+        f"Seed: {rng.randint(0, 2 ** 32 - 1)}",
+        f"Size: {rng.choice((512, 768, 832, 1024))}x{rng.choice((512, 768, 1216, 1024))}",
+    ]
+    
+    if density in ("full", "extras"):
+        params += [
+            f"Schedule type: {rng.choice(_SCHEDULERS)}",
+            f"Model hash: {rng.getrandbits(40):010x}",
+            "Model: realisticVisionV51",
+            "VAE: sdxl_vae.safetensors",
+            f"Clip skip: {rng.randint(1, 2)}",
+            f"Denoising strength: {rng.uniform(0.2, 0.8):.2f}",
+        ]
+    
+    if density == "extras":
+        params += [
+            "Hires upscale: 2",
+            "Hires steps: 15",
+            "Hires upscaler: 4x-UltraSharp",
+            "ADetailer model: face_yolov8n.pt",
+            "ADetailer confidence: 0.3",
+            f'Lora hashes: "{", ".join(f"lora_{i:02d}: {rng.getrandbits(48):012x}" for i in range(5))}"',
+            "Version: v1.9.4",
+        ]
+    
+    return ", ".join(params)
+
+
+def generate_metadata(rng: random.Random, prompt_length: int, lora_count: int, density: str) -> str:
+    """
+    One A1111-style metadata text
+    """
+    return "\n".join((
+        _positive_prompt(rng, prompt_length, lora_count),
+        "Negative prompt: " + _prompt(rng, max(4, prompt_length // 4)),
+        _parameters(rng, density),
+    ))
+
+
+def edge_cases(rng: random.Random) -> List[Tuple[str, str]]:
+    """
+    Inputs that stress the section boundaries and the tag scanner
+    """
+    prompt = _prompt(rng, 75)
+    return [
+        ("edge/empty", ""),
+        ("edge/prompt_only", prompt),
+        ("edge/unterminated_negative", prompt + "\nNegative prompt: " + _prompt(rng, 40)),
+        ("edge/params_only", _parameters(rng, "extras")),
+        ("edge/no_negative", prompt + "\n" + _parameters(rng, "full")),
+        ("edge/unclosed_tags", ", ".join(f"<lora:broken_{i}:0.5" for i in range(50)) + "\n" + _parameters(rng, "minimal")),
+        ("edge/repeated_labels", "\n".join(
+            f"Negative prompt: {prompt}\nSteps: {i}, Sampler: Euler" for i in range(20)
+        )),
+        ("edge/comma_runs", (" ,  , ".join(_prompt(rng, 5) for _ in range(80))) + "\n" + _parameters(rng, "minimal")),
+    ]
+
+
+def build_corpus(seed: int = 0) -> List[Tuple[str, str]]:
+    """
+    Return (case_name, metadata_text) pairs for every prompt length x LoRA
+    count x parameter density combination, followed by the edge cases
+    """
+    rng = random.Random(seed)
+    corpus = []
+    
+    for length_name, length in PROMPT_LENGTHS.items():
+        for lora_count in LORA_COUNTS:
+            for density in PARAM_DENSITIES:
+                name = f"{length_name}/loras={lora_count}/{density}"
+                corpus.append((name, generate_metadata(rng, length, lora_count, density)))
+    
+    corpus.extend(edge_cases(rng))
+    return corpus
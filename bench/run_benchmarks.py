@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the parser and workflow generator hot paths
+
+Times MetadataParserNode.parse_metadata, _extract_loras_from_prompt and
+every WorkflowGeneratorNode template on the synthetic corpus from
+bench/corpus.py, and writes the results to JSON so runs from different
+commits can be compared:
+
+    python bench/run_benchmarks.py -o before.json
+    python bench/run_benchmarks.py -o after.json --compare before.json
+
+--compare exits with status 1 when a benchmark's median got slower than
+the --threshold ratio allows.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from corpus import build_corpus
+from nodes.metadata_parser import MetadataParserNode
+from nodes.parse_cache import configure_parse_cache
+from nodes.workflow_generator import WorkflowGeneratorNode
+
+TEMPLATES = ("basic", "advanced", "img2img")
+
+# End of the positive prompt section, as the parser finds it
+_SECTION_END_RE = re.compile(r'Negative prompt:|Steps:', re.IGNORECASE)
+
+# Corpus cases the generator templates are timed on
+GENERATOR_CASES = ("medium/loras=0/full", "medium/loras=5/full", "medium/loras=50/full")
+
+
+def time_call(fn: Callable[[], Any], rounds: int, min_time: float) -> Dict[str, Any]:
+    """
+    Time fn, calibrating the iterations so one round takes at least min_time
+    
+    Returns per-call statistics in microseconds over the rounds.
+    """
+    iterations = 1
+    while True:
+        elapsed = _run(fn, iterations)
+        if elapsed >= min_time:
+            break
+        iterations *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    
+    samples = [_run(fn, iterations) / iterations * 1e6 for _ in range(rounds)]
+    
+    return {
+        "rounds": rounds,
+        "iterations": iterations,
+        "min_us": min(samples),
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.mean(samples),
+        "stdev_us": statistics.stdev(samples) if rounds > 1 else 0.0,
+    }
+
+
+def _run(fn: Callable[[], Any], iterations: int) -> float:
+    """
+    Call fn iterations times with the garbage collector off, like timeit
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def collect_benchmarks(seed: int) -> List[Dict[str, Any]]:
+    """
+    Build the (benchmark, case, callable) list from the corpus
+    """
+    parser = MetadataParserNode()
+    generator = WorkflowGeneratorNode()
+    corpus = build_corpus(seed)
+    benchmarks = []
+    
+    for case, text in corpus:
+        benchmarks.append({
+            "benchmark": "parse_metadata",
+            "case": case,
+            "size": len(text),
+            "fn": lambda text=text: parser.parse_metadata(text, True),
+        })
+    
+    for case, text in corpus:
+        # The scanner runs on the positive section with its tags still in place
+        raw_prompt = _SECTION_END_RE.split(text, 1)[0]
+        benchmarks.append({
+            "benchmark": "extract_loras",
+            "case": case,
+            "size": len(raw_prompt),
+            "fn": lambda prompt=raw_prompt: parser._extract_loras_from_prompt(prompt),
+        })
+    
+    texts = dict(corpus)
+    for template in TEMPLATES:
+        for case in GENERATOR_CASES:
+            parsed_data = parser._parse_civitai_metadata(texts[case])
+            benchmarks.append({
+                "benchmark": f"generate_workflow[{template}]",
+                "case": case,
+                "size": len(parsed_data["loras"]),
+                "fn": lambda data=parsed_data, template=template: generator.generate_workflow(
+                    data, "model.safetensors", "", template
+                ),
+            })
+    
+    return benchmarks
+
+
+def git_revision() -> Optional[str]:
+    """
+    Return the current commit hash, None outside a git checkout
+    """
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def compare_results(current: List[Dict[str, Any]], baseline_path: str, threshold: float) -> int:
+    """
+    Print median ratios against a previous run, return the number of regressions
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["benchmark"], r["case"]): r for r in json.load(f)["results"]}
+    
+    regressions = 0
+    print(f"\nComparison with {baseline_path} (ratio = current / baseline median)")
+    for result in current:
+        previous = baseline.get((result["benchmark"], result["case"]))
+        if previous is None or previous["median_us"] <= 0:
+            continue
+        ratio = result["median_us"] / previous["median_us"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{result['benchmark']:<28} {result['case']:<34} {ratio:>6.2f}x{flag}")
+    
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Parser and workflow generator benchmarks")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed rounds per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name or case contains this")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the parse cache enabled (times cache hits)")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown ratio for --compare")
+    args = parser.parse_args(argv)
+    
+    # parse_metadata would otherwise time cache hits after the first call
+    if not args.with_cache:
+        configure_parse_cache(enabled=False)
+    
+    results = []
+    print(f"{'benchmark':<28} {'case':<34} {'median us':>11} {'stdev us':>10}")
+    for benchmark in collect_benchmarks(args.seed):
+        if args.filter and args.filter not in benchmark["benchmark"] and args.filter not in benchmark["case"]:
+            continue
+        stats = time_call(benchmark["fn"], args.rounds, args.min_time)
+        result = {"benchmark": benchmark["benchmark"], "case": benchmark["case"], "size": benchmark["size"]}
+        result.update(stats)
+        results.append(result)
+        print(f"{result['benchmark']:<28} {result['case']:<34} {result['median_us']:>11.1f} {result['stdev_us']:>10.1f}")
+    
+    report = {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "rounds": args.rounds,
+            "min_time": args.min_time,
+            "parse_cache": args.with_cache,
+        },
+        "results": results,
+    }
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+    
+    if args.compare:
+        return 1 if compare_results(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import { app } from "../../scripts/app.js";
+import { api } from "../../scripts/api.js";
 
 const EXTENSION_NAME = "Metadata2Workflow";
 const VERSION = "1.0.1"; // Force cache refresh
@@ -922,10 +923,39 @@ app.registerExtension({
         return hasIndicator || hasParameterPattern || hasJsonPattern;
     },
 
+    async convertOnServer(metadataText) {
+        // Convert with the Python parser and generator; null when the endpoint is unavailable
+        try {
+            const response = await api.fetchApi("/metadata2workflow/convert", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ text: metadataText }),
+            });
+            if (!response.ok) {
+                return null;
+            }
+            const data = await response.json();
+            return (data.results && data.results[0] && data.results[0].workflow) || null;
+        } catch (error) {
+            console.warn('Server conversion unavailable, using the local parser:', error);
+            return null;
+        }
+    },
+
     async parseAndGenerateWorkflow(metadataText) {
         try {
             console.log('Starting workflow generation with metadata:', metadataText);
             
+            // Prefer the server-side converter, which shares the Python node logic
+            if (typeof app.loadApiJson === "function") {
+                const workflow = await this.convertOnServer(metadataText);
+                if (workflow) {
+                    await app.loadApiJson(workflow, "civitai_metadata");
+                    this.showNotification("Workflow generated successfully from Civitai metadata!", "success");
+                    return;
+                }
+            }
+            
             // Parse Civitai metadata
             const parsedData = this.parseCivitaiMetadata(metadataText);
             
@@ -0,0 +1,166 @@
+"""
+Asyncio interface to the image folder conversion
+
+    async for result in convert_paths(paths, concurrency=64):
+        ...
+
+Header reads run on a thread pool and parsing plus workflow generation on
+a process pool, so neither blocks the event loop. At most `concurrency`
+images are in flight and new paths are only pulled while the consumer
+keeps up, which gives backpressure; closing or cancelling the iteration
+cancels everything still pending.
+"""
+
+import asyncio
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+from .image_metadata import IMAGE_EXTENSIONS
+from .model_index import model_indexes
+from .pipeline import convert_metadata, init_worker, iter_image_files, load_template_files, read_metadata
+
+
+# Paths listed per thread pool job when walking a directory
+_WALK_BATCH = 256
+
+
+async def iter_image_files_async(root: str, recursive: bool = True,
+                                 executor: Optional[Executor] = None) -> AsyncIterator[str]:
+    """
+    Yield image file paths under root like iter_image_files, listing them on a thread
+    """
+    loop = asyncio.get_running_loop()
+    files = iter_image_files(root, recursive, IMAGE_EXTENSIONS)
+    
+    def next_batch() -> List[str]:
+        return [path for _, path in zip(range(_WALK_BATCH), files)]
+    
+    while True:
+        batch = await loop.run_in_executor(executor, next_batch)
+        for path in batch:
+            yield path
+        if len(batch) < _WALK_BATCH:
+            return
+
+
+async def convert_paths(paths: Union[Iterable[str], AsyncIterable[str]], workflow_template: str = "basic",
+                        model_name: str = "", vae_name: str = "", concurrency: int = 64,
+                        io_workers: int = 8, cpu_workers: Optional[int] = None, ordered: bool = False,
+                        template_files: Sequence[str] = (), io_executor: Optional[Executor] = None,
+                        cpu_executor: Optional[Executor] = None,
+                        passthrough: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Convert images to workflows, yielding one result dict per image as it completes
+    
+    Results are the same {"source", "workflow"} / {"source", "error"} dicts
+    convert_images produces.
+    
+    Args:
+        paths: Image file paths, a plain or an async iterable
+        workflow_template: Name of a registered workflow template
+        model_name: Checkpoint name overriding the parsed model
+        vae_name: Optional VAE to load
+        concurrency: Maximum images in flight
+        io_workers: Threads reading image headers, when io_executor is not given
+        cpu_workers: Processes parsing and generating, when cpu_executor is
+            not given (defaults to the CPU count); 1 or less converts on the
+            I/O threads
+        ordered: Yield results in input order instead of completion order
+        template_files: JSON workflow templates to register before converting
+        io_executor: Shared executor for header reads, left running afterwards
+        cpu_executor: Shared executor for conversions, left running afterwards;
+            a process pool must already have the templates and model indexes
+            registered, see pipeline.init_worker
+        passthrough: Use the workflow embedded in ComfyUI images as is,
+            without sending them to cpu_executor
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if cpu_workers is None:
+        cpu_workers = os.cpu_count() or 1
+    
+    load_template_files(template_files)
+    convert = partial(convert_metadata, workflow_template=workflow_template, model_name=model_name, vae_name=vae_name)
+    read = partial(read_metadata, passthrough=passthrough)
+    
+    owned = []
+    if io_executor is None:
+        io_executor = ThreadPoolExecutor(max_workers=max(1, io_workers), thread_name_prefix="metadata2workflow-io")
+        owned.append(io_executor)
+    if cpu_executor is None:
+        if cpu_workers > 1:
+            cpu_executor = ProcessPoolExecutor(max_workers=cpu_workers, initializer=init_worker,
+                                               initargs=(tuple(template_files), model_indexes()))
+            owned.append(cpu_executor)
+        else:
+            cpu_executor = io_executor
+    
+    loop = asyncio.get_running_loop()
+    
+    async def convert_one(path: str) -> Dict[str, Any]:
+        item = await loop.run_in_executor(io_executor, read, path)
+        if "error" in item or "workflow" in item:
+            return item
+        return await loop.run_in_executor(cpu_executor, convert, item)
+    
+    is_async = hasattr(paths, "__aiter__")
+    path_iterator = paths.__aiter__() if is_async else iter(paths)
+    
+    async def next_path() -> Optional[str]:
+        if is_async:
+            try:
+                return await path_iterator.__anext__()
+            except StopAsyncIteration:
+                return None
+        return next(path_iterator, None)
+    
+    pending = deque() if ordered else set()
+    exhausted = False
+    
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                path = await next_path()
+                if path is None:
+                    exhausted = True
+                    break
+                task = loop.create_task(convert_one(path))
+                if ordered:
+                    pending.append(task)
+                else:
+                    pending.add(task)
+            
+            if not pending:
+                return
+            
+            if ordered:
+                yield await pending[0]
+                pending.popleft()
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for executor in owned:
+            # Queued work is dropped, running calls finish in the background
+            if sys.version_info >= (3, 9):
+                executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                executor.shutdown(wait=False)
+
+
+async def convert_directory_async(root: str, recursive: bool = True, **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Convert every image under root, see convert_paths for the options
+    """
+    async for result in convert_paths(iter_image_files_async(root, recursive), **kwargs):
+        yield result
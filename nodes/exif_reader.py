@@ -0,0 +1,254 @@
+import html
+import io
+import re
+import struct
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+
+JPEG_SOI = b'\xff\xd8'
+
+# JPEG markers
+_MARKER_APP1 = 0xE1
+_MARKER_COM = 0xFE
+_MARKER_SOS = 0xDA
+_MARKER_EOI = 0xD9
+
+# Markers without a length field
+_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+EXIF_HEADER = b'Exif\x00\x00'
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+
+# TIFF tags
+_TAG_IMAGE_DESCRIPTION = 0x010E
+_TAG_EXIF_IFD = 0x8769
+_TAG_USER_COMMENT = 0x9286
+
+# Byte size of each TIFF field type
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+_XMP_USER_COMMENT_RE = re.compile(
+    r'<exif:UserComment>.*?<rdf:li[^>]*>(.*?)</rdf:li>|exif:UserComment="([^"]*)"',
+    re.DOTALL
+)
+
+
+def _open_binary(source: Union[str, bytes]) -> BinaryIO:
+    """
+    Open a file path, or wrap file contents already in memory
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, "rb")
+
+
+def extract_jpeg_parameters(path: Union[str, bytes]) -> Optional[str]:
+    """
+    Return the generation parameters embedded in a JPEG file (path or contents), or None
+    
+    Only the marker segments in front of the image data (SOS) are read:
+    the EXIF UserComment is preferred, then XMP, then a COM segment.
+    """
+    with _open_binary(path) as f:
+        if f.read(2) != JPEG_SOI:
+            raise ValueError("Invalid JPEG file signature")
+        
+        xmp_text = None
+        comment = None
+        
+        while True:
+            marker = _read_jpeg_marker(f)
+            if marker is None or marker in (_MARKER_SOS, _MARKER_EOI):
+                break
+            if marker in _STANDALONE_MARKERS:
+                continue
+            
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                break
+            segment_length = struct.unpack(">H", length_bytes)[0] - 2
+            if segment_length < 0:
+                break
+            
+            if marker == _MARKER_APP1 or (marker == _MARKER_COM and comment is None):
+                segment = f.read(segment_length)
+                
+                if marker == _MARKER_COM:
+                    comment = segment.decode("utf-8", errors="replace").strip("\x00") or None
+                elif segment.startswith(EXIF_HEADER):
+                    parameters = parse_exif_parameters(segment[len(EXIF_HEADER):])
+                    if parameters:
+                        return parameters
+                elif segment.startswith(XMP_HEADER) and xmp_text is None:
+                    xmp_text = parse_xmp_parameters(segment[len(XMP_HEADER):])
+            else:
+                f.seek(segment_length, 1)
+        
+        return xmp_text or comment
+
+
+def extract_webp_parameters(path: Union[str, bytes]) -> Optional[str]:
+    """
+    Return the generation parameters embedded in a WebP file (path or contents), or None
+    
+    RIFF chunk headers are walked and image data chunks are skipped with a
+    seek, only the EXIF and XMP chunks are read.
+    """
+    with _open_binary(path) as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WEBP':
+            raise ValueError("Invalid WebP file signature")
+        
+        xmp_text = None
+        
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            fourcc, chunk_size = struct.unpack("<4sI", chunk_header)
+            # Chunks are padded to an even size
+            padded_size = chunk_size + (chunk_size & 1)
+            
+            if fourcc == b'EXIF':
+                data = f.read(chunk_size)
+                # The "Exif\0\0" prefix is optional in WebP
+                if data.startswith(EXIF_HEADER):
+                    data = data[len(EXIF_HEADER):]
+                parameters = parse_exif_parameters(data)
+                if parameters:
+                    return parameters
+                f.seek(padded_size - chunk_size, 1)
+            elif fourcc == b'XMP ' and xmp_text is None:
+                xmp_text = parse_xmp_parameters(f.read(chunk_size))
+                f.seek(padded_size - chunk_size, 1)
+            else:
+                f.seek(padded_size, 1)
+        
+        return xmp_text
+
+
+def parse_exif_parameters(tiff: bytes) -> Optional[str]:
+    """
+    Read the UserComment (or ImageDescription) from a TIFF-structured EXIF block
+    """
+    if len(tiff) < 8:
+        return None
+    
+    if tiff[:2] == b'II':
+        byte_order = "<"
+    elif tiff[:2] == b'MM':
+        byte_order = ">"
+    else:
+        return None
+    
+    ifd0_offset = struct.unpack_from(byte_order + "I", tiff, 4)[0]
+    ifd0 = _read_ifd(tiff, ifd0_offset, byte_order)
+    
+    exif_ifd = ifd0.get(_TAG_EXIF_IFD)
+    if exif_ifd is not None:
+        exif_offset = struct.unpack(byte_order + "I", exif_ifd[2])[0]
+        exif_tags = _read_ifd(tiff, exif_offset, byte_order)
+        if _TAG_USER_COMMENT in exif_tags:
+            comment = decode_user_comment(_tag_value(tiff, exif_tags[_TAG_USER_COMMENT], byte_order))
+            if comment:
+                return comment
+    
+    if _TAG_IMAGE_DESCRIPTION in ifd0:
+        description = _tag_value(tiff, ifd0[_TAG_IMAGE_DESCRIPTION], byte_order)
+        return description.rstrip(b'\x00').decode("utf-8", errors="replace") or None
+    
+    return None
+
+
+def decode_user_comment(data: bytes) -> str:
+    """
+    Decode an EXIF UserComment value using its 8-byte character code prefix
+    """
+    prefix, payload = data[:8], data[8:]
+    
+    if prefix == b'UNICODE\x00':
+        return _decode_utf16(payload).rstrip("\x00")
+    
+    if prefix in (b'ASCII\x00\x00\x00', b'\x00' * 8):
+        return payload.decode("utf-8", errors="replace").rstrip("\x00")
+    
+    if prefix == b'JIS\x00\x00\x00\x00\x00':
+        return payload.decode("shift_jis", errors="replace").rstrip("\x00")
+    
+    # No valid prefix, treat the whole value as text
+    return data.decode("utf-8", errors="replace").rstrip("\x00")
+
+
+def parse_xmp_parameters(xmp: bytes) -> Optional[str]:
+    """
+    Pull the UserComment out of an XMP packet
+    """
+    match = _XMP_USER_COMMENT_RE.search(xmp.decode("utf-8", errors="replace"))
+    if not match:
+        return None
+    return html.unescape(match.group(1) if match.group(1) is not None else match.group(2)) or None
+
+
+def _decode_utf16(payload: bytes) -> str:
+    """
+    Decode UTF-16 text of unknown byte order
+    
+    Writers disagree on the byte order (piexif uses big-endian regardless of
+    the TIFF header), so without a BOM it is guessed from where the zero
+    bytes of ASCII characters fall.
+    """
+    if payload[:2] in (b'\xfe\xff', b'\xff\xfe'):
+        return payload.decode("utf-16", errors="replace")
+    
+    sample = payload[:256]
+    even_zeros = sample[0::2].count(0)
+    odd_zeros = sample[1::2].count(0)
+    encoding = "utf-16-be" if even_zeros > odd_zeros else "utf-16-le"
+    return payload.decode(encoding, errors="replace")
+
+
+def _read_jpeg_marker(f: BinaryIO) -> Optional[int]:
+    """
+    Read the next JPEG marker code, skipping fill bytes
+    """
+    byte = f.read(1)
+    if byte != b'\xff':
+        return None
+    
+    while byte == b'\xff':
+        byte = f.read(1)
+    
+    return byte[0] if byte else None
+
+
+def _read_ifd(tiff: bytes, offset: int, byte_order: str) -> Dict[int, Tuple[int, int, bytes]]:
+    """
+    Read an IFD into a tag -> (type, count, value_field) dict
+    """
+    tags = {}
+    if offset + 2 > len(tiff):
+        return tags
+    
+    entry_count = struct.unpack_from(byte_order + "H", tiff, offset)[0]
+    for i in range(entry_count):
+        entry_offset = offset + 2 + i * 12
+        if entry_offset + 12 > len(tiff):
+            break
+        tag, field_type, count = struct.unpack_from(byte_order + "HHI", tiff, entry_offset)
+        tags[tag] = (field_type, count, tiff[entry_offset + 8:entry_offset + 12])
+    
+    return tags
+
+
+def _tag_value(tiff: bytes, entry: Tuple[int, int, bytes], byte_order: str) -> bytes:
+    """
+    Return the raw bytes of an IFD entry value, following its offset if needed
+    """
+    field_type, count, value_field = entry
+    size = _TIFF_TYPE_SIZES.get(field_type, 1) * count
+    
+    if size <= 4:
+        return value_field[:size]
+    
+    value_offset = struct.unpack(byte_order + "I", value_field)[0]
+    return tiff[value_offset:value_offset + size]
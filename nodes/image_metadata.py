@@ -0,0 +1,77 @@
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .png_reader import PNG_SIGNATURE, extract_png_metadata, extract_png_parameters
+from .exif_reader import JPEG_SOI, extract_jpeg_parameters, extract_webp_parameters
+from .metadata_formats import load_comfyui_prompt
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def sniff_image_format(path: Union[str, bytes]) -> Optional[str]:
+    """
+    Detect the image format from the file signature
+    
+    Args:
+        path: Image file path, or the file contents
+    
+    Returns:
+        "png", "jpeg", "webp" or None for anything else
+    """
+    if isinstance(path, (bytes, bytearray)):
+        header = bytes(path[:12])
+    else:
+        with open(path, "rb") as f:
+            header = f.read(12)
+    
+    if header.startswith(PNG_SIGNATURE):
+        return "png"
+    if header.startswith(JPEG_SOI):
+        return "jpeg"
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "webp"
+    return None
+
+
+def extract_image_parameters(path: Union[str, bytes]) -> Optional[str]:
+    """
+    Return the generation parameters embedded in a PNG, JPEG or WebP file
+    
+    The format is taken from the file signature rather than the extension,
+    and only the metadata headers of the file are read. path may also be
+    the file contents, e.g. an uploaded image.
+    """
+    image_format = sniff_image_format(path)
+    
+    if image_format == "png":
+        return extract_png_parameters(path)
+    if image_format == "jpeg":
+        return extract_jpeg_parameters(path)
+    if image_format == "webp":
+        return extract_webp_parameters(path)
+    
+    source = "image data" if isinstance(path, (bytes, bytearray)) else path
+    raise ValueError(f"Unsupported image format: {source}. Supported formats: PNG, JPEG, WebP")
+
+
+def extract_image_metadata(path: Union[str, bytes]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Return the generation parameters and the embedded ComfyUI workflow of an image
+    
+    The workflow is the API-format prompt ComfyUI saves in a PNG "prompt"
+    chunk, decoded; it is None for other images and when the chunk is not
+    a valid prompt. The parameters are what extract_image_parameters
+    returns, read in the same pass.
+    """
+    if sniff_image_format(path) != "png":
+        return extract_image_parameters(path), None
+    
+    text, prompt_text = extract_png_metadata(path)
+    return text, load_comfyui_prompt(prompt_text) if prompt_text else None
+
+
+def extract_embedded_workflow(path: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """
+    Return the API-format workflow a ComfyUI image was generated with, or None
+    """
+    return extract_image_metadata(path)[1]
@@ -0,0 +1,369 @@
+"""
+Streaming JSON Lines storage for conversion results
+
+One compact JSON object per line, optionally gzip or xz compressed (chosen
+by the file extension). Output is buffered and flushed every flush_every
+records, so an interrupted run loses at most one buffer; appending resumes
+it, and iter_jsonl re-reads any file lazily, line by line.
+
+An incremental run appends a new record for an image it converts again
+(modified, or failed last time), marked "updated": true. The last record
+of a source wins; iter_jsonl_latest yields only those.
+"""
+
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import struct
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Set
+
+COMPRESSIONS = ("none", "gzip", "xz")
+
+# File extension -> compression
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".xz": "xz",
+    ".lzma": "xz",
+}
+
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+# Start of a deflate gzip member header
+_GZIP_MEMBER_START = GZIP_MAGIC + b'\x08'
+
+# xz stream footer: CRC32, backward size, stream flags, magic
+_XZ_FOOTER_SIZE = 12
+_XZ_FOOTER_MAGIC = b'YZ'
+
+# Compressed bytes decoded at a time when checking a gzip member, small so
+# the decoded output stays bounded
+_GZIP_CHECK_CHUNK_SIZE = 64 * 1024
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def compression_for_path(path: str) -> str:
+    """
+    Compression implied by the file extension, "none" for anything else
+    """
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "none")
+
+
+def sniff_compression(path: str) -> str:
+    """
+    Compression of an existing file, from its magic bytes
+    """
+    with open(path, "rb") as f:
+        head = f.read(len(XZ_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(XZ_MAGIC):
+        return "xz"
+    return "none"
+
+
+def _open_binary(path: str, mode: str, compression: str) -> BinaryIO:
+    """
+    Open path for binary reading or writing through the given compression
+    """
+    if compression == "gzip":
+        # Level 6 is close to 9 in size on JSON and several times faster
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == "xz":
+        return lzma.open(path, mode)
+    if compression == "none":
+        return open(path, mode)
+    raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 hex digest of a file, read in 1 MiB chunks
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_jsonl(path: str, compression: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the records of a JSON Lines file, compressed or not
+    
+    The compression is detected from the file contents unless given. A
+    last line without its newline or a truncated compressed stream, as left
+    by an interrupted writer, ends the iteration instead of raising.
+    """
+    if compression is None:
+        compression = sniff_compression(path)
+    
+    with _open_binary(path, "rb", compression) as f:
+        while True:
+            try:
+                line = f.readline()
+            except EOFError:
+                return
+            if not line:
+                return
+            if not line.endswith(b'\n'):
+                # Partial record of an interrupted write
+                return
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_jsonl_latest(path: str, compression: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the current records of a JSON Lines file, the last one of each source
+    
+    Reads the file twice: the first pass only keeps the line number of each
+    source's last record, so memory grows with the sources, not the records.
+    Records without a source are all yielded.
+    """
+    last_lines = {}
+    for number, record in enumerate(iter_jsonl(path, compression)):
+        if "source" in record:
+            last_lines[record["source"]] = number
+    
+    for number, record in enumerate(iter_jsonl(path, compression)):
+        if "source" not in record or last_lines.get(record["source"]) == number:
+            yield record
+
+
+def read_jsonl_sources(path: str) -> Set[str]:
+    """
+    Sources already present in a JSON Lines file, empty when it doesn't exist
+    
+    A source counts once, whatever the number of its records.
+    """
+    if not os.path.exists(path):
+        return set()
+    return {record["source"] for record in iter_jsonl(path) if "source" in record}
+
+
+def _trim_partial_line(path: str) -> None:
+    """
+    Cut an uncompressed file back to its last complete line
+    """
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            step = min(_HASH_CHUNK_SIZE, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != end:
+            f.truncate(position)
+
+
+def _gzip_member_state(f: BinaryIO, offset: int) -> str:
+    """
+    Decode the gzip member starting at offset: "complete" when it ends
+    exactly at the end of the file, "truncated" when the file ends inside
+    it, "trailing" when data follows it and "invalid" when it isn't one
+    """
+    decompressor = zlib.decompressobj(wbits=31)
+    f.seek(offset)
+    try:
+        while True:
+            chunk = f.read(_GZIP_CHECK_CHUNK_SIZE)
+            if not chunk:
+                return "truncated"
+            decompressor.decompress(chunk)
+            if decompressor.eof:
+                return "trailing" if decompressor.unused_data or f.read(1) else "complete"
+    except zlib.error:
+        return "invalid"
+
+
+def _gzip_tail_intact(path: str) -> bool:
+    """
+    Whether the last gzip member of a file is complete
+    
+    Every append starts a new member, so only the last one can have been cut
+    off. Member headers are searched backwards from the end and the first
+    one that decodes is checked, which reads the last member, not the file.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - _HASH_CHUNK_SIZE)
+            f.seek(start)
+            # Overlap the block checked before, so a header split across blocks is found
+            block = f.read(position + len(_GZIP_MEMBER_START) - 1 - start)
+            index = block.rfind(_GZIP_MEMBER_START)
+            while index >= 0:
+                if start + index < position:
+                    state = _gzip_member_state(f, start + index)
+                    if state != "invalid":
+                        return state == "complete"
+                index = block.rfind(_GZIP_MEMBER_START, 0, index)
+            position = start
+    return False
+
+
+def _xz_tail_intact(path: str) -> bool:
+    """
+    Whether the last xz stream of a file ends with a valid stream footer
+    
+    Each append writes a new stream, and a writer that was interrupted never
+    wrote its footer, so the last 12 bytes tell.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end < len(XZ_MAGIC) + _XZ_FOOTER_SIZE:
+            return False
+        f.seek(end - _XZ_FOOTER_SIZE)
+        footer = f.read(_XZ_FOOTER_SIZE)
+        if footer[-2:] != _XZ_FOOTER_MAGIC:
+            return False
+        crc, backward_size = struct.unpack_from("<II", footer)
+        if crc != zlib.crc32(footer[4:10]):
+            return False
+        # The index it points back to starts with a zero indicator byte
+        index_start = end - _XZ_FOOTER_SIZE - (backward_size + 1) * 4
+        if index_start < len(XZ_MAGIC):
+            return False
+        f.seek(index_start)
+        return f.read(1) == b'\x00'
+
+
+def _repair_compressed(path: str, compression: str) -> None:
+    """
+    Rewrite a compressed file whose stream was cut off, keeping its complete records
+    
+    Appending to a truncated gzip or xz stream would make everything after
+    it unreadable. gzip members and xz streams concatenate, so when the last
+    one is intact the append simply starts a new one; only the last member
+    or stream footer is read for that check.
+    """
+    intact = _gzip_tail_intact(path) if compression == "gzip" else _xz_tail_intact(path)
+    if intact:
+        return
+    
+    temp_path = path + ".tmp"
+    with JsonlWriter(temp_path, compression=compression) as writer:
+        for record in iter_jsonl(path, compression):
+            writer.write(record)
+    os.replace(temp_path, path)
+
+
+class JsonlWriter:
+    """
+    Buffered JSON Lines writer with optional compression and resumable appends
+        
+        with JsonlWriter("workflows.jsonl.gz", append=True) as writer:
+            for result in results:
+                writer.write(result)
+    
+    Records are encoded as compact single-line JSON and written in blocks of
+    flush_every records; each block is flushed, so a reader (or a resumed
+    run) sees every record up to the last completed flush. xz has no sync
+    flush, so each xz block is written as its own stream, closed at the
+    flush; streams concatenate like gzip members.
+    """
+    
+    def __init__(self, path: str, compression: Optional[str] = None, append: bool = False,
+                 flush_every: int = 1000, on_flush: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            path: Output file
+            compression: "none", "gzip" or "xz"; by default from the extension
+            append: Continue an existing file instead of replacing it; a
+                record cut off by an interrupted run is dropped first
+            flush_every: Records buffered between writes
+            on_flush: Called after each flush, once the flushed records can be
+                read back from the file, e.g. to commit a manifest
+        """
+        if compression is None:
+            compression = compression_for_path(path)
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+        
+        if append and os.path.exists(path) and os.path.getsize(path):
+            if compression == "none":
+                _trim_partial_line(path)
+            else:
+                _repair_compressed(path, compression)
+        
+        self.path = path
+        self.compression = compression
+        self.flush_every = max(1, flush_every)
+        self.on_flush = on_flush
+        self.converted = 0
+        self.failed = 0
+        self._buffer = []
+        self._closed = False
+        self._file: Optional[BinaryIO] = _open_binary(path, "ab" if append else "wb", compression)
+    
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Buffer one record, writing the buffer out every flush_every records
+        """
+        self._buffer.append(_ENCODER.encode(record))
+        if "error" in record:
+            self.failed += 1
+        else:
+            self.converted += 1
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+    
+    def write_all(self, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        Write every record of an iterable
+        """
+        for record in records:
+            self.write(record)
+    
+    def flush(self) -> None:
+        """
+        Write out the buffered records, readable from the file once this returns
+        """
+        if self._buffer:
+            self._buffer.append("")
+            if self._file is None:
+                self._file = _open_binary(self.path, "ab", self.compression)
+            self._file.write("\n".join(self._buffer).encode("utf-8"))
+            self._buffer = []
+        if self._file is not None:
+            if self.compression == "xz":
+                # Only a closed stream can be decoded, the next block starts a new one
+                self._file.close()
+                self._file = None
+            else:
+                self._file.flush()
+        if self.on_flush is not None:
+            self.on_flush()
+    
+    def close(self) -> None:
+        """
+        Flush and close the file
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    def __enter__(self) -> "JsonlWriter":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,214 @@
+"""
+SQLite manifest of converted images, for incremental and resumable runs
+
+Every processed image gets a row with its size, mtime, SHA-256, conversion
+status and output location. A later run over the same corpus only converts
+images that are new, changed or failed last time. A file whose size matches
+but whose mtime differs (touched, or copied without keeping times) only
+counts as changed when its SHA-256 differs from the recorded one:
+
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl --manifest corpus.sqlite
+"""
+
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+from .jsonl_store import file_sha256
+
+STATUS_CONVERTED = "converted"
+STATUS_NO_METADATA = "no_metadata"
+STATUS_FAILED = "failed"
+
+# Rows written per transaction when nothing else commits
+COMMIT_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    output TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+
+def result_status(result: Dict[str, Any]) -> str:
+    """
+    Manifest status of a conversion result
+    """
+    if "error" not in result:
+        return STATUS_CONVERTED
+    if result["error"] == "No metadata found":
+        return STATUS_NO_METADATA
+    return STATUS_FAILED
+
+
+class Manifest:
+    """
+    Per-file conversion state stored in an SQLite database
+    
+    Rows are written inside a transaction that is committed by commit(),
+    which writers call after flushing their output, so a crash never marks
+    an image done whose workflow was not written. Use from one thread.
+    """
+    
+    def __init__(self, path: str, retry_failed: bool = True):
+        """
+        Args:
+            path: Database file, created when missing
+            retry_failed: Convert images that failed last time again even
+                when unchanged; images without metadata are not retried
+        """
+        self.path = path
+        self.retry_failed = retry_failed
+        self.skipped = 0
+        self._uncommitted = 0
+        # Size and mtime of the paths handed out by iter_changed
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        # Paths handed out by iter_changed that were processed before
+        self._reconverted: Set[str] = set()
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._connection.commit()
+    
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        The manifest row of path as a dict, None when it was never processed
+        """
+        cursor = self._connection.execute(
+            "SELECT path, size, mtime_ns, sha256, status, error, output, updated FROM files WHERE path = ?", (path,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+    
+    def is_current(self, path: str, size: int, mtime_ns: int) -> bool:
+        """
+        Whether path was processed with this content and needs no retry
+        
+        The content is unchanged when size and mtime match. When only the
+        mtime differs, the file is hashed and compared with the recorded
+        SHA-256; on a match the new mtime is recorded, uncommitted, so the
+        next run doesn't hash it again.
+        """
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, status, sha256 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != size:
+            return False
+        if self.retry_failed and row[2] == STATUS_FAILED:
+            return False
+        if row[1] == mtime_ns:
+            return True
+        if row[3] is None:
+            return False
+        
+        try:
+            sha256 = file_sha256(path)
+        except OSError:
+            return False
+        if sha256 != row[3]:
+            return False
+        self._connection.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (mtime_ns, path))
+        self._uncommitted += 1
+        return True
+    
+    def iter_changed(self, paths: Iterable[str]) -> Iterator[str]:
+        """
+        Yield the paths that are new, modified or to be retried, skipping the rest
+        """
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Let the conversion report the error
+                yield path
+                continue
+            if self.is_current(path, stat.st_size, stat.st_mtime_ns):
+                self.skipped += 1
+                continue
+            self._stats[path] = (stat.st_size, stat.st_mtime_ns)
+            if self._connection.execute("SELECT 1 FROM files WHERE path = ?", (path,)).fetchone():
+                self._reconverted.add(path)
+            yield path
+    
+    def record(self, result: Dict[str, Any], output: Optional[str] = None) -> None:
+        """
+        Record the outcome of converting one image, uncommitted
+        """
+        path = result["source"]
+        stat = self._stats.pop(path, None)
+        if stat is None:
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                return
+            stat = (file_stat.st_size, file_stat.st_mtime_ns)
+        
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, status, error, output, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, stat[0], stat[1], result.get("sha256"), result_status(result), result.get("error"),
+             output if "error" not in result else None, time.time()),
+        )
+        self._uncommitted += 1
+    
+    def track(self, results: Iterable[Dict[str, Any]],
+              output: Union[None, str, Callable[[Dict[str, Any]], str]] = None,
+              commit_every: int = COMMIT_EVERY) -> Iterator[Dict[str, Any]]:
+        """
+        Pass results through, recording each once the consumer has handled it
+        
+        Results of images processed by an earlier run get "updated": true,
+        so readers of an appended output know they replace an older record.
+        
+        Args:
+            results: Conversion results
+            output: Output location, or a function of the result returning it
+            commit_every: Rows per commit; 0 when the consumer calls
+                commit() itself after flushing its output
+        """
+        for result in results:
+            if result["source"] in self._reconverted:
+                self._reconverted.discard(result["source"])
+                result["updated"] = True
+            yield result
+            self.record(result, output(result) if callable(output) else output)
+            if commit_every and self._uncommitted >= commit_every:
+                self.commit()
+    
+    def commit(self) -> None:
+        """
+        Commit the recorded rows
+        """
+        if self._uncommitted:
+            self._connection.commit()
+            self._uncommitted = 0
+    
+    def counts(self) -> Dict[str, int]:
+        """
+        Number of manifest rows per status
+        """
+        return dict(self._connection.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+    
+    def close(self) -> None:
+        """
+        Commit and close the database
+        """
+        self.commit()
+        self._connection.close()
+    
+    def __enter__(self) -> "Manifest":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,567 @@
+"""
+Parsers for the JSON metadata formats next to A1111's "parameters" text
+
+    a1111     Prompt text followed by "Steps: ..., Sampler: ...", parsed by
+              MetadataParserNode itself
+    civitai   Civitai's JSON (prompt, negativePrompt, cfgScale, ...), bare
+              or wrapped in an image record's "meta"/"parameters"
+    comfyui   ComfyUI API prompt, {node_id: {"class_type", "inputs"}}
+    novelai   NovelAI's "Comment" JSON (prompt, uc, scale, ...)
+    invokeai  InvokeAI's "invokeai_metadata" or legacy "sd-metadata" JSON
+
+The format is sniffed from the first non-blank character: anything not
+starting with "{" is A1111 text and never touches the JSON decoder; JSON is
+classified by its keys. Each parser returns parsed_data fields, without
+the defaults MetadataParserNode fills in.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+FORMAT_A1111 = "a1111"
+FORMAT_CIVITAI = "civitai"
+FORMAT_COMFYUI = "comfyui"
+FORMAT_NOVELAI = "novelai"
+FORMAT_INVOKEAI = "invokeai"
+
+# Splits a prompt into (loras, clean prompt), MetadataParserNode._extract_loras_from_prompt
+LoraExtractor = Callable[[str], Tuple[List[Dict[str, Any]], str]]
+
+# Normalized JSON key -> (parsed_data field, value type); keys are lower-cased
+# with everything but letters and digits removed, so "cfgScale", "cfg_scale"
+# and "CFG scale" are one entry
+_CIVITAI_FIELDS: Dict[str, Tuple[str, type]] = {
+    "prompt": ("positive_prompt", str),
+    "positiveprompt": ("positive_prompt", str),
+    "negativeprompt": ("negative_prompt", str),
+    "steps": ("steps", int),
+    "cfgscale": ("cfg_scale", float),
+    "sampler": ("sampler", str),
+    "samplername": ("sampler", str),
+    "scheduletype": ("scheduler", str),
+    "scheduler": ("scheduler", str),
+    "seed": ("seed", int),
+    "size": ("size", str),
+    "model": ("model", str),
+    "checkpoint": ("model", str),
+    "modelhash": ("model_hash", str),
+    "vae": ("vae", str),
+    "clipskip": ("clip_skip", int),
+    "eta": ("eta", float),
+    "denoisingstrength": ("denoising_strength", float),
+    "denoise": ("denoising_strength", float),
+    "basemodel": ("base_model", str),
+}
+
+# Normalized JSON key -> parsed_data field of a {name: hash} map
+_HASH_FIELDS = {"lorahashes": "lora_hashes", "tihashes": "ti_hashes", "hashes": "hashes"}
+
+# Civitai resource types -> hash map their hashes go to
+_RESOURCE_HASH_FIELDS = {"lora": "lora_hashes", "locon": "lora_hashes", "lycoris": "lora_hashes",
+                         "embed": "ti_hashes", "embedding": "ti_hashes", "textualinversion": "ti_hashes"}
+
+# Wrapper and bookkeeping keys of Civitai image records, not parameters
+_CIVITAI_IGNORED = frozenset(("meta", "parameters", "resources", "civitairesources", "width", "height", "id", "url"))
+
+# InvokeAI scheduler (2.x sampler) -> ComfyUI sampler, after removing the "_k"
+# suffix that selects Karras sigmas; names ComfyUI shares are left out
+_INVOKEAI_SCHEDULERS: Dict[str, str] = {
+    "euler_a": "euler_ancestral",
+    "kdpm_2": "dpm_2",
+    "kdpm_2_a": "dpm_2_ancestral",
+    "dpmpp_2s": "dpmpp_2s_ancestral",
+    "unipc": "uni_pc",
+    "pndm": "ipndm",
+    "k_euler_a": "euler_ancestral",
+    "k_dpm_2_a": "dpm_2_ancestral",
+    "k_dpm_2": "dpm_2",
+    "k_lms": "lms",
+    "k_heun": "heun",
+    "k_euler": "euler",
+    "plms": "ipndm",
+}
+
+# NovelAI noise schedule -> ComfyUI scheduler
+_NOVELAI_SCHEDULES = {"native": "normal", "karras": "karras", "exponential": "exponential",
+                      "polyexponential": "exponential"}
+
+# ComfyUI nodes the sampling parameters are read from
+_COMFYUI_SAMPLERS = ("KSampler", "KSamplerAdvanced", "SamplerCustom", "SamplerCustomAdvanced")
+
+# Inputs of SamplerCustomAdvanced linking to the nodes that hold its settings
+# (CFGGuider/BasicGuider, RandomNoise, KSamplerSelect, BasicScheduler)
+_COMFYUI_SAMPLER_PARTS = ("guider", "noise", "sampler", "sigmas")
+
+
+def _normalize_key(key: str) -> str:
+    return "".join(char for char in key.lower() if char.isalnum())
+
+
+def _coerce(value: Any, value_type: type) -> Any:
+    """
+    Convert a JSON value to the field's type, None when it doesn't fit
+    """
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    try:
+        if value_type is int:
+            # int() first, float() would round 64-bit seeds
+            try:
+                return int(value)
+            except ValueError:
+                return int(float(value))
+        if value_type is float:
+            return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return str(value).strip()
+
+
+def _lora(name: str, strength: float, strength_clip: Optional[float] = None) -> Dict[str, Any]:
+    """
+    LoRA entry in the shape the A1111 parser produces
+    """
+    if strength_clip is None:
+        strength_clip = strength
+    tag_weights = f"{strength_clip:g}" if strength == strength_clip else f"{strength_clip:g}:{strength:g}"
+    return {
+        "name": name,
+        "strength": strength,
+        "strength_clip": strength_clip,
+        "type": "lora",
+        "full_tag": f"<lora:{name}:{tag_weights}>",
+    }
+
+
+def _prompt_fields(parsed_data: Dict[str, Any], prompt: Any, extract_loras: LoraExtractor) -> None:
+    """
+    Set positive_prompt and loras from a prompt that may hold <lora:...> tags
+    """
+    loras, clean_prompt = extract_loras(prompt if isinstance(prompt, str) else "")
+    parsed_data["positive_prompt"] = clean_prompt
+    parsed_data["loras"] = loras
+
+
+def parse_hash_list(text: str) -> Dict[str, str]:
+    """
+    Parse A1111's "name: hash, name: hash" lists (Lora hashes, TI hashes)
+    """
+    hashes = {}
+    for entry in text.split(","):
+        name, separator, value = entry.rpartition(":")
+        if separator and name.strip() and value.strip():
+            hashes.setdefault(name.strip(), value.strip())
+    return hashes
+
+
+def parse_hashes_json(text: str) -> Any:
+    """
+    Parse Civitai's Hashes: {"model": ..., "lora:name": ...}, keeping the raw
+    text when it is not a JSON object
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    if not isinstance(data, dict):
+        return text
+    return {str(key): str(value) for key, value in data.items()}
+
+
+def _hash_map(value: Any) -> Optional[Dict[str, str]]:
+    """
+    {name: hash} map from a JSON object or an A1111 hash list, None for anything else
+    """
+    if isinstance(value, str):
+        value = parse_hashes_json(value) if value.lstrip().startswith("{") else parse_hash_list(value)
+    if not isinstance(value, dict):
+        return None
+    return {str(key): str(hash_value) for key, hash_value in value.items() if hash_value}
+
+
+def load_json_metadata(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode text as a JSON object, None when it is not one
+    
+    Text not starting with "{" is rejected without decoding. A1111 prompts
+    can start with "{" too (dynamic prompts), those fail to decode.
+    """
+    stripped = text.lstrip()
+    if not stripped.startswith("{"):
+        return None
+    try:
+        data = json.loads(stripped)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def classify_json_metadata(data: Dict[str, Any]) -> str:
+    """
+    Format of decoded JSON metadata, by its keys
+    """
+    if data and all(isinstance(node, dict) and "class_type" in node for node in data.values()):
+        return FORMAT_COMFYUI
+    if "uc" in data and ("scale" in data or "n_samples" in data):
+        return FORMAT_NOVELAI
+    if "generation_mode" in data or "app_version" in data or "model_weights" in data:
+        return FORMAT_INVOKEAI
+    return FORMAT_CIVITAI
+
+
+def load_comfyui_prompt(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode a ComfyUI API prompt, None when text is anything else
+    """
+    data = load_json_metadata(text)
+    if data is None or classify_json_metadata(data) != FORMAT_COMFYUI:
+        return None
+    return data
+
+
+def sniff_metadata_format(text: str) -> str:
+    """
+    Format of a metadata string, one of the FORMAT_* names
+    """
+    data = load_json_metadata(text)
+    if data is None:
+        return FORMAT_A1111
+    return classify_json_metadata(data)
+
+
+def parse_civitai_json(data: Dict[str, Any], extract_loras: LoraExtractor,
+                       keep_unknown: bool = False) -> Dict[str, Any]:
+    """
+    Parse Civitai JSON; an image record's "meta" (or "parameters") takes precedence
+    """
+    sources = [data]
+    for wrapper in ("parameters", "meta"):
+        if isinstance(data.get(wrapper), dict):
+            sources.insert(0, data[wrapper])
+    
+    parsed_data: Dict[str, Any] = {}
+    extra_params: Dict[str, str] = {}
+    resources = []
+    
+    for source in sources:
+        for key, value in source.items():
+            normalized = _normalize_key(key)
+            if normalized in ("resources", "civitairesources") and isinstance(value, list):
+                resources.extend(resource for resource in value if isinstance(resource, dict))
+                continue
+            if normalized in _HASH_FIELDS:
+                hashes = _hash_map(value)
+                if hashes:
+                    parsed_data.setdefault(_HASH_FIELDS[normalized], hashes)
+                continue
+            field = _CIVITAI_FIELDS.get(normalized)
+            if field is None:
+                if keep_unknown and normalized not in _CIVITAI_IGNORED and not isinstance(value, (dict, list)):
+                    extra_params.setdefault(key, str(value))
+                continue
+            name, value_type = field
+            if name in parsed_data:
+                continue
+            value = _coerce(value, value_type)
+            if value is not None and value != "":
+                parsed_data[name] = value
+        
+        if "size" not in parsed_data and source.get("width") and source.get("height"):
+            width, height = _coerce(source["width"], int), _coerce(source["height"], int)
+            if width and height:
+                parsed_data["size"] = f"{width}x{height}"
+    
+    _prompt_fields(parsed_data, parsed_data.get("positive_prompt"), extract_loras)
+    
+    # LoRAs listed as resources but not tagged in the prompt
+    tagged = {lora["name"] for lora in parsed_data["loras"]}
+    for resource in resources:
+        resource_type = _normalize_key(str(resource.get("type", "")))
+        name = resource.get("name") or resource.get("modelName")
+        hash_field = _RESOURCE_HASH_FIELDS.get(resource_type)
+        if hash_field is not None and isinstance(name, str) and isinstance(resource.get("hash"), str):
+            parsed_data.setdefault(hash_field, {}).setdefault(name, resource["hash"])
+        if resource_type in ("lora", "locon", "lycoris") and isinstance(name, str) and name not in tagged:
+            weight = _coerce(resource.get("weight", resource.get("strength", 1.0)), float)
+            parsed_data["loras"].append(_lora(name, 1.0 if weight is None else weight))
+            tagged.add(name)
+        elif resource_type in ("model", "checkpoint") and isinstance(name, str) and "model" not in parsed_data:
+            parsed_data["model"] = name
+            if isinstance(resource.get("hash"), str) and "model_hash" not in parsed_data:
+                parsed_data["model_hash"] = resource["hash"]
+    
+    if keep_unknown:
+        parsed_data["extra_params"] = extra_params
+    return parsed_data
+
+
+def _comfyui_node(prompt: Dict[str, Any], value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Node a [node_id, output] link points at, None for anything else
+    """
+    if isinstance(value, list) and len(value) == 2:
+        node = prompt.get(str(value[0]))
+        if isinstance(node, dict):
+            return node
+    return None
+
+
+def _comfyui_value(prompt: Dict[str, Any], value: Any, names: Tuple[str, ...]) -> Any:
+    """
+    Literal input value, following one link to a primitive or text node
+    """
+    node = _comfyui_node(prompt, value)
+    if node is None:
+        return value
+    inputs = node.get("inputs", {})
+    for name in names:
+        if name in inputs and _comfyui_node(prompt, inputs[name]) is None:
+            return inputs[name]
+    return None
+
+
+def _comfyui_text(prompt: Dict[str, Any], link: Any) -> str:
+    """
+    Prompt text of the conditioning a sampler input links to
+    """
+    node = _comfyui_node(prompt, link)
+    seen = set()
+    while node is not None and id(node) not in seen:
+        seen.add(id(node))
+        inputs = node.get("inputs", {})
+        for name in ("text", "text_g", "prompt"):
+            if name in inputs:
+                text = _comfyui_value(prompt, inputs[name], ("text", "string", "value"))
+                return text if isinstance(text, str) else ""
+        # Conditioning passed through (ControlNet, combine, ...)
+        node = _comfyui_node(prompt, inputs.get("conditioning", inputs.get("conditioning_1")))
+    return ""
+
+
+def _comfyui_sampler_inputs(prompt: Dict[str, Any], sampler: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inputs of a sampler node, with those of the guider, noise, sampler and
+    sigmas nodes SamplerCustomAdvanced splits its settings into merged in
+    """
+    inputs = dict(sampler.get("inputs", {}))
+    for part in _COMFYUI_SAMPLER_PARTS:
+        node = _comfyui_node(prompt, inputs.get(part))
+        if node is not None:
+            for name, value in node.get("inputs", {}).items():
+                inputs.setdefault(name, value)
+    # BasicGuider has a single conditioning input
+    if "positive" not in inputs and "conditioning" in inputs:
+        inputs["positive"] = inputs["conditioning"]
+    return inputs
+
+
+def parse_comfyui_prompt(data: Dict[str, Any], extract_loras: LoraExtractor,
+                         keep_unknown: bool = False) -> Dict[str, Any]:
+    """
+    Parse a ComfyUI API prompt by following the first sampler's inputs
+    
+    Without a known sampler node only the prompts (the first two text
+    encoders), checkpoint and size are read.
+    """
+    def node_order(item: Tuple[str, Any]) -> Tuple[int, Any]:
+        return (0, int(item[0])) if item[0].isdigit() else (1, item[0])
+    
+    ordered = [(node_id, node) for node_id, node in sorted(data.items(), key=node_order) if isinstance(node, dict)]
+    samplers = [node for _, node in ordered if node.get("class_type") in _COMFYUI_SAMPLERS]
+    if samplers:
+        inputs = _comfyui_sampler_inputs(data, samplers[0])
+        positive, negative = inputs.get("positive"), inputs.get("negative")
+    else:
+        inputs = {}
+        encoders = [[node_id, 0] for node_id, node in ordered
+                    if str(node.get("class_type", "")).startswith("CLIPTextEncode")]
+        positive = encoders[0] if encoders else None
+        negative = encoders[1] if len(encoders) > 1 else None
+    
+    parsed_data: Dict[str, Any] = {}
+    _prompt_fields(parsed_data, _comfyui_text(data, positive), extract_loras)
+    parsed_data["negative_prompt"] = _comfyui_text(data, negative)
+    
+    for name, field, value_type in (("steps", "steps", int), ("cfg", "cfg_scale", float),
+                                    ("sampler_name", "sampler", str), ("scheduler", "scheduler", str),
+                                    ("seed", "seed", int), ("noise_seed", "seed", int),
+                                    ("denoise", "denoising_strength", float)):
+        if name in inputs and field not in parsed_data:
+            value = _coerce(_comfyui_value(data, inputs[name], ("seed", "value", "int", "float")), value_type)
+            if value is not None:
+                parsed_data[field] = value
+    if parsed_data.get("denoising_strength") == 1.0:
+        del parsed_data["denoising_strength"]
+    
+    # Walk the model chain back to the checkpoint, collecting LoRAs
+    loras = []
+    node = _comfyui_node(data, inputs.get("model"))
+    seen = set()
+    while node is not None and id(node) not in seen:
+        seen.add(id(node))
+        node_inputs = node.get("inputs", {})
+        class_type = node.get("class_type", "")
+        if class_type.startswith("LoraLoader") and isinstance(node_inputs.get("lora_name"), str):
+            # The file name is kept, it is what a regenerated LoraLoader needs
+            name = node_inputs["lora_name"]
+            strength = _coerce(node_inputs.get("strength_model", 1.0), float)
+            strength_clip = _coerce(node_inputs.get("strength_clip", strength), float)
+            loras.append(_lora(name, 1.0 if strength is None else strength, strength_clip))
+        if isinstance(node_inputs.get("ckpt_name"), str):
+            parsed_data["model"] = node_inputs["ckpt_name"]
+            break
+        node = _comfyui_node(data, node_inputs.get("model"))
+    parsed_data["loras"] = list(reversed(loras)) + parsed_data["loras"]
+    
+    latent = _comfyui_node(data, inputs.get("latent_image"))
+    if not samplers:
+        for _, node in ordered:
+            node_inputs = node.get("inputs", {})
+            if "model" not in parsed_data and isinstance(node_inputs.get("ckpt_name"), str):
+                parsed_data["model"] = node_inputs["ckpt_name"]
+            if latent is None and "Latent" in str(node.get("class_type", "")) and "width" in node_inputs:
+                latent = node
+    if latent is not None:
+        width = _coerce(latent.get("inputs", {}).get("width"), int)
+        height = _coerce(latent.get("inputs", {}).get("height"), int)
+        if width and height:
+            parsed_data["size"] = f"{width}x{height}"
+    
+    for node in data.values():
+        if node.get("class_type") == "CLIPSetLastLayer":
+            layer = _coerce(node.get("inputs", {}).get("stop_at_clip_layer"), int)
+            if layer:
+                parsed_data["clip_skip"] = abs(layer)
+        elif node.get("class_type") == "VAELoader" and isinstance(node.get("inputs", {}).get("vae_name"), str):
+            parsed_data["vae"] = node["inputs"]["vae_name"]
+    
+    if keep_unknown:
+        parsed_data["extra_params"] = {}
+    return parsed_data
+
+
+def parse_novelai(data: Dict[str, Any], extract_loras: LoraExtractor,
+                  keep_unknown: bool = False) -> Dict[str, Any]:
+    """
+    Parse NovelAI's "Comment" JSON
+    """
+    parsed_data: Dict[str, Any] = {}
+    _prompt_fields(parsed_data, data.get("prompt", ""), extract_loras)
+    parsed_data["negative_prompt"] = str(data.get("uc", "")).strip()
+    
+    for key, field, value_type in (("steps", "steps", int), ("scale", "cfg_scale", float),
+                                   ("seed", "seed", int), ("strength", "denoising_strength", float)):
+        value = _coerce(data.get(key), value_type)
+        if value is not None:
+            parsed_data[field] = value
+    
+    sampler = data.get("sampler")
+    if isinstance(sampler, str):
+        sampler = sampler[2:] if sampler.startswith("k_") else sampler
+        parsed_data["sampler"] = "ddim" if sampler.startswith("ddim") else sampler
+    schedule = _NOVELAI_SCHEDULES.get(str(data.get("noise_schedule", "")).lower())
+    if schedule:
+        parsed_data["scheduler"] = schedule
+    
+    width, height = _coerce(data.get("width"), int), _coerce(data.get("height"), int)
+    if width and height:
+        parsed_data["size"] = f"{width}x{height}"
+    
+    if keep_unknown:
+        parsed_data["extra_params"] = {
+            key: str(value) for key, value in data.items()
+            if key not in ("prompt", "uc", "steps", "scale", "seed", "strength", "sampler", "noise_schedule",
+                           "width", "height") and not isinstance(value, (dict, list))
+        }
+    return parsed_data
+
+
+def _invokeai_model_name(value: Any) -> Optional[str]:
+    """
+    Model name from InvokeAI's model field, a string or a model identifier dict
+    """
+    if isinstance(value, dict):
+        value = value.get("model_name") or value.get("name")
+    return value if isinstance(value, str) and value else None
+
+
+def parse_invokeai(data: Dict[str, Any], extract_loras: LoraExtractor,
+                   keep_unknown: bool = False) -> Dict[str, Any]:
+    """
+    Parse InvokeAI metadata, the 3.x+ "invokeai_metadata" or the 2.x "sd-metadata" layout
+    """
+    # 2.x nests the generation under "image", with the prompt as weighted parts
+    image = data.get("image") if isinstance(data.get("image"), dict) else data
+    prompt = image.get("positive_prompt", image.get("prompt", ""))
+    if isinstance(prompt, list):
+        prompt = " ".join(str(part.get("prompt", "")) for part in prompt if isinstance(part, dict))
+    
+    parsed_data: Dict[str, Any] = {}
+    _prompt_fields(parsed_data, prompt, extract_loras)
+    negative_prompt = image.get("negative_prompt")
+    if isinstance(negative_prompt, str):
+        parsed_data["negative_prompt"] = negative_prompt.strip()
+    
+    for key, field, value_type in (("steps", "steps", int), ("cfg_scale", "cfg_scale", float),
+                                   ("seed", "seed", int), ("strength", "denoising_strength", float),
+                                   ("clip_skip", "clip_skip", int)):
+        value = _coerce(image.get(key), value_type)
+        if value is not None:
+            parsed_data[field] = value
+    if parsed_data.get("clip_skip") == 0:
+        del parsed_data["clip_skip"]
+    
+    scheduler = image.get("scheduler", image.get("sampler"))
+    if isinstance(scheduler, str) and scheduler:
+        if scheduler.endswith("_k"):
+            scheduler = scheduler[:-2]
+            parsed_data["scheduler"] = "karras"
+        parsed_data["sampler"] = _INVOKEAI_SCHEDULERS.get(scheduler, scheduler)
+    
+    width, height = _coerce(image.get("width"), int), _coerce(image.get("height"), int)
+    if width and height:
+        parsed_data["size"] = f"{width}x{height}"
+    
+    model = _invokeai_model_name(data.get("model")) or _invokeai_model_name(data.get("model_weights"))
+    if model:
+        parsed_data["model"] = model
+    vae = _invokeai_model_name(data.get("vae"))
+    if vae:
+        parsed_data["vae"] = vae
+    
+    for entry in data.get("loras", []) or []:
+        if not isinstance(entry, dict):
+            continue
+        name = _invokeai_model_name(entry.get("model", entry.get("lora")))
+        weight = _coerce(entry.get("weight", 1.0), float)
+        if name:
+            parsed_data["loras"].append(_lora(name, 1.0 if weight is None else weight))
+    
+    if keep_unknown:
+        parsed_data["extra_params"] = {}
+    return parsed_data
+
+
+# Format -> parser of its decoded JSON
+JSON_FORMAT_PARSERS: Dict[str, Callable[[Dict[str, Any], LoraExtractor, bool], Dict[str, Any]]] = {
+    FORMAT_CIVITAI: parse_civitai_json,
+    FORMAT_COMFYUI: parse_comfyui_prompt,
+    FORMAT_NOVELAI: parse_novelai,
+    FORMAT_INVOKEAI: parse_invokeai,
+}
+
+
+def parse_json_metadata(text: str, extract_loras: LoraExtractor,
+                        keep_unknown: bool = False) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Parse JSON metadata with the parser of its format
+    
+    Returns:
+        Tuple of (format, parsed_data), or None when text is not a JSON
+        object and should be parsed as A1111 text
+    """
+    data = load_json_metadata(text)
+    if data is None:
+        return None
+    metadata_format = classify_json_metadata(data)
+    return metadata_format, JSON_FORMAT_PARSERS[metadata_format](data, extract_loras, keep_unknown)
@@ -1,6 +1,310 @@
+import hashlib
+import os
 import re
 import json
-from typing import Dict, Any, Tuple, Optional, List
+import threading
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from time import perf_counter
+from typing import Dict, Any, Tuple, Optional, List, Iterable, Iterator, Callable
+
+from . import metrics
+from .metadata_formats import FORMAT_A1111, parse_hash_list, parse_hashes_json, parse_json_metadata, sniff_metadata_format
+from .parse_cache import get_parse_cache
+
+
+def _to_int(value: str) -> Any:
+    """
+    Convert to int, keeping the raw string when it isn't a number
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _to_float(value: str) -> Any:
+    """
+    Convert to float, keeping the raw string when it isn't a number
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# Built-in parameters: (parsed_data field, label, value regex, coercer). The
+# value regex is matched right after "Label:" and its first group is the value.
+_BUILTIN_PARAMETERS = (
+    ("steps", "Steps", r'\s*(\d+)', _to_int),
+    ("cfg_scale", "CFG scale", r'\s*([\d.]+)', _to_float),
+    ("sampler", "Sampler", r'\s*([^,\n]+)', str),
+    ("scheduler", "Schedule type", r'\s*([^,\n]+)', str),
+    ("seed", "Seed", r'\s*(\d+)', _to_int),
+    ("size", "Size", r'\s*(\d+x\d+)', str),
+    ("model", "Model", r'\s*([^,\n]+)', str),
+    ("model_hash", "Model hash", r'\s*([0-9a-fA-F]+)', str),
+    ("vae", "VAE", r'\s*([^,\n]+)', str),
+    ("clip_skip", "Clip skip", r'\s*(\d+)', _to_int),
+    ("eta", "Eta", r'\s*([\d.]+)', _to_float),
+    ("denoising_strength", "Denoising strength", r'\s*([\d.]+)', _to_float),
+    ("lora_hashes", "Lora hashes", r'\s*"([^"]*)"', parse_hash_list),
+    ("ti_hashes", "TI hashes", r'\s*"([^"]*)"', parse_hash_list),
+    ("hashes", "Hashes", r'\s*(\{[^}]*\})', parse_hashes_json),
+)
+
+# Section marker closing the positive prompt, not a parameter
+_NEGATIVE_PROMPT_LABEL = "negative prompt"
+
+
+class _ParameterRegistry:
+    """
+    Immutable, precompiled view of the registered parameters
+    
+    register_parameter builds a new registry and swaps it in, so the parser
+    always reads a consistent snapshot and never compiles anything per call.
+    """
+    
+    __slots__ = ("specs", "params", "labels", "value_res", "coercers", "token_labels", "token_re", "fingerprint")
+    
+    def __init__(self, specs: Tuple[Tuple[str, str, str, Callable[[str], Any]], ...]):
+        self.specs = specs
+        self.params = tuple(param for param, _, _, _ in specs)
+        
+        # Lower-cased label -> parsed_data field
+        self.labels = {label.lower(): param for param, label, _, _ in specs}
+        self.value_res = {param: re.compile(pattern, re.IGNORECASE) for param, _, pattern, _ in specs}
+        self.coercers = {param: coercer for param, _, _, coercer in specs}
+        
+        # Every section marker and parameter label, found in one pass. The
+        # pattern starts with the literal ":" so the scan skips straight from
+        # colon to colon, and the label in front of it is checked by a
+        # lookbehind; the group that matched tells which label it was. Longer
+        # labels come first so "Hires steps" wins over "Steps" at the same colon.
+        self.token_labels = tuple(sorted((_NEGATIVE_PROMPT_LABEL,) + tuple(self.labels), key=len, reverse=True))
+        self.token_re = re.compile(
+            ':(?:' + '|'.join('(?<=(%s):)' % re.escape(label) for label in self.token_labels) + ')',
+            re.IGNORECASE
+        )
+        
+        # Identifies the parse rules in cache keys, so results cached before a
+        # registration change are not reused
+        signature = repr([(param, label, pattern, _coercer_signature(coercer))
+                          for param, label, pattern, coercer in specs])
+        self.fingerprint = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+
+
+def _coercer_signature(coercer: Callable[[str], Any]) -> str:
+    """
+    Name a coercer for the registry fingerprint
+    
+    Module-level functions and types are named by their import path, which
+    stays the same across restarts, so the disk cache keeps serving them.
+    Lambdas, nested functions and callable objects share names, so their
+    identity is added; their results are only reused within the process.
+    """
+    qualname = getattr(coercer, "__qualname__", None)
+    module = getattr(coercer, "__module__", None)
+    if isinstance(qualname, str) and "<" not in qualname and (module is None or isinstance(module, str)):
+        return f"{module}.{qualname}"
+    return f"{type(coercer).__qualname__}@{id(coercer):x}"
+
+
+_REGISTRY = _ParameterRegistry(_BUILTIN_PARAMETERS)
+
+_REGISTRY_LOCK = threading.Lock()
+
+
+def register_parameter(param: str, label: str, value_pattern: str = r'\s*([^,\n]+)',
+                       coercer: Callable[[str], Any] = str) -> None:
+    """
+    Register a "Label: value" parameter to parse into parsed_data[param]
+    
+    Patterns are compiled once here, not on the parsing path. Registering an
+    existing field replaces it. Register at import time so process pool
+    workers (parse_many, pipeline) see the same parameters.
+    
+    Args:
+        param: parsed_data key to fill
+        label: Label as written in the metadata, matched case-insensitively
+        value_pattern: Regex matched right after "Label:", group 1 is the value
+        coercer: Converts the stripped value string, e.g. int
+    """
+    global _REGISTRY
+    
+    if label.lower() == _NEGATIVE_PROMPT_LABEL:
+        raise ValueError(f"'{label}' is a section marker and can't be registered")
+    if re.compile(value_pattern).groups < 1:
+        raise ValueError("value_pattern must capture the value in group 1")
+    
+    with _REGISTRY_LOCK:
+        specs = []
+        replaced = False
+        for spec in _REGISTRY.specs:
+            if spec[0] == param:
+                specs.append((param, label, value_pattern, coercer))
+                replaced = True
+            elif spec[1].lower() != label.lower():
+                specs.append(spec)
+        if not replaced:
+            specs.append((param, label, value_pattern, coercer))
+        
+        _REGISTRY = _ParameterRegistry(tuple(specs))
+
+
+def registered_parameters() -> Tuple[Tuple[str, str, str, Callable[[str], Any]], ...]:
+    """
+    Return the registered (field, label, value regex, coercer) specs
+    """
+    return _REGISTRY.specs
+
+
+# Defaults for fields missing from the metadata
+_PARSED_DEFAULTS = (
+    ("steps", 20),
+    ("cfg_scale", 7.0),
+    ("sampler", "Euler a"),
+    ("scheduler", "normal"),
+    ("seed", -1),
+    ("size", "512x512"),
+    ("negative_prompt", ""),
+    ("positive_prompt", ""),
+)
+
+_PROMPT_PREFIX_RE = re.compile(r'^(prompt:|positive prompt:)', re.IGNORECASE)
+
+# Extra network tags: <lora:name>, <lora:name:weight>, <lora:name:te_weight:unet_weight>,
+# named weights (<lora:name:unet=0.5>) and the same forms for lyco and hypernet
+_NETWORK_TAG_RE = re.compile(r'<(lora|lyco|hypernet):([^:>]+)((?::[^:>]*)*)>', re.IGNORECASE)
+
+# Double comma in a prompt whose whitespace is already collapsed
+_DOUBLE_COMMA_RE = re.compile(r' ?, ?, ?')
+
+# Generic A1111 parameter pair, values may be quoted when they contain commas
+_PARAM_PAIR_RE = re.compile(r'\s*(\w[\w \-/]+):\s*("(?:\\.|[^\\"])+"|[^,]*)(?:,|$)')
+
+
+class ParsedMetadata(MutableMapping):
+    """
+    Parsed metadata that decodes its fields on first access
+    
+    Parsing only locates the prompt sections and the raw parameter values;
+    prompts, LoRAs, typed parameters and extra_params are decoded when read,
+    so a job that only needs the seed and model never splits a prompt. It is
+    a mutable mapping with the keys (and key order) of the eager parse and
+    compares equal to the equivalent dict. Pickling and copying produce a
+    plain dict.
+    """
+    
+    __slots__ = ("_parser", "_registry", "_text", "_positive_end", "_negative_span", "_params_start",
+                 "_raw_values", "_keys", "_values")
+    
+    def __init__(self, parser: "MetadataParserNode", registry: "_ParameterRegistry", text: str,
+                 positive_end: Optional[int], negative_span: Optional[Tuple[int, Optional[int]]],
+                 raw_values: Dict[str, str], keep_unknown: bool = False):
+        self._parser = parser
+        self._registry = registry
+        self._text = text
+        self._positive_end = positive_end
+        self._negative_span = negative_span
+        self._raw_values = raw_values
+        
+        # The parameter section starts at the "Steps:" that closes the prompts
+        self._params_start = negative_span[1] if negative_span is not None else positive_end
+        
+        keys = ["positive_prompt", "loras"]
+        if negative_span is not None:
+            keys.append("negative_prompt")
+        keys.extend(param for param in registry.params if param in raw_values)
+        if keep_unknown:
+            keys.append("extra_params")
+        self._keys = dict.fromkeys(keys)
+        
+        self._values = {}
+        for key, default_value in _PARSED_DEFAULTS:
+            if key not in self._keys:
+                self._keys[key] = None
+                self._values[key] = default_value
+    
+    def _decode(self, key: str) -> Any:
+        """
+        Decode one field from the metadata text
+        """
+        timed = metrics.enabled
+        if timed:
+            start = perf_counter()
+        
+        if key in ("positive_prompt", "loras"):
+            # Both come from one pass over the positive prompt
+            prompt = _PROMPT_PREFIX_RE.sub('', self._text[:self._positive_end].strip()).strip()
+            loras, clean_prompt = self._parser._extract_loras_from_prompt(prompt)
+            self._values.setdefault("positive_prompt", clean_prompt)
+            self._values.setdefault("loras", loras)
+            value = self._values[key]
+            stage = "lora_extraction"
+        else:
+            if key == "negative_prompt":
+                start_index, end_index = self._negative_span
+                value = self._text[start_index:end_index].strip()
+            elif key == "extra_params":
+                value = self._parser._extract_extra_params(self._text, self._params_start, self._registry)
+            else:
+                value = self._registry.coercers[key](self._raw_values[key])
+            self._values[key] = value
+            stage = "parameter_extraction"
+        
+        if timed:
+            metrics.observe("stage_seconds", perf_counter() - start, stage=stage)
+        return value
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        try:
+            return self._values[key]
+        except KeyError:
+            return self._decode(key)
+    
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._keys[key] = None
+        self._values[key] = value
+    
+    def __delitem__(self, key: str) -> None:
+        del self._keys[key]
+        self._values.pop(key, None)
+    
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+    
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return dict, (self.to_dict(),)
+    
+    def copy(self) -> Dict[str, Any]:
+        """
+        Fully decoded shallow copy, as a dict
+        """
+        return self.to_dict()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Decode every field into a plain dict
+        """
+        values = self._values
+        for key in self._keys:
+            if key not in values:
+                self._decode(key)
+        return {key: values[key] for key in self._keys}
 
 
 class MetadataParserNode:
@@ -20,6 +324,7 @@ class MetadataParserNode:
             },
             "optional": {
                 "auto_parse": ("BOOLEAN", {"default": True}),
+                "keep_unknown_params": ("BOOLEAN", {"default": False}),
             }
         }
     
@@ -29,7 +334,7 @@ class MetadataParserNode:
     FUNCTION = "parse_metadata"
     CATEGORY = "Metadata2Workflow"
     
-    def parse_metadata(self, metadata_text: str, auto_parse: bool = True) -> Tuple:
+    def parse_metadata(self, metadata_text: str, auto_parse: bool = True, keep_unknown_params: bool = False) -> Tuple:
         """
         Parse Civitai metadata from text input
         """
@@ -37,7 +342,7 @@ class MetadataParserNode:
             return self._empty_result()
         
         try:
-            parsed_data = self._parse_civitai_metadata(metadata_text)
+            parsed_data = self._parse_text(metadata_text, keep_unknown_params)
             
             return (
                 parsed_data.get("positive_prompt", ""),
@@ -51,156 +356,219 @@ class MetadataParserNode:
                 parsed_data,
                 parsed_data.get("loras", [])
             )
-            
+        
         except Exception as e:
             print(f"Error parsing metadata: {str(e)}")
+            if metrics.enabled:
+                metrics.count_error("parse", e)
             return self._empty_result()
     
-    def _parse_civitai_metadata(self, text: str) -> Dict[str, Any]:
+    def _parse_text(self, text: str, keep_unknown: bool = False) -> Dict[str, Any]:
+        """
+        Parse one metadata string into parsed_data, raising on failure
+        
+        This is the parsing core shared by parse_metadata and parse_many.
+        Repeated inputs are served from the parse cache. The result is a
+        plain dict whether or not it came from the cache; parse_lazy is the
+        way to a ParsedMetadata.
+        """
+        if not text.strip():
+            return self._empty_result()[8]
+        
+        cache = get_parse_cache()
+        if cache is None:
+            parsed_data = self._parse_civitai_metadata(text, keep_unknown)
+            return parsed_data if isinstance(parsed_data, dict) else parsed_data.to_dict()
+        
+        return cache.get_or_parse(text, keep_unknown, self._parse_civitai_metadata, _REGISTRY.fingerprint)
+    
+    def _parse_civitai_metadata(self, text: str, keep_unknown: bool = False) -> Dict[str, Any]:
         """
         Parse Civitai metadata from various formats
+        
+        JSON metadata (Civitai, ComfyUI, NovelAI, InvokeAI) goes to the
+        parser of its format, see metadata_formats. A1111 text is tokenized
+        in a single sweep: every section marker and registered "Key:"
+        occurrence is located by one pass of the registry's token regex,
+        which gives both the prompt section boundaries and the raw parameter
+        values. Decoding the fields is left to ParsedMetadata.
+        
+        Args:
+            text: Raw metadata text
+            keep_unknown: Also keep parameters without a dedicated field
+                (Hires upscale, ADetailer, Version, ...) under "extra_params"
         """
-        parsed_data = {}
+        timed = metrics.enabled
+        if timed:
+            start = perf_counter()
         
         # Clean up the text
         text = text.strip()
         
-        # Try to extract positive prompt (everything before "Negative prompt:")
-        positive_match = re.search(r'^(.*?)(?=Negative prompt:|Steps:|$)', text, re.DOTALL | re.IGNORECASE)
-        if positive_match:
-            positive_prompt = positive_match.group(1).strip()
-            # Remove common prefixes
-            positive_prompt = re.sub(r'^(prompt:|positive prompt:)', '', positive_prompt, flags=re.IGNORECASE).strip()
+        if text.startswith("{"):
+            json_result = parse_json_metadata(text, self._extract_loras_from_prompt, keep_unknown)
+            if json_result is not None:
+                metadata_format, parsed_data = json_result
+                for key, default_value in _PARSED_DEFAULTS:
+                    parsed_data.setdefault(key, default_value)
+                if timed:
+                    metrics.observe("stage_seconds", perf_counter() - start, stage="format_parse")
+                    metrics.increment("parses_total", format=metadata_format)
+                return parsed_data
+        
+        positive_end = None
+        negative_start = None
+        negative_end = None
+        raw_values = {}
+        registry = _REGISTRY
+        token_labels = registry.token_labels
+        
+        for match in registry.token_re.finditer(text):
+            key = token_labels[match.lastindex - 1]
             
-            # Extract LoRA information from positive prompt
-            loras, clean_prompt = self._extract_loras_from_prompt(positive_prompt)
-            parsed_data["positive_prompt"] = clean_prompt
-            parsed_data["loras"] = loras
-        
-        # Extract negative prompt
-        negative_match = re.search(r'Negative prompt:\s*(.*?)(?=Steps:|$)', text, re.DOTALL | re.IGNORECASE)
-        if negative_match:
-            parsed_data["negative_prompt"] = negative_match.group(1).strip()
-        
-        # Extract parameters using regex patterns
-        parameter_patterns = {
-            "steps": r'Steps:\s*(\d+)',
-            "cfg_scale": r'CFG scale:\s*([\d.]+)',
-            "sampler": r'Sampler:\s*([^,\n]+)',
-            "scheduler": r'Schedule type:\s*([^,\n]+)',
-            "seed": r'Seed:\s*(\d+)',
-            "size": r'Size:\s*(\d+x\d+)',
-            "model": r'Model:\s*([^,\n]+)',
-            "vae": r'VAE:\s*([^,\n]+)',
-            "clip_skip": r'Clip skip:\s*(\d+)',
-            "eta": r'Eta:\s*([\d.]+)',
-            "denoising_strength": r'Denoising strength:\s*([\d.]+)',
-        }
+            # Section boundaries: the positive prompt stops at the first
+            # "Negative prompt:" or "Steps:", the negative prompt at the first
+            # "Steps:" that follows it
+            if key == _NEGATIVE_PROMPT_LABEL:
+                if positive_end is None:
+                    positive_end = match.start(match.lastindex)
+                if negative_start is None:
+                    negative_start = match.end()
+                continue
+            
+            if key == "steps":
+                if positive_end is None:
+                    positive_end = match.start(match.lastindex)
+                if negative_start is not None and negative_end is None:
+                    negative_end = match.start(match.lastindex)
+            
+            param = registry.labels[key]
+            if param in raw_values:
+                continue
+            
+            value_match = registry.value_res[param].match(text, match.end())
+            if value_match:
+                raw_values[param] = value_match.group(1).strip()
         
-        for param, pattern in parameter_patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                value = match.group(1).strip()
-                # Convert to appropriate type
-                if param in ["steps", "seed", "clip_skip"]:
-                    try:
-                        parsed_data[param] = int(value)
-                    except ValueError:
-                        parsed_data[param] = value
-                elif param in ["cfg_scale", "eta", "denoising_strength"]:
-                    try:
-                        parsed_data[param] = float(value)
-                    except ValueError:
-                        parsed_data[param] = value
-                else:
-                    parsed_data[param] = value
+        if timed:
+            metrics.observe("stage_seconds", perf_counter() - start, stage="section_split")
+            metrics.increment("parses_total", format=FORMAT_A1111)
         
-        # Set defaults for missing values
-        defaults = {
-            "steps": 20,
-            "cfg_scale": 7.0,
-            "sampler": "Euler a",
-            "scheduler": "normal",
-            "seed": -1,
-            "size": "512x512",
-            "negative_prompt": "",
-            "positive_prompt": "",
-            "loras": []
-        }
+        negative_span = (negative_start, negative_end) if negative_start is not None else None
+        return ParsedMetadata(self, registry, text, positive_end, negative_span, raw_values, keep_unknown)
+    
+    def _extract_extra_params(self, text: str, params_start: Optional[int], registry: _ParameterRegistry) -> Dict[str, str]:
+        """
+        Collect "Key: value" pairs from the parameter section that have no
+        dedicated field, keyed by their original name
+        """
+        extra_params = {}
+        if params_start is None:
+            return extra_params
         
-        for key, default_value in defaults.items():
-            if key not in parsed_data:
-                parsed_data[key] = default_value
+        for match in _PARAM_PAIR_RE.finditer(text, params_start):
+            key = match.group(1).strip()
+            if key.lower() in registry.labels or key in extra_params:
+                continue
+            
+            value = match.group(2).strip()
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            extra_params[key] = value
         
-        return parsed_data
+        return extra_params
     
     def _extract_loras_from_prompt(self, prompt: str) -> Tuple[List[Dict[str, Any]], str]:
         """
         Extract LoRA information from prompt text
         
+        Handles <lora:...>, <lyco:...> and <hypernet:...> tags. A single
+        weight applies to both the model and CLIP; <lora:name:te:unet> (or
+        te=/unet= named weights) sets them separately, A1111 style. The
+        clean prompt is assembled from the text between tags in one join.
+        
         Args:
             prompt: The prompt text containing LoRA tags
-            
+        
         Returns:
             Tuple of (loras_list, clean_prompt)
         """
         loras = []
-        clean_prompt = prompt
-        
-        # Pattern to match LoRA tags: <lora:name:weight> or <lora:name>
-        lora_pattern = r'<lora:([^:>]+):?([0-9]*\.?[0-9]*)>'
+        seen_tags = set()
+        pieces = []
+        last_end = 0
         
-        matches = re.finditer(lora_pattern, prompt, re.IGNORECASE)
-        
-        for match in matches:
-            lora_name = match.group(1).strip()
-            lora_weight = match.group(2).strip()
+        for match in _NETWORK_TAG_RE.finditer(prompt):
+            pieces.append(prompt[last_end:match.start()])
+            last_end = match.end()
             
-            # Default weight is 1.0 if not specified
-            if not lora_weight:
-                lora_weight = 1.0
-            else:
-                try:
-                    lora_weight = float(lora_weight)
-                except ValueError:
-                    lora_weight = 1.0
+            # Identical duplicate tags load the network once
+            full_tag = match.group(0)
+            if full_tag in seen_tags:
+                continue
+            seen_tags.add(full_tag)
+            
+            te_weight, unet_weight = self._parse_network_weights(match.group(3))
             
             loras.append({
-                "name": lora_name,
-                "strength": lora_weight,
-                "full_tag": match.group(0)
+                "name": match.group(2).strip(),
+                "strength": unet_weight,
+                "strength_clip": te_weight,
+                "type": match.group(1).lower(),
+                "full_tag": full_tag
             })
-            
-            # Remove LoRA tag from clean prompt
-            clean_prompt = clean_prompt.replace(match.group(0), "").strip()
         
-        # Clean up multiple spaces and commas
-        clean_prompt = re.sub(r'\s*,\s*,\s*', ', ', clean_prompt)
-        clean_prompt = re.sub(r'\s+', ' ', clean_prompt)
+        if not pieces:
+            clean_prompt = prompt
+        else:
+            pieces.append(prompt[last_end:])
+            clean_prompt = "".join(pieces)
+        
+        # Clean up multiple spaces and commas: collapse whitespace runs, then
+        # only run the regex when a double comma is left
+        clean_prompt = " ".join(clean_prompt.split())
+        if ",," in clean_prompt or ", ," in clean_prompt:
+            clean_prompt = _DOUBLE_COMMA_RE.sub(', ', clean_prompt)
         clean_prompt = clean_prompt.strip(', ')
         
         return loras, clean_prompt
     
-    def _extract_additional_lora_info(self, text: str) -> Dict[str, Any]:
+    @staticmethod
+    def _parse_network_weights(params: str) -> Tuple[float, float]:
         """
-        Extract additional LoRA-related parameters from metadata text
+        Parse the ":..." parameters of a network tag into (te_weight, unet_weight)
+        
+        Missing or invalid weights default to 1.0, a missing UNet weight
+        follows the text encoder weight.
         """
-        lora_info = {}
+        positional = []
+        named = {}
         
-        # Look for LoRA-related parameters in the metadata
-        lora_patterns = {
-            "lora_hashes": r'Lora hashes:\s*"([^"]*)"',
-            "hashes": r'Hashes:\s*\{([^}]*)\}',
-            "version": r'Version:\s*([^,\n]+)',
-            "ti_hashes": r'TI hashes:\s*"([^"]*)"'
-        }
+        for param in params.split(":")[1:]:
+            param = param.strip()
+            if "=" in param:
+                key, _, value = param.partition("=")
+                named[key.strip().lower()] = value.strip()
+            else:
+                positional.append(param)
+        
+        te_value = named.get("te", positional[0] if positional else "")
+        unet_value = named.get("unet", positional[1] if len(positional) > 1 else None)
+        
+        try:
+            te_weight = float(te_value) if te_value else 1.0
+        except ValueError:
+            te_weight = 1.0
+        
+        if unet_value is None:
+            return te_weight, te_weight
         
-        for param, pattern in lora_patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                lora_info[param] = match.group(1).strip()
+        try:
+            unet_weight = float(unet_value) if unet_value else te_weight
+        except ValueError:
+            unet_weight = te_weight
         
-        return lora_info
+        return te_weight, unet_weight
     
     def _empty_result(self) -> Tuple:
         """
@@ -218,4 +586,114 @@ class MetadataParserNode:
             "loras": []
         }
         
-        return ("", "", 20, 7.0, "Euler a", "normal", -1, "512x512", empty_dict, [])
\ No newline at end of file
+        return ("", "", 20, 7.0, "Euler a", "normal", -1, "512x512", empty_dict, [])
+
+
+def detect_metadata_format(text: str) -> str:
+    """
+    Format of a metadata string: "a1111", "civitai", "comfyui", "novelai" or "invokeai"
+    """
+    return sniff_metadata_format(text)
+
+
+# Parser used by parse_many, one per worker process
+_BATCH_PARSER = MetadataParserNode()
+
+
+def parse_lazy(text: str, keep_unknown: bool = False) -> Dict[str, Any]:
+    """
+    Parse one metadata string, decoding each field only when it is read
+    
+    Meant for jobs that read a few fields of many texts, e.g. the seed and
+    model for deduplication. The parse cache is bypassed since it stores
+    fully decoded results. A1111 text gives a ParsedMetadata; JSON formats,
+    already decoded by json.loads, a plain dict.
+    """
+    return _BATCH_PARSER._parse_civitai_metadata(text, keep_unknown)
+
+
+def _parse_chunk(chunk: List[Tuple[int, Any]], keep_unknown: bool) -> List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Parse a chunk of (index, text) pairs, capturing errors per item
+    """
+    results = []
+    for index, text in chunk:
+        try:
+            if not isinstance(text, str):
+                raise TypeError(f"expected str, got {type(text).__name__}")
+            results.append((index, _BATCH_PARSER._parse_text(text, keep_unknown), None))
+        except Exception as e:
+            results.append((index, None, f"{type(e).__name__}: {str(e)}"))
+    return results
+
+
+def _iter_chunks(texts: Iterable[Any], chunksize: int) -> Iterator[List[Tuple[int, Any]]]:
+    """
+    Split an iterable into lists of (index, text) pairs
+    """
+    indexed = enumerate(texts)
+    while True:
+        chunk = list(islice(indexed, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_many(texts: Iterable[str], workers: Optional[int] = None, chunksize: int = 64,
+               ordered: bool = True, keep_unknown: bool = False) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Parse many metadata strings with a process pool
+    
+    Results are streamed back as (index, parsed_data, error) tuples, where
+    index is the position of the text in the input. A text that fails to
+    parse yields parsed_data None and an error message; the rest of the batch
+    carries on. The input is consumed lazily, with at most two chunks per
+    worker in flight, so arbitrarily long iterables can be processed.
+    
+    Args:
+        texts: Metadata strings to parse
+        workers: Number of worker processes (defaults to the CPU count);
+            1 or less parses in the calling process
+        chunksize: Number of texts sent to a worker at a time
+        ordered: Yield results in input order; otherwise as soon as ready
+        keep_unknown: Keep parameters without a dedicated field
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    chunks = _iter_chunks(texts, chunksize)
+    
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _parse_chunk(chunk, keep_unknown)
+        return
+    
+    max_pending = workers * 2
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(_parse_chunk, chunk, keep_unknown)
+                        for chunk in islice(chunks, max_pending))
+        
+        try:
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done = [future for future in pending if future in finished]
+                    for future in done:
+                        pending.remove(future)
+                
+                for future in done:
+                    yield from future.result()
+                    
+                    # Refill the window as results are consumed
+                    for chunk in islice(chunks, 1):
+                        pending.append(executor.submit(_parse_chunk, chunk, keep_unknown))
+        finally:
+            # Don't parse chunks nobody will read if the caller stops early
+            for future in pending:
+                future.cancel()
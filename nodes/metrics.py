@@ -0,0 +1,178 @@
+"""
+Counters and latency histograms for the parse and generate hot paths
+
+Disabled by default; instrumented code checks the module-level `enabled`
+flag before reading the clock, so the disabled cost is one attribute
+lookup per stage. Enable with METADATA2WORKFLOW_METRICS=1 or
+enable_metrics(), read with snapshot() or render_prometheus(), which also
+backs the GET /metadata2workflow/metrics route on the ComfyUI server.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Tuple
+
+METRICS_ENV = "METADATA2WORKFLOW_METRICS"
+
+PREFIX = "metadata2workflow_"
+
+# Upper bounds in seconds, a parse takes tens of microseconds
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0,
+)
+
+# Metric name -> (type, help)
+METRIC_DESCRIPTIONS: Dict[str, Tuple[str, str]] = {
+    "parses_total": ("counter", "Metadata texts parsed"),
+    "workflows_total": ("counter", "Workflows generated, by template"),
+    "errors_total": ("counter", "Failures, by stage and reason"),
+    "sampler_fallbacks_total": ("counter", "Unknown sampler names replaced by the default sampler, by name"),
+    "stage_seconds": ("histogram", "Latency of each parse and generate stage"),
+    "template_build_seconds": ("histogram", "Workflow build latency, by template"),
+}
+
+enabled = os.environ.get(METRICS_ENV, "").lower() in ("1", "true", "yes", "on")
+
+_lock = threading.Lock()
+
+# (name, sorted label items) -> count
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+# (name, sorted label items) -> [per-bucket counts..., +Inf count, sum]
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+
+
+def enable_metrics(value: bool = True) -> None:
+    """
+    Turn collection on or off; collected values are kept
+    """
+    global enabled
+    enabled = value
+
+
+def increment(name: str, amount: float = 1, **labels: str) -> None:
+    """
+    Add to a counter
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    """
+    Record one latency in a histogram
+    """
+    key = (name, tuple(sorted(labels.items())))
+    index = bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        histogram[index] += 1
+        histogram[-1] += seconds
+
+
+def count_error(stage: str, reason: Any) -> None:
+    """
+    Count a failure of stage; an exception counts under its type name
+    """
+    if isinstance(reason, BaseException):
+        reason = type(reason).__name__
+    increment("errors_total", stage=stage, reason=str(reason))
+
+
+def reset_metrics() -> None:
+    """
+    Drop every collected value
+    """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Collected values as plain data
+    
+    Returns:
+        {"counters": {name: [(labels, value)]}, "histograms": {name:
+        [(labels, {"buckets": [(upper bound, cumulative count)], "count",
+        "sum"})]}}, labels being dicts
+    """
+    with _lock:
+        counters = list(_counters.items())
+        histograms = [(key, list(values)) for key, values in _histograms.items()]
+    
+    result = {"counters": {}, "histograms": {}}
+    for (name, labels), value in sorted(counters):
+        result["counters"].setdefault(name, []).append((dict(labels), value))
+    
+    for (name, labels), values in sorted(histograms):
+        buckets = []
+        total = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), values):
+            total += count
+            buckets.append((bound, total))
+        result["histograms"].setdefault(name, []).append(
+            (dict(labels), {"buckets": buckets, "count": total, "sum": values[-1]})
+        )
+    return result
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    """
+    Prometheus label set, empty when there are no labels
+    """
+    if not labels:
+        return ""
+    escaped = (
+        '%s="%s"' % (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _format_value(value: float) -> str:
+    """
+    Sample value without loss of precision, whole numbers as integers
+    """
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_prometheus() -> str:
+    """
+    Collected values in the Prometheus text exposition format
+    """
+    data = snapshot()
+    lines = []
+    if not enabled:
+        lines.append(f"# metrics collection is disabled, set {METRICS_ENV}=1")
+    
+    for name, series in data["counters"].items():
+        metric_type, help_text = METRIC_DESCRIPTIONS.get(name, ("counter", name))
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+        for labels, value in series:
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+    
+    for name, series in data["histograms"].items():
+        metric_type, help_text = METRIC_DESCRIPTIONS.get(name, ("histogram", name))
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+        for labels, histogram in series:
+            for bound, count in histogram["buckets"]:
+                bucket_labels = dict(labels, le=_format_bound(bound))
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram['sum']!r}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram['count']}")
+    
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,601 @@
+"""
+Index of local model files by name and by the hashes A1111 records
+
+    Model hash: 31e35c80fc     AutoV2, SHA-256 of the file, first 10 hex digits
+    Model hash: 7460a6fa       AutoV1 (older A1111), SHA-256 of the 64 KiB at 1 MiB
+    Lora hashes: "x: 2c0f7ab4c9a1"    SHA-256 of a .safetensors LoRA after its
+                                      header ("addnet"), first 12 hex digits
+    TI hashes: "y: 9c6c5d3ec8f2"      SHA-256 of the embedding file, first 12
+
+Each file is hashed once. Hashes are kept in an SQLite cache keyed by path
+and checked against the file's size and mtime, so a multi-GB checkpoint is
+only read again after it changes. Uncached files are hashed through a
+memory map on a thread pool; hashlib releases the GIL while it works. A
+lookup is a few dict hits, by hash, by file name or by the name's letters
+and digits alone.
+
+Inside ComfyUI the checkpoint, LoRA and embedding folders come from
+folder_paths. They are indexed on the first conversion, not at startup,
+and hashed in a background thread; names resolve at once, hashes as they
+are computed. The batch CLI indexes before converting:
+
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl --checkpoints-dir models/checkpoints
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+MODEL_EXTENSIONS = (".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin")
+
+# Checkpoint used when the metadata names none
+DEFAULT_CHECKPOINT = "sd_xl_base_1.0.safetensors"
+
+# ComfyUI model folders indexed on first use
+MODEL_KINDS = ("checkpoints", "loras", "embeddings")
+
+# Kinds A1111 identifies by their addnet hash
+ADDNET_HASH_KINDS = ("loras",)
+
+# Set to 0 to keep ComfyUI's model folders from being indexed and hashed
+HASH_MODELS_ENV = "METADATA2WORKFLOW_HASH_MODELS"
+
+# Hash cache used by default, in the user's cache directory so that it
+# survives plugin updates; inside ComfyUI its user directory is used instead
+HASH_CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                               "metadata2workflow", "model_hashes.sqlite")
+
+# AutoV1 hashes the 64 KiB at 1 MiB
+_AUTOV1_OFFSET = 0x100000
+_AUTOV1_SIZE = 0x10000
+
+# Bytes handed to hashlib per call
+_HASH_CHUNK_SIZE = 16 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    autov1 TEXT NOT NULL,
+    addnet TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+# Model kind (a ComfyUI folder name) -> index used for resolving names
+_INDEXES: Dict[str, "ModelIndex"] = {}
+
+# Whether ComfyUI's model folders were indexed, done once on first use
+_comfyui_indexed = False
+_comfyui_index_lock = threading.Lock()
+
+
+def file_hashes(path: str, addnet: bool = False) -> Tuple[str, str, Optional[str]]:
+    """
+    Full SHA-256, AutoV1 and addnet hash of a model file, from one pass over a memory map of it
+    
+    The addnet hash covers a .safetensors file after its JSON header, so it
+    survives metadata edits; it is only computed with addnet, and is None
+    for other files.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            empty = hashlib.sha256().hexdigest()
+            return empty, empty[:8], None
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            
+            view = memoryview(mm)
+            try:
+                autov1 = hashlib.sha256(view[_AUTOV1_OFFSET:_AUTOV1_OFFSET + _AUTOV1_SIZE]).hexdigest()[:8]
+                
+                # Tensor data starts after the 8-byte header length and the header
+                data_offset = None
+                if addnet and path.lower().endswith(".safetensors") and size >= 8:
+                    data_offset = 8 + int.from_bytes(view[:8], "little")
+                    if data_offset > size:
+                        data_offset = None
+                
+                digest = hashlib.sha256()
+                addnet_digest = hashlib.sha256() if data_offset is not None else None
+                for start in range(0, size, _HASH_CHUNK_SIZE):
+                    end = min(start + _HASH_CHUNK_SIZE, size)
+                    digest.update(view[start:end])
+                    if addnet_digest is not None and end > data_offset:
+                        addnet_digest.update(view[max(start, data_offset):end])
+            finally:
+                view.release()
+    
+    return digest.hexdigest(), autov1, addnet_digest.hexdigest() if addnet_digest is not None else None
+
+
+class HashCache:
+    """
+    Hashes of model files stored in an SQLite database
+    
+    A row is valid while the file keeps its size and mtime. Use from one
+    thread at a time.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Database file, created with its directory when missing
+        
+        Raises:
+            OSError, sqlite3.Error: The database can't be created or opened
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(_SCHEMA)
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(hashes)")}
+        if "addnet" not in columns:
+            # Caches written before LoRAs were indexed
+            self._connection.execute("ALTER TABLE hashes ADD COLUMN addnet TEXT")
+        self._connection.commit()
+    
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        Cached (sha256, autov1, addnet) of path, None when missing or stale
+        """
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, sha256, autov1, addnet FROM hashes WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return row[2], row[3], row[4]
+    
+    def put(self, path: str, size: int, mtime_ns: int, sha256: str, autov1: str,
+            addnet: Optional[str] = None) -> None:
+        """
+        Store and commit the hashes of path; hashing takes long enough that
+        every file gets its own commit
+        """
+        self._connection.execute(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, sha256, autov1, addnet, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, sha256, autov1, addnet, time.time()),
+        )
+        self._connection.commit()
+    
+    def close(self) -> None:
+        self._connection.close()
+    
+    def __enter__(self) -> "HashCache":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class ModelIndex:
+    """
+    Model files under a set of folders, looked up by hash or by name
+        
+        index = ModelIndex(["models/checkpoints"])
+        index.scan()
+        index.hash_files("model_hashes.sqlite")
+        index.resolve("31e35c80fc", "sd_xl_base_1.0")  # -> "SDXL/sd_xl_base_1.0.safetensors"
+    
+    Names are paths relative to their folder, as ComfyUI lists them. Lookups
+    only read dicts and hash_files only adds to them, so the index can
+    serve conversions while it is being hashed. It pickles to process pool
+    workers.
+    """
+    
+    def __init__(self, roots: Sequence[str], extensions: Tuple[str, ...] = MODEL_EXTENSIONS,
+                 addnet_hashes: bool = False):
+        """
+        Args:
+            roots: Folders holding the models; for duplicate names the first wins
+            extensions: File extensions of model files
+            addnet_hashes: Also index .safetensors files by their addnet hash,
+                as LoRAs are; costs a second digest over each file
+        """
+        self.roots = list(roots)
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.addnet_hashes = addnet_hashes
+        # Name -> file path
+        self.files: Dict[str, str] = {}
+        # Lower-cased name, with and without folders and extension -> name
+        self._names: Dict[str, str] = {}
+        # Letters and digits of the lower-cased file name without extension -> name
+        self._fuzzy_names: Dict[str, str] = {}
+        # Full and shortened sha256 and addnet hashes, and AutoV1 -> name
+        self._hashes: Dict[str, str] = {}
+    
+    def __len__(self) -> int:
+        return len(self.files)
+    
+    def scan(self) -> int:
+        """
+        List the model files under the roots and index their names
+        
+        Symlinked folders are followed, each real folder once per root, so a
+        link back up the tree doesn't loop.
+        
+        Returns:
+            Number of files found
+        """
+        for root in self.roots:
+            visited = set()
+            for directory, subdirs, filenames in os.walk(root, followlinks=True):
+                try:
+                    stat = os.stat(directory)
+                except OSError:
+                    subdirs[:] = []
+                    continue
+                # st_ino is 0 on filesystems without inode numbers
+                key = (stat.st_dev, stat.st_ino) if stat.st_ino else os.path.realpath(directory)
+                if key in visited:
+                    subdirs[:] = []
+                    continue
+                visited.add(key)
+                subdirs.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(self.extensions):
+                        path = os.path.join(directory, filename)
+                        self.add_file(os.path.relpath(path, root), path)
+        return len(self.files)
+    
+    def add_file(self, name: str, path: str) -> None:
+        """
+        Index a model file under its name
+        """
+        if name in self.files:
+            return
+        self.files[name] = path
+        
+        key = name.replace("\\", "/").lower()
+        basename = key.rsplit("/", 1)[-1]
+        for alias in (key, self._strip_extension(key), basename, self._strip_extension(basename)):
+            self._names.setdefault(alias, name)
+        fuzzy = _fuzzy_name(self._strip_extension(basename))
+        if fuzzy:
+            self._fuzzy_names.setdefault(fuzzy, name)
+    
+    def add_hashes(self, name: str, sha256: str, autov1: str, addnet: Optional[str] = None) -> None:
+        """
+        Index a model file by its hashes
+        """
+        keys = [autov1.lower()]
+        for digest in (sha256, addnet):
+            if digest:
+                digest = digest.lower()
+                keys.extend((digest, digest[:12], digest[:10]))
+        for key in keys:
+            self._hashes.setdefault(key, name)
+    
+    def hash_files(self, cache_path: Optional[str] = HASH_CACHE_PATH, workers: int = 2,
+                   progress: Optional[Callable[[str], None]] = None) -> int:
+        """
+        Index every scanned file by its hashes, computing those not cached
+        
+        Args:
+            cache_path: SQLite hash cache, None to hash everything in memory only
+            workers: Files hashed at once; keep it low on spinning disks
+            progress: Called with the name of each file hashed
+        
+        Returns:
+            Number of files hashed, as opposed to read from the cache
+        
+        A cache that can't be opened or written, e.g. in a read-only folder,
+        is reported and the hashes are kept in memory only.
+        """
+        cache = None
+        if cache_path:
+            try:
+                cache = HashCache(cache_path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Model hash cache {cache_path} unavailable, hashing in memory only: {str(e)}")
+        pending = []
+        try:
+            for name, path in list(self.files.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    print(f"Error reading model file {path}: {str(e)}")
+                    continue
+                cached = cache.get(path, stat.st_size, stat.st_mtime_ns) if cache is not None else None
+                if cached is not None and cached[2] is None and self._wants_addnet(path):
+                    # Hashed by an index that did not need the addnet hash
+                    cached = None
+                if cached is not None:
+                    self.add_hashes(name, *cached)
+                else:
+                    pending.append((name, path, stat))
+            
+            if not pending:
+                return 0
+            
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="metadata2workflow-hash") as executor:
+                futures = {
+                    executor.submit(file_hashes, path, self._wants_addnet(path)): (name, path, stat)
+                    for name, path, stat in pending
+                }
+                for future in as_completed(futures):
+                    name, path, stat = futures[future]
+                    try:
+                        sha256, autov1, addnet = future.result()
+                    except (OSError, ValueError) as e:
+                        print(f"Error hashing model file {path}: {str(e)}")
+                        continue
+                    self.add_hashes(name, sha256, autov1, addnet)
+                    if cache is not None:
+                        try:
+                            cache.put(path, stat.st_size, stat.st_mtime_ns, sha256, autov1, addnet)
+                        except sqlite3.Error as e:
+                            print(f"Model hash cache {cache_path} not writable, hashing in memory only: {str(e)}")
+                            cache.close()
+                            cache = None
+                    if progress is not None:
+                        progress(name)
+        finally:
+            if cache is not None:
+                cache.close()
+        
+        return len(pending)
+    
+    def resolve(self, model_hash: Optional[str] = None, name: Optional[str] = None) -> Optional[str]:
+        """
+        Name of the local file matching a hash or else a name, None when none does
+        
+        The hash may be a full SHA-256 or addnet hash or a prefix of 10 or 12
+        digits, or AutoV1. A name matches with or without its folders and
+        extension, ignoring case, and failing that by its letters and digits
+        alone, so "Add Detail" finds add-detail.safetensors.
+        """
+        if model_hash:
+            key = str(model_hash).strip().lower()
+            found = self._hashes.get(key)
+            if found is None and len(key) > 12:
+                found = self._hashes.get(key[:12])
+            if found is None and len(key) > 10:
+                found = self._hashes.get(key[:10])
+            if found is not None:
+                return found
+        
+        if name:
+            key = str(name).strip().replace("\\", "/").lower()
+            basename = key.rsplit("/", 1)[-1]
+            for alias in (key, self._strip_extension(key), basename, self._strip_extension(basename)):
+                found = self._names.get(alias)
+                if found is not None:
+                    return found
+            fuzzy = _fuzzy_name(self._strip_extension(basename))
+            if fuzzy:
+                return self._fuzzy_names.get(fuzzy)
+        
+        return None
+    
+    def _wants_addnet(self, path: str) -> bool:
+        return self.addnet_hashes and path.lower().endswith(".safetensors")
+    
+    def _strip_extension(self, name: str) -> str:
+        """
+        Name without its model file extension; "sd_xl_base_1.0" keeps its ".0"
+        """
+        for extension in self.extensions:
+            if name.endswith(extension):
+                return name[:-len(extension)]
+        return name
+
+
+def _fuzzy_name(name: str) -> str:
+    return "".join(char for char in name if char.isalnum())
+
+
+def set_model_index(kind: str, index: Optional[ModelIndex]) -> None:
+    """
+    Use index to resolve models of a kind ("checkpoints"), None to stop
+    """
+    if index is None:
+        _INDEXES.pop(kind, None)
+    else:
+        _INDEXES[kind] = index
+
+
+def get_model_index(kind: str) -> Optional[ModelIndex]:
+    """
+    Index in use for a kind of model, if any
+    """
+    return _INDEXES.get(kind)
+
+
+def _resolver_index(kind: str) -> Optional[ModelIndex]:
+    """
+    Index resolving models of a kind, indexing ComfyUI's folders on first use
+    """
+    if not _comfyui_indexed:
+        index_comfyui_models()
+    return _INDEXES.get(kind)
+
+
+def model_indexes() -> Dict[str, ModelIndex]:
+    """
+    Every index in use by kind, e.g. to hand to worker processes
+    """
+    if not _comfyui_indexed:
+        index_comfyui_models()
+    return dict(_INDEXES)
+
+
+def resolve_checkpoint(data: Dict[str, Any]) -> str:
+    """
+    Local checkpoint name for parsed metadata
+    
+    The checkpoint index is searched by "model_hash", then by "model"; the
+    parsed name itself is the fallback.
+    """
+    index = _resolver_index("checkpoints")
+    if index is not None:
+        model_hash = data.get("model_hash")
+        if not model_hash and isinstance(data.get("hashes"), dict):
+            model_hash = data["hashes"].get("model")
+        found = index.resolve(model_hash, data.get("model"))
+        if found is not None:
+            return found
+    return data.get("model", DEFAULT_CHECKPOINT)
+
+
+def _resource_hashes(data: Dict[str, Any], field: str, prefix: str) -> Dict[str, str]:
+    """
+    Name -> hash from an A1111 hash list field and the matching Civitai
+    "Hashes" entries, the list winning
+    """
+    hashes = {}
+    civitai = data.get("hashes")
+    if isinstance(civitai, dict):
+        for key, value in civitai.items():
+            if key.lower().startswith(prefix) and value:
+                hashes[key[len(prefix):]] = str(value)
+    listed = data.get(field)
+    if isinstance(listed, dict):
+        hashes.update((name, str(value)) for name, value in listed.items() if value)
+    return hashes
+
+
+def lora_hashes(data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    LoRA name -> addnet hash from parsed metadata
+    """
+    return _resource_hashes(data, "lora_hashes", "lora:")
+
+
+def embedding_hashes(data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Embedding name -> hash from parsed metadata
+    """
+    return _resource_hashes(data, "ti_hashes", "embed:")
+
+
+def resolve_lora(name: str, lora_hash: Optional[str] = None) -> str:
+    """
+    Local LoRA name for a <lora:name:weight> tag, the tag's name when not found
+    """
+    index = _resolver_index("loras")
+    if index is not None:
+        found = index.resolve(lora_hash, name)
+        if found is not None:
+            return found
+    return name
+
+
+def embedding_resolver(data: Dict[str, Any]) -> Optional[Callable[[str], str]]:
+    """
+    Function rewriting the embeddings named in "TI hashes" to ComfyUI's
+    embedding:file syntax in a prompt, None when there is nothing to rewrite
+    
+    A1111 prompts name embeddings bare; ComfyUI reads them as plain words
+    unless prefixed. Names that do not resolve to a local file are left
+    alone, as are files whose names would not survive as a prompt token.
+    """
+    index = _resolver_index("embeddings")
+    if index is None:
+        return None
+    
+    replacements = {}
+    for name, embedding_hash in embedding_hashes(data).items():
+        found = index.resolve(embedding_hash, name)
+        if found is None or any(char in found for char in " \t\n,()"):
+            continue
+        replacements[name.lower()] = "embedding:" + found
+    if not replacements:
+        return None
+    
+    names = sorted(replacements, key=len, reverse=True)
+    pattern = re.compile(r'(?<![\w:])(' + "|".join(re.escape(name) for name in names) + r')(?!\w)',
+                         re.IGNORECASE)
+    return lambda prompt: pattern.sub(lambda match: replacements[match.group(1).lower()], prompt)
+
+
+def comfyui_model_folders(kind: str) -> List[str]:
+    """
+    ComfyUI's folders for a kind of model, empty outside ComfyUI
+    """
+    try:
+        import folder_paths
+    except ImportError:
+        return []
+    try:
+        return [folder for folder in folder_paths.get_folder_paths(kind) if os.path.isdir(folder)]
+    except KeyError:
+        return []
+
+
+def comfyui_hash_cache_path() -> str:
+    """
+    Hash cache used inside ComfyUI, in its user directory, which survives
+    plugin updates; HASH_CACHE_PATH when ComfyUI has none
+    """
+    try:
+        import folder_paths
+        return os.path.join(folder_paths.get_user_directory(), "metadata2workflow", "model_hashes.sqlite")
+    except (ImportError, AttributeError) as e:
+        print(f"ComfyUI user directory unavailable ({str(e)}), caching model hashes in {HASH_CACHE_PATH}")
+        return HASH_CACHE_PATH
+
+
+def index_comfyui_models(kinds: Sequence[str] = MODEL_KINDS, cache_path: Optional[str] = None,
+                         workers: int = 2) -> bool:
+    """
+    Index ComfyUI's model folders, hashing them in a background thread
+    
+    Runs once per process, from the first model lookup; kinds that already
+    have an index are left alone. The names are indexed before this returns.
+    The hashes are cached in cache_path, by default comfyui_hash_cache_path().
+    Returns False, without doing anything, when already run, outside
+    ComfyUI or when HASH_MODELS_ENV is 0.
+    """
+    global _comfyui_indexed
+    
+    with _comfyui_index_lock:
+        if _comfyui_indexed:
+            return False
+        _comfyui_indexed = True
+    
+    if os.environ.get(HASH_MODELS_ENV, "").lower() in ("0", "false", "no", "off"):
+        return False
+    
+    indexes = []
+    for kind in kinds:
+        if kind in _INDEXES:
+            continue
+        folders = comfyui_model_folders(kind)
+        if not folders:
+            continue
+        index = ModelIndex(folders, addnet_hashes=kind in ADDNET_HASH_KINDS)
+        index.scan()
+        set_model_index(kind, index)
+        indexes.append(index)
+    
+    if not indexes:
+        return False
+    if cache_path is None:
+        cache_path = comfyui_hash_cache_path()
+    
+    def hash_all() -> None:
+        # One kind at a time, so the disks aren't read from several places at once
+        for index in indexes:
+            try:
+                index.hash_files(cache_path, workers)
+            except Exception as e:
+                print(f"Error hashing models: {str(e)}")
+    
+    threading.Thread(target=hash_all, name="metadata2workflow-model-index", daemon=True).start()
+    return True
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+# Environment variable pointing to a sqlite file for the default cache's disk tier
+CACHE_PATH_ENV = "METADATA2WORKFLOW_PARSE_CACHE"
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Disk hits whose last-used time is kept in memory before it is written
+TOUCH_FLUSH_EVERY = 1000
+
+
+class ParseCache:
+    """
+    Content-addressed cache of parsed metadata
+    
+    Entries are keyed by a hash of the input text and stored as compact
+    UTF-8 JSON, so every hit returns a fresh dict the caller may modify and
+    the size limits are counted in encoded bytes. A bounded
+    in-memory LRU sits in front of an optional sqlite tier that survives
+    restarts.
+    
+    The sqlite tier has its own lock, so memory hits never wait on disk I/O.
+    Disk hits update the last-used time in memory; the times are written
+    with the next put, every TOUCH_FLUSH_EVERY hits and on close, so reads
+    don't commit.
+    """
+    
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, disk_path: Optional[str] = None,
+                 max_disk_bytes: Optional[int] = None):
+        """
+        Args:
+            max_bytes: Size limit of the in-memory tier
+            disk_path: sqlite file for the on-disk tier, None to keep it in memory only
+            max_disk_bytes: Size limit of the on-disk tier, None for unlimited
+        """
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.max_disk_bytes = max_disk_bytes
+        
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        
+        self._connection = None
+        self._connection_pid = None
+        self._disk_size = 0
+        # Guards the connection, _disk_size and _touched
+        self._disk_lock = threading.Lock()
+        # Key -> last-used time of disk hits not yet written
+        self._touched: Dict[str, float] = {}
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def key_for(text: str, keep_unknown: bool = False, namespace: str = "") -> str:
+        """
+        Return the cache key of a metadata text
+        
+        The text is normalized the same way the parser does (surrounding
+        whitespace is ignored), so inputs that parse identically share a key.
+        The namespace identifies the parse rules the result was produced with.
+        """
+        digest = hashlib.sha256(text.strip().encode("utf-8", errors="surrogatepass"))
+        if keep_unknown:
+            digest.update(b'\x00keep_unknown')
+        if namespace:
+            digest.update(b'\x00' + namespace.encode("utf-8"))
+        return digest.hexdigest()
+    
+    def get_or_parse(self, text: str, keep_unknown: bool,
+                     parse_fn: Callable[[str, bool], Dict[str, Any]], namespace: str = "") -> Dict[str, Any]:
+        """
+        Return the cached parse of text, calling parse_fn(text, keep_unknown) on a miss
+        
+        Hits and misses both return a plain dict; a mapping returned by
+        parse_fn is converted.
+        """
+        key = self.key_for(text, keep_unknown, namespace)
+        
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        
+        parsed_data = parse_fn(text, keep_unknown)
+        if not isinstance(parsed_data, dict):
+            # A lazily decoded ParsedMetadata
+            parsed_data = dict(parsed_data)
+        self.put(key, parsed_data)
+        return parsed_data
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a key in memory, then on disk
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(value)
+        
+        value = None
+        if self.disk_path:
+            with self._disk_lock:
+                value = self._disk_get(key)
+        
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self._memory_put(key, value)
+            self.disk_hits += 1
+        return json.loads(value)
+    
+    def put(self, key: str, parsed_data: Dict[str, Any]) -> None:
+        """
+        Store parsed data in both tiers
+        
+        Results that don't serialize to JSON, e.g. from a registered coercer
+        returning a datetime, are not cached.
+        """
+        if not isinstance(parsed_data, dict):
+            # A lazily decoded ParsedMetadata
+            parsed_data = dict(parsed_data)
+        try:
+            value = json.dumps(parsed_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError):
+            return
+        
+        with self._lock:
+            self._memory_put(key, value)
+        
+        if self.disk_path:
+            with self._disk_lock:
+                evicted = self._disk_put(key, value)
+            if evicted:
+                with self._lock:
+                    self.evictions += evicted
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and tier sizes
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_size if self.disk_path else 0,
+            }
+    
+    def clear(self) -> None:
+        """
+        Drop every entry from both tiers
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        
+        if self.disk_path:
+            with self._disk_lock:
+                connection = self._get_connection()
+                connection.execute("DELETE FROM parse_cache")
+                connection.commit()
+                self._disk_size = 0
+                self._touched.clear()
+    
+    def close(self) -> None:
+        """
+        Write pending last-used times and close the on-disk tier
+        """
+        with self._disk_lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._flush_touched()
+                self._connection.commit()
+                self._connection.close()
+            self._connection = None
+            self._touched.clear()
+    
+    def _memory_put(self, key: str, value: bytes) -> None:
+        """
+        Insert into the LRU and evict least recently used entries over the limit
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        
+        self._entries[key] = value
+        self._size += size
+        
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Open the sqlite tier, reconnecting in forked worker processes
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.commit()
+            self._disk_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()[0]
+            self._connection = connection
+            self._connection_pid = os.getpid()
+            # Hits recorded before a fork belong to the parent's connection
+            self._touched.clear()
+        return self._connection
+    
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        """
+        Read a value from the sqlite tier and mark it as recently used, in memory
+        """
+        connection = self._get_connection()
+        row = connection.execute("SELECT value FROM parse_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_FLUSH_EVERY:
+            self._flush_touched()
+            connection.commit()
+        return row[0]
+    
+    def _flush_touched(self) -> None:
+        """
+        Write the pending last-used times, uncommitted
+        """
+        if self._touched:
+            self._connection.executemany(
+                "UPDATE parse_cache SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+    
+    def _disk_put(self, key: str, value: bytes) -> int:
+        """
+        Write a value to the sqlite tier, evicting old rows over the limit
+        
+        Returns the number of rows evicted
+        """
+        connection = self._get_connection()
+        size = len(value)
+        if self.max_disk_bytes is not None and size > self.max_disk_bytes:
+            return 0
+        
+        # Pending hits go into this transaction, before eviction reads the order
+        self._flush_touched()
+        evicted = 0
+        previous = connection.execute("SELECT size FROM parse_cache WHERE key = ?", (key,)).fetchone()
+        connection.execute(
+            "INSERT OR REPLACE INTO parse_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time())
+        )
+        self._disk_size += size - (previous[0] if previous else 0)
+        
+        if self.max_disk_bytes is not None and self._disk_size > self.max_disk_bytes:
+            # Drop least recently used rows until back under the limit
+            rows = connection.execute("SELECT key, size FROM parse_cache ORDER BY last_used").fetchall()
+            for old_key, old_size in rows:
+                if self._disk_size <= self.max_disk_bytes:
+                    break
+                connection.execute("DELETE FROM parse_cache WHERE key = ?", (old_key,))
+                self._disk_size -= old_size
+                evicted += 1
+        
+        connection.commit()
+        return evicted
+
+
+_default_cache = ParseCache(disk_path=os.environ.get(CACHE_PATH_ENV) or None)
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """
+    Return the cache used by MetadataParserNode, None when disabled
+    """
+    return _default_cache
+
+
+def configure_parse_cache(max_bytes: int = DEFAULT_MAX_BYTES, disk_path: Optional[str] = None,
+                          max_disk_bytes: Optional[int] = None, enabled: bool = True) -> Optional[ParseCache]:
+    """
+    Replace the cache used by MetadataParserNode
+    
+    Args:
+        max_bytes: Size limit of the in-memory tier
+        disk_path: sqlite file for the on-disk tier
+        max_disk_bytes: Size limit of the on-disk tier
+        enabled: False disables caching altogether
+    """
+    global _default_cache
+    
+    if _default_cache is not None:
+        _default_cache.close()
+    
+    _default_cache = ParseCache(max_bytes, disk_path, max_disk_bytes) if enabled else None
+    return _default_cache
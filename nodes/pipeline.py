@@ -0,0 +1,463 @@
+"""
+Streaming conversion of image folders into ComfyUI workflows
+
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl.gz --resume
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl --manifest corpus.sqlite
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl --checkpoints-dir models/checkpoints
+    python -m nodes.pipeline IMAGE_DIR -o workflows.jsonl --loras-dir models/loras --embeddings-dir models/embeddings
+    python -m nodes.pipeline IMAGE_DIR -o workflows/ --format files
+    python -m nodes.pipeline IMAGE_DIR -o batch.json --format merged
+
+Stages: walk directory -> read metadata headers (thread pool) -> parse and
+generate workflow (process pool) -> write. Every stage is a generator and at
+most queue_size items are in flight between stages, so memory stays flat
+regardless of the corpus size.
+
+Images saved by ComfyUI carry the API prompt they were generated with;
+that graph is passed through as the workflow, exactly and without parsing,
+and only other images go through the parser and workflow generator.
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import metrics
+from .image_metadata import IMAGE_EXTENSIONS, extract_image_metadata
+from .jsonl_store import COMPRESSIONS, JsonlWriter, file_sha256, read_jsonl_sources
+from .manifest import Manifest
+from .metadata_parser import MetadataParserNode
+from .model_index import ADDNET_HASH_KINDS, HASH_CACHE_PATH, ModelIndex, model_indexes, set_model_index
+from .workflow_generator import WorkflowGeneratorNode
+from .workflow_graph import WorkflowGraph
+from .workflow_templates import load_workflow_template, workflow_template_names
+
+
+# Node instances used by the conversion stage, one per worker process
+_PARSER = MetadataParserNode()
+_GENERATOR = WorkflowGeneratorNode()
+
+
+def iter_image_files(root: str, recursive: bool = True, extensions: Tuple[str, ...] = IMAGE_EXTENSIONS) -> Iterator[str]:
+    """
+    Yield image file paths under root in a stable (sorted) order
+    """
+    pending_dirs = [root]
+    
+    while pending_dirs:
+        directory = pending_dirs.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Error reading directory {directory}: {str(e)}")
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith(extensions):
+                yield entry.path
+        
+        pending_dirs.extend(reversed(subdirs))
+
+
+def read_metadata(path: str, hash_source: bool = False, passthrough: bool = True) -> Dict[str, Any]:
+    """
+    I/O stage: read the embedded metadata text of one image
+    
+    With hash_source the item also gets the file's "sha256"; that reads the
+    whole file instead of just its metadata headers. With passthrough, an
+    image carrying a ComfyUI prompt comes back finished, its "workflow"
+    being that prompt and "embedded" True.
+    """
+    item = {"source": path}
+    try:
+        if hash_source:
+            item["sha256"] = file_sha256(path)
+        text, embedded_workflow = extract_image_metadata(path)
+    except Exception as e:
+        if metrics.enabled:
+            metrics.count_error("read", e)
+        item["error"] = f"{type(e).__name__}: {str(e)}"
+        return item
+    
+    if passthrough and embedded_workflow is not None:
+        if metrics.enabled:
+            metrics.increment("workflows_total", template="embedded")
+        item["workflow"] = embedded_workflow
+        item["embedded"] = True
+        return item
+    
+    if not text:
+        if metrics.enabled:
+            metrics.count_error("read", "no_metadata")
+        item["error"] = "No metadata found"
+        return item
+    
+    item["metadata"] = text
+    return item
+
+
+def convert_metadata(item: Dict[str, Any], workflow_template: str = "basic", model_name: str = "", vae_name: str = "") -> Dict[str, Any]:
+    """
+    CPU stage: parse metadata text and generate its workflow
+    
+    Items that already failed or carry their embedded workflow are returned as is.
+    """
+    if _is_finished(item):
+        return item
+    
+    result = {"source": item["source"]}
+    if "sha256" in item:
+        result["sha256"] = item["sha256"]
+    
+    try:
+        parsed_data = _PARSER._parse_text(item["metadata"])
+        workflow = _GENERATOR.build_workflow(parsed_data, model_name, vae_name, workflow_template)
+    except Exception as e:
+        if metrics.enabled:
+            metrics.count_error("convert", e)
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+        return result
+    
+    if "error" in workflow:
+        result["error"] = workflow["error"]
+    else:
+        result["workflow"] = workflow
+    return result
+
+
+def _is_finished(item: Dict[str, Any]) -> bool:
+    """
+    Whether a read_metadata item needs no conversion
+    """
+    return "error" in item or "workflow" in item
+
+
+def load_template_files(template_files: Sequence[str]) -> None:
+    """
+    Register workflow templates from JSON files (also run in each worker process)
+    """
+    for path in template_files:
+        load_workflow_template(path)
+
+
+def init_worker(template_files: Sequence[str], indexes: Optional[Dict[str, ModelIndex]] = None) -> None:
+    """
+    Process pool initializer: register the templates and model indexes of the parent
+    """
+    load_template_files(template_files)
+    for kind, index in (indexes or {}).items():
+        set_model_index(kind, index)
+
+
+def build_model_index(kind: str, roots: Sequence[str], cache_path: Optional[str] = HASH_CACHE_PATH,
+                      workers: int = 2, verbose: bool = True) -> ModelIndex:
+    """
+    Scan and hash the model files under roots and use them to resolve models of kind
+    """
+    index = ModelIndex(roots, addnet_hashes=kind in ADDNET_HASH_KINDS)
+    index.scan()
+    progress = (lambda name: print(f"Hashed {name}")) if verbose else None
+    hashed = index.hash_files(cache_path, workers, progress)
+    if verbose:
+        print(f"Indexed {len(index)} {kind}, {hashed} newly hashed")
+    set_model_index(kind, index)
+    return index
+
+
+def convert_images(paths: Iterable[str], workflow_template: str = "basic", model_name: str = "", vae_name: str = "",
+                   io_workers: int = 8, cpu_workers: Optional[int] = None, queue_size: int = 64,
+                   ordered: bool = True, template_files: Sequence[str] = (),
+                   hash_sources: bool = False, passthrough: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Convert images to workflows, streaming one result dict per image
+    
+    Results are {"source": path, "workflow": {...}} or, when the image has
+    no usable metadata, {"source": path, "error": message}. Workflows
+    passed through from ComfyUI images also have "embedded": True.
+    
+    Args:
+        paths: Image file paths
+        workflow_template: Name of a registered workflow template
+        model_name: Checkpoint name overriding the parsed model
+        vae_name: Optional VAE to load
+        io_workers: Threads reading image headers
+        cpu_workers: Processes parsing and generating (defaults to the CPU
+            count); 1 or less converts in the calling process
+        queue_size: Maximum items in flight between two stages
+        ordered: Yield results in input order; otherwise as soon as ready
+        template_files: JSON workflow templates to register before converting
+        hash_sources: Add the SHA-256 of each image file to its result
+        passthrough: Use the workflow embedded in ComfyUI images as is;
+            template, model_name and vae_name only apply to the others
+    """
+    if cpu_workers is None:
+        cpu_workers = os.cpu_count() or 1
+    
+    load_template_files(template_files)
+    
+    convert = partial(convert_metadata, workflow_template=workflow_template, model_name=model_name, vae_name=vae_name)
+    
+    with ThreadPoolExecutor(max_workers=max(1, io_workers)) as io_executor:
+        cpu_executor = None
+        if cpu_workers > 1:
+            cpu_executor = ProcessPoolExecutor(max_workers=cpu_workers, initializer=init_worker,
+                                               initargs=(tuple(template_files), model_indexes()))
+        try:
+            read = partial(read_metadata, hash_source=hash_sources, passthrough=passthrough)
+            items = _bounded_map(io_executor, read, paths, queue_size, ordered)
+            yield from _bounded_map(cpu_executor, convert, items, queue_size, ordered, skip=_is_finished)
+        finally:
+            if cpu_executor is not None:
+                cpu_executor.shutdown()
+
+
+def convert_directory(root: str, recursive: bool = True, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Convert every image under root, see convert_images for the options
+    """
+    return convert_images(iter_image_files(root, recursive), **kwargs)
+
+
+def write_jsonl(results: Iterable[Dict[str, Any]], output_path: str, compression: Optional[str] = None,
+                append: bool = False, flush_every: int = 1000,
+                on_flush: Optional[Callable[[], None]] = None) -> Tuple[int, int]:
+    """
+    Write results as one compact JSON object per line, see JsonlWriter
+    
+    Returns:
+        Tuple of (converted, failed) counts of this call
+    """
+    with JsonlWriter(output_path, compression, append, flush_every, on_flush) as writer:
+        writer.write_all(results)
+    
+    return writer.converted, writer.failed
+
+
+def workflow_file_path(source: str, output_dir: str, root: str) -> str:
+    """
+    Path of the workflow file written for the image source
+    """
+    return os.path.join(output_dir, os.path.splitext(os.path.relpath(source, root))[0] + ".json")
+
+
+def write_workflow_files(results: Iterable[Dict[str, Any]], output_dir: str, root: str) -> Tuple[int, int]:
+    """
+    Write one workflow JSON file per image, mirroring the layout under root
+    
+    Returns:
+        Tuple of (converted, failed) counts
+    """
+    converted = failed = 0
+    
+    for result in results:
+        if "error" in result:
+            print(f"Error converting {result['source']}: {result['error']}")
+            failed += 1
+            continue
+        
+        output_path = workflow_file_path(result["source"], output_dir, root)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(result["workflow"], f, indent=2, ensure_ascii=False)
+        converted += 1
+    
+    return converted, failed
+
+
+def write_merged_workflow(results: Iterable[Dict[str, Any]], output_path: str) -> Tuple[int, int]:
+    """
+    Merge every workflow into one file that loads each distinct model once
+    
+    Identical checkpoint, VAE and LoRA loaders are shared across images
+    (see merge_workflows), and the titles of each image's own nodes get its
+    file name, so the whole batch can be queued as one prompt.
+    
+    Returns:
+        Tuple of (converted, failed) counts
+    """
+    converted = failed = 0
+    graph = WorkflowGraph()
+    
+    for result in results:
+        if "error" in result:
+            print(f"Error converting {result['source']}: {result['error']}")
+            failed += 1
+            continue
+        
+        graph.merge(result["workflow"], label=os.path.basename(result["source"]))
+        converted += 1
+    
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(graph.nodes, f, indent=2, ensure_ascii=False)
+    
+    return converted, failed
+
+
+def _bounded_map(executor: Optional[Executor], fn: Callable[[Any], Any], items: Iterable[Any],
+                 max_pending: int, ordered: bool = True,
+                 skip: Optional[Callable[[Any], bool]] = None) -> Iterator[Any]:
+    """
+    Map fn over items on an executor with at most max_pending calls in flight
+    
+    The input is pulled lazily, so chained stages behave like bounded queues.
+    Without an executor fn runs inline. Items for which skip returns True
+    are yielded unchanged, in order, without being sent to the executor.
+    """
+    if executor is None:
+        for item in items:
+            yield item if skip is not None and skip(item) else fn(item)
+        return
+    
+    def submit(item: Any) -> Future:
+        if skip is not None and skip(item):
+            future = Future()
+            future.set_result(item)
+            return future
+        return executor.submit(fn, item)
+    
+    items = iter(items)
+    pending = deque(submit(item) for item in islice(items, max(1, max_pending)))
+    
+    try:
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+            
+            for future in done:
+                yield future.result()
+                
+                for item in islice(items, 1):
+                    pending.append(submit(item))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description="Convert a folder of Civitai images into ComfyUI workflows")
+    parser.add_argument("input_dir", help="Directory containing PNG, JPEG or WebP images")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file, directory with --format files, or JSON file with --format merged")
+    parser.add_argument("--format", choices=["jsonl", "files", "merged"], default="jsonl",
+                        help="Output format; merged writes one workflow with shared loaders")
+    parser.add_argument("--template", default="basic", help="Workflow template name (basic, advanced, img2img or from --template-file)")
+    parser.add_argument("--no-passthrough", action="store_true",
+                        help="Regenerate workflows for ComfyUI images too, instead of using their embedded prompt")
+    parser.add_argument("--template-file", action="append", default=[], help="Register a JSON workflow template, named after the file")
+    parser.add_argument("--model-name", default="", help="Checkpoint name overriding the parsed model")
+    parser.add_argument("--vae-name", default="", help="VAE name")
+    parser.add_argument("--no-recursive", action="store_true", help="Don't descend into subdirectories")
+    parser.add_argument("--io-workers", type=int, default=8, help="Threads reading image headers")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="Processes parsing metadata (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=64, help="Maximum items in flight between stages")
+    parser.add_argument("--unordered", action="store_true", help="Write results as soon as they are ready")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=None,
+                        help="JSONL compression (default: from the output extension, .gz or .xz)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Append to an existing JSONL output, skipping images it already holds")
+    parser.add_argument("--hash", action="store_true", help="Add each image's SHA-256 to its JSONL record")
+    parser.add_argument("--flush-every", type=int, default=1000, help="JSONL records buffered between writes")
+    parser.add_argument("--manifest", default=None,
+                        help="SQLite manifest; only new, modified or failed images are converted, JSONL output is appended")
+    parser.add_argument("--no-retry-failed", action="store_true", help="With --manifest, skip unchanged images that failed")
+    parser.add_argument("--checkpoints-dir", action="append", default=[],
+                        help="Resolve checkpoints to the files in this folder, by Model hash and then by name")
+    parser.add_argument("--loras-dir", action="append", default=[],
+                        help="Resolve LoRAs to the files in this folder, by Lora hashes and then by name")
+    parser.add_argument("--embeddings-dir", action="append", default=[],
+                        help="Rewrite the embeddings named in TI hashes to the files in this folder")
+    parser.add_argument("--hash-cache", default=HASH_CACHE_PATH, help="SQLite cache of model file hashes")
+    parser.add_argument("--hash-workers", type=int, default=2, help="Model files hashed at once")
+    args = parser.parse_args(argv)
+    
+    try:
+        load_template_files(args.template_file)
+    except (OSError, ValueError) as e:
+        parser.error(f"invalid template file: {str(e)}")
+    if args.template not in workflow_template_names():
+        parser.error(f"unknown template '{args.template}', available: {', '.join(workflow_template_names())}")
+    
+    if args.resume and args.format != "jsonl":
+        parser.error("--resume needs --format jsonl")
+    if args.manifest and args.format == "merged":
+        parser.error("--manifest needs --format jsonl or files")
+    
+    for kind, roots in (("checkpoints", args.checkpoints_dir), ("loras", args.loras_dir),
+                        ("embeddings", args.embeddings_dir)):
+        if roots:
+            build_model_index(kind, roots, args.hash_cache, args.hash_workers)
+    
+    paths = iter_image_files(args.input_dir, not args.no_recursive)
+    if args.resume:
+        done = read_jsonl_sources(args.output)
+        if done:
+            print(f"Resuming, skipping {len(done)} images already in {args.output}")
+            paths = (path for path in paths if path not in done)
+    
+    manifest = None
+    if args.manifest:
+        manifest = Manifest(args.manifest, retry_failed=not args.no_retry_failed)
+        paths = manifest.iter_changed(paths)
+    
+    results = convert_images(
+        paths,
+        workflow_template=args.template,
+        model_name=args.model_name,
+        vae_name=args.vae_name,
+        io_workers=args.io_workers,
+        cpu_workers=args.cpu_workers,
+        queue_size=args.queue_size,
+        ordered=not args.unordered,
+        template_files=args.template_file,
+        hash_sources=args.hash or manifest is not None,
+        passthrough=not args.no_passthrough,
+    )
+    
+    try:
+        if args.format == "jsonl":
+            on_flush = None
+            if manifest is not None:
+                # Rows are committed once their records are flushed to the output
+                results = manifest.track(results, args.output, commit_every=0)
+                on_flush = manifest.commit
+            converted, failed = write_jsonl(results, args.output, args.compression,
+                                            args.resume or manifest is not None, args.flush_every, on_flush)
+        elif args.format == "merged":
+            converted, failed = write_merged_workflow(results, args.output)
+        else:
+            if manifest is not None:
+                results = manifest.track(
+                    results, lambda result: workflow_file_path(result["source"], args.output, args.input_dir)
+                )
+            converted, failed = write_workflow_files(results, args.output, args.input_dir)
+    finally:
+        if manifest is not None:
+            manifest.close()
+    
+    if manifest is not None:
+        print(f"Skipped {manifest.skipped} unchanged images")
+    print(f"Converted {converted} images, {failed} failed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+TEXT_CHUNK_TYPES = (b'tEXt', b'iTXt', b'zTXt')
+
+# Keyword A1111/Civitai use for the generation parameters
+PARAMETERS_KEYWORD = "parameters"
+
+# Keywords ComfyUI saves its API prompt and its editor workflow under
+COMFYUI_PROMPT_KEYWORD = "prompt"
+COMFYUI_WORKFLOW_KEYWORD = "workflow"
+
+# JSON metadata of other tools (InvokeAI 3+, InvokeAI 2, NovelAI, ComfyUI),
+# used when there is no "parameters" chunk
+JSON_METADATA_KEYWORDS = ("invokeai_metadata", "sd-metadata", "Comment", COMFYUI_PROMPT_KEYWORD)
+
+
+def iter_png_text_chunks(source: Union[str, bytes]) -> Iterator[Tuple[str, str, str]]:
+    """
+    Walk the chunks of a PNG file and yield its text chunks
+    
+    A file is memory-mapped and only chunk headers and text chunk payloads
+    are touched, so image data (IDAT) is skipped without being read.
+    
+    Args:
+        source: PNG file path, or the file contents
+    
+    Yields:
+        Tuples of (keyword, text, chunk_type)
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield from _walk_text_chunks(source, len(source))
+        return
+    
+    with open(source, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < len(PNG_SIGNATURE):
+            raise ValueError("Invalid PNG file signature")
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Chunk headers are scattered across the file, readahead would
+            # only pull in image data
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_RANDOM"):
+                mm.madvise(mmap.MADV_RANDOM)
+            
+            yield from _walk_text_chunks(mm, file_size)
+
+
+def _walk_text_chunks(buffer: Any, size: int) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield the text chunks of a PNG held in a bytes-like buffer
+    """
+    if size < len(PNG_SIGNATURE) or buffer[:len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+        raise ValueError("Invalid PNG file signature")
+    
+    offset = len(PNG_SIGNATURE)
+    
+    # Each chunk is length (4) + type (4) + data + CRC (4)
+    while offset + 12 <= size:
+        chunk_length, chunk_type = struct.unpack_from(">I4s", buffer, offset)
+        data_start = offset + 8
+        data_end = data_start + chunk_length
+        
+        if data_end + 4 > size:
+            break
+        
+        if chunk_type in TEXT_CHUNK_TYPES:
+            result = _parse_text_chunk(buffer[data_start:data_end], chunk_type)
+            if result:
+                yield result[0], result[1], chunk_type.decode("ascii")
+        elif chunk_type == b'IEND':
+            break
+        
+        offset = data_end + 4
+
+
+def read_png_text_chunks(path: Union[str, bytes], stop_at_parameters: bool = False,
+                         stop_after: Sequence[str] = ()) -> Dict[str, str]:
+    """
+    Read the text chunks of a PNG file into a keyword -> text dict
+    
+    Args:
+        path: PNG file path, or the file contents
+        stop_at_parameters: Stop walking the file at the first "parameters" chunk
+        stop_after: Stop walking the file once all of these keywords were
+            read; overrides stop_at_parameters
+    """
+    pending = set(stop_after or ((PARAMETERS_KEYWORD,) if stop_at_parameters else ()))
+    texts = {}
+    for keyword, text, _ in iter_png_text_chunks(path):
+        texts.setdefault(keyword, text)
+        if pending:
+            pending.discard(keyword)
+            if not pending:
+                break
+    return texts
+
+
+def extract_png_parameters(path: Union[str, bytes]) -> Optional[str]:
+    """
+    Return the A1111 "parameters" text of a PNG file, or None if absent
+    
+    Without one, the JSON metadata InvokeAI, NovelAI or ComfyUI write is
+    returned instead; metadata_formats parses it.
+    """
+    return _parameters_from_texts(read_png_text_chunks(path, stop_at_parameters=True))
+
+
+def extract_png_metadata(path: Union[str, bytes]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return the parameters text and the ComfyUI API prompt of a PNG file
+    
+    Both come from one walk over the file, which goes on past a
+    "parameters" chunk until the "prompt" chunk or the end of the text, as
+    some ComfyUI saver nodes write parameters first. The parameters text is
+    what extract_png_parameters returns; the prompt is the raw "prompt"
+    chunk, None when the image was not saved by ComfyUI.
+    """
+    texts = read_png_text_chunks(path, stop_after=(PARAMETERS_KEYWORD, COMFYUI_PROMPT_KEYWORD))
+    return _parameters_from_texts(texts), texts.get(COMFYUI_PROMPT_KEYWORD)
+
+
+def _parameters_from_texts(texts: Dict[str, str]) -> Optional[str]:
+    """
+    Pick the generation parameters out of the text chunks of a PNG file
+    """
+    if PARAMETERS_KEYWORD in texts:
+        return texts[PARAMETERS_KEYWORD]
+    
+    for keyword in JSON_METADATA_KEYWORDS:
+        text = texts.get(keyword)
+        if text is None or not text.lstrip().startswith("{"):
+            continue
+        # Older NovelAI images keep the prompt in the "Description" chunk
+        if keyword == "Comment" and "Description" in texts:
+            try:
+                data = json.loads(text)
+            except ValueError:
+                continue
+            if isinstance(data, dict) and "prompt" not in data:
+                data["prompt"] = texts["Description"]
+                text = json.dumps(data, ensure_ascii=False)
+        return text
+    
+    return None
+
+
+def _parse_text_chunk(data: bytes, chunk_type: bytes) -> Optional[Tuple[str, str]]:
+    """
+    Decode a tEXt, zTXt or iTXt chunk payload into (keyword, text)
+    """
+    null_index = data.find(b'\x00')
+    if null_index == -1:
+        return None
+    
+    keyword = data[:null_index].decode("latin-1")
+    
+    try:
+        if chunk_type == b'tEXt':
+            return keyword, _decode_text(data[null_index + 1:])
+        
+        if chunk_type == b'zTXt':
+            # keyword\0 compression_method compressed_text
+            if null_index + 2 > len(data) or data[null_index + 1] != 0:
+                return None
+            return keyword, _decode_text(zlib.decompress(data[null_index + 2:]))
+        
+        if chunk_type == b'iTXt':
+            # keyword\0 compression_flag compression_method language\0 translated_keyword\0 text
+            if null_index + 3 > len(data):
+                return None
+            compressed = data[null_index + 1] == 1
+            language_end = data.find(b'\x00', null_index + 3)
+            translated_end = data.find(b'\x00', language_end + 1) if language_end != -1 else -1
+            if translated_end == -1:
+                return None
+            text = data[translated_end + 1:]
+            if compressed:
+                text = zlib.decompress(text)
+            return keyword, text.decode("utf-8", errors="replace")
+    except zlib.error:
+        return None
+    
+    return None
+
+
+def _decode_text(data: bytes) -> str:
+    """
+    Decode tEXt/zTXt payloads; the spec says Latin-1 but many tools write UTF-8
+    """
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
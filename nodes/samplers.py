@@ -0,0 +1,208 @@
+import re
+from typing import Dict, Optional, Set, Tuple
+
+from . import metrics
+
+
+# KSampler.SAMPLERS of current ComfyUI
+COMFYUI_SAMPLERS = (
+    "euler", "euler_cfg_pp", "euler_ancestral", "euler_ancestral_cfg_pp", "heun", "heunpp2",
+    "dpm_2", "dpm_2_ancestral", "lms", "dpm_fast", "dpm_adaptive",
+    "dpmpp_2s_ancestral", "dpmpp_2s_ancestral_cfg_pp", "dpmpp_sde", "dpmpp_sde_gpu",
+    "dpmpp_2m", "dpmpp_2m_cfg_pp", "dpmpp_2m_sde", "dpmpp_2m_sde_gpu", "dpmpp_3m_sde", "dpmpp_3m_sde_gpu",
+    "ddpm", "lcm", "ipndm", "ipndm_v", "deis", "res_multistep", "res_multistep_cfg_pp",
+    "res_multistep_ancestral", "res_multistep_ancestral_cfg_pp", "gradient_estimation",
+    "gradient_estimation_cfg_pp", "er_sde", "seeds_2", "seeds_3", "sa_solver", "sa_solver_pece",
+    "ddim", "uni_pc", "uni_pc_bh2",
+)
+
+# KSampler.SCHEDULERS of current ComfyUI
+COMFYUI_SCHEDULERS = (
+    "simple", "sgm_uniform", "karras", "exponential", "ddim_uniform", "beta", "normal",
+    "linear_quadratic", "kl_optimal",
+)
+
+DEFAULT_SAMPLER = "euler_ancestral"
+DEFAULT_SCHEDULER = "normal"
+
+# A1111/Forge sampler name -> (ComfyUI sampler, scheduler "Automatic" stands for)
+#
+# The schedulers follow the "scheduler" option of each sampler in
+# samplers_k_diffusion (modules/sd_samplers_kdiffusion.py, web UI 1.9+, where
+# "Schedule type" was added), "normal" where it sets none. Older metadata
+# has no schedule type and names Karras in the sampler ("DPM2 Karras"), so a
+# bare name there resolves to "normal" and only "Automatic" uses this column.
+A1111_SAMPLERS: Dict[str, Tuple[str, str]] = {
+    "Euler a": ("euler_ancestral", "normal"),
+    "Euler": ("euler", "normal"),
+    "Euler CFG++": ("euler_cfg_pp", "normal"),
+    "Euler a CFG++": ("euler_ancestral_cfg_pp", "normal"),
+    "LMS": ("lms", "normal"),
+    "Heun": ("heun", "normal"),
+    # Both DPM2 samplers set karras in that table, as DPM++ 2M does
+    "DPM2": ("dpm_2", "karras"),
+    "DPM2 a": ("dpm_2_ancestral", "karras"),
+    "DPM++ 2S a": ("dpmpp_2s_ancestral", "karras"),
+    "DPM++ 2S a CFG++": ("dpmpp_2s_ancestral_cfg_pp", "karras"),
+    "DPM++ 2M": ("dpmpp_2m", "karras"),
+    "DPM++ 2M CFG++": ("dpmpp_2m_cfg_pp", "karras"),
+    "DPM++ SDE": ("dpmpp_sde", "karras"),
+    "DPM++ SDE GPU": ("dpmpp_sde_gpu", "karras"),
+    "DPM++ 2M SDE": ("dpmpp_2m_sde", "exponential"),
+    "DPM++ 2M SDE GPU": ("dpmpp_2m_sde_gpu", "exponential"),
+    # KSampler's dpmpp_2m_sde always uses the midpoint solver; the heun
+    # solver needs SamplerDPMPP_2M_SDE, so this is the closest KSampler match
+    "DPM++ 2M SDE Heun": ("dpmpp_2m_sde", "exponential"),
+    "DPM++ 2M SDE Heun GPU": ("dpmpp_2m_sde_gpu", "exponential"),
+    "DPM++ 3M SDE": ("dpmpp_3m_sde", "exponential"),
+    "DPM++ 3M SDE GPU": ("dpmpp_3m_sde_gpu", "exponential"),
+    "DPM fast": ("dpm_fast", "normal"),
+    "DPM adaptive": ("dpm_adaptive", "normal"),
+    "DDIM": ("ddim", "ddim_uniform"),
+    "DDPM": ("ddpm", "normal"),
+    # ComfyUI has no PLMS; iPNDM is the same pseudo linear multistep family
+    "PLMS": ("ipndm", "normal"),
+    "UniPC": ("uni_pc", "normal"),
+    "LCM": ("lcm", "sgm_uniform"),
+    "DEIS": ("deis", "normal"),
+    # Restart sampling runs Heun steps between its restarts; KSampler has no
+    # restart loop, Heun on the same Karras schedule is the nearest
+    "Restart": ("heun", "karras"),
+    "iPNDM": ("ipndm", "normal"),
+    "iPNDM_v": ("ipndm_v", "normal"),
+    # k-diffusion aliases the web UI also accepts
+    "k_euler_a": ("euler_ancestral", "normal"),
+    "k_dpm_2_a": ("dpm_2_ancestral", "karras"),
+    "k_dpmpp_2s_a": ("dpmpp_2s_ancestral", "karras"),
+    "k_dpm_ad": ("dpm_adaptive", "normal"),
+}
+
+# A1111 "Schedule type" (and legacy sampler suffix) -> ComfyUI scheduler, None for "Automatic"
+A1111_SCHEDULERS: Dict[str, Optional[str]] = {
+    "Automatic": None,
+    "Uniform": "normal",
+    "Normal": "normal",
+    "Karras": "karras",
+    "Exponential": "exponential",
+    "SGM Uniform": "sgm_uniform",
+    "Simple": "simple",
+    "DDIM": "ddim_uniform",
+    "Beta": "beta",
+    "KL Optimal": "kl_optimal",
+    "Linear Quadratic": "linear_quadratic",
+}
+
+_KEY_STRIP_RE = re.compile(r'[^a-z0-9]+')
+
+# Marks "Automatic" in the scheduler indexes, which maps to None
+_AUTOMATIC = ""
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lookup key of a sampler or scheduler name
+    
+    Case, whitespace, underscores and dashes are ignored and "+" reads as
+    "p", so "DPM++ 2M", "dpmpp_2m" and "dpm++2m" share the key "dpmpp2m".
+    """
+    return _KEY_STRIP_RE.sub("", name.lower().replace("+", "p"))
+
+
+def _build_indexes() -> Tuple[Dict[str, Tuple[str, Optional[str], str]], Dict[str, str]]:
+    """
+    Build the sampler and scheduler indexes
+    
+    Sampler entries are (sampler, scheduler named in the string or None,
+    scheduler "Automatic" stands for). Both indexes hold the raw names and
+    their normalized keys; the sampler index also holds every sampler
+    followed by a scheduler, the legacy "DPM++ 2M Karras" form.
+    """
+    schedulers: Dict[str, str] = {}
+    for name in COMFYUI_SCHEDULERS:
+        schedulers[name] = name
+    for name, scheduler in A1111_SCHEDULERS.items():
+        schedulers[name] = scheduler or _AUTOMATIC
+    for name, scheduler in list(schedulers.items()):
+        schedulers.setdefault(normalize_name(name), scheduler)
+    
+    samplers: Dict[str, Tuple[str, Optional[str], str]] = {}
+    for name in COMFYUI_SAMPLERS:
+        samplers[name] = (name, None, DEFAULT_SCHEDULER)
+    for name, (sampler, automatic) in A1111_SAMPLERS.items():
+        samplers[name] = (sampler, None, automatic)
+    for name, entry in list(samplers.items()):
+        samplers.setdefault(normalize_name(name), entry)
+    
+    # Combined names never shadow a plain sampler name
+    for name, (sampler, automatic) in A1111_SAMPLERS.items():
+        for scheduler_name, scheduler in A1111_SCHEDULERS.items():
+            if scheduler is not None:
+                samplers.setdefault(f"{name} {scheduler_name}", (sampler, scheduler, automatic))
+    
+    scheduler_keys = {
+        normalize_name(name): scheduler for name, scheduler in schedulers.items() if scheduler != _AUTOMATIC
+    }
+    sampler_keys = {normalize_name(name): entry for name, entry in samplers.items() if entry[1] is None}
+    for key, (sampler, _, automatic) in sampler_keys.items():
+        for scheduler_key, scheduler in scheduler_keys.items():
+            samplers.setdefault(key + scheduler_key, (sampler, scheduler, automatic))
+    
+    return samplers, schedulers
+
+
+_SAMPLER_INDEX, _SCHEDULER_INDEX = _build_indexes()
+
+_DEFAULT_ENTRY = (DEFAULT_SAMPLER, None, DEFAULT_SCHEDULER)
+
+# Unknown sampler names counted under their own label, bounded so odd
+# inputs can't grow the metrics
+_LABELLED_UNKNOWN: Set[str] = set()
+_MAX_LABELLED_UNKNOWN = 256
+
+
+def _unknown_sampler(sampler: str) -> Tuple[str, Optional[str], str]:
+    """
+    Count a sampler name falling back to the default, by name
+    
+    This runs per conversion, in worker processes too, so it doesn't print;
+    names past the first _MAX_LABELLED_UNKNOWN share the label "other".
+    """
+    if metrics.enabled:
+        if sampler not in _LABELLED_UNKNOWN and len(_LABELLED_UNKNOWN) < _MAX_LABELLED_UNKNOWN:
+            _LABELLED_UNKNOWN.add(sampler)
+        metrics.increment("sampler_fallbacks_total", sampler=sampler if sampler in _LABELLED_UNKNOWN else "other")
+    return _DEFAULT_ENTRY
+
+
+def resolve_sampler(sampler: Optional[str], scheduler: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Map A1111/Civitai (or ComfyUI) sampler and schedule type names to ComfyUI's
+    
+    A scheduler in the sampler name ("DPM++ 2M Karras") applies unless the
+    schedule type names a different one; a missing, unknown or "Normal"
+    schedule type is treated as unset, since the parser fills in "normal".
+    "Automatic" picks the scheduler the web UI uses for that sampler.
+    Exact names are a single dict lookup; others are normalized once. An
+    unknown sampler falls back to DEFAULT_SAMPLER and is counted in
+    sampler_fallbacks_total, labelled with its name.
+    
+    Returns:
+        Tuple of (sampler_name, scheduler)
+    """
+    entry = _SAMPLER_INDEX.get(sampler) if sampler else _DEFAULT_ENTRY
+    if entry is None:
+        entry = _SAMPLER_INDEX.get(normalize_name(sampler))
+        if entry is None:
+            entry = _unknown_sampler(sampler)
+    sampler_name, named_scheduler, automatic = entry
+    
+    explicit = _SCHEDULER_INDEX.get(scheduler) if scheduler else None
+    if explicit is None and scheduler:
+        explicit = _SCHEDULER_INDEX.get(normalize_name(scheduler))
+    
+    if explicit == _AUTOMATIC:
+        return sampler_name, named_scheduler or automatic
+    if explicit is None or explicit == DEFAULT_SCHEDULER:
+        return sampler_name, named_scheduler or DEFAULT_SCHEDULER
+    return sampler_name, explicit
+
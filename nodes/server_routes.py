@@ -0,0 +1,275 @@
+"""
+REST endpoint for converting metadata on the ComfyUI server
+
+    POST /metadata2workflow/convert
+    GET /metadata2workflow/metrics
+
+The body is JSON, multipart form data, or a raw image or text:
+
+    {"text": "<metadata>"}
+    {"image": "<base64 PNG/JPEG/WebP, data: URLs accepted>"}
+    {"items": ["<metadata>", {"text": ...}, {"image": ..., "name": ...}],
+     "template": "advanced", "model_name": "...", "vae_name": "..."}
+
+The response is {"results": [...]} in input order, each result either
+{"source": ..., "workflow": {...}} or {"source": ..., "error": "..."}.
+Images saved by ComfyUI return the prompt embedded in them, marked
+"embedded": true, and ignore the template and model options.
+Items are converted in batches on a thread pool, so large requests never
+block the server's event loop. The metrics route serves the counters and
+latency histograms of nodes.metrics in the Prometheus text format.
+"""
+
+import asyncio
+import base64
+import binascii
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+from .image_metadata import extract_image_metadata
+from .metrics import render_prometheus
+from .pipeline import convert_metadata
+from .workflow_templates import workflow_template_names
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+ROUTE = "/metadata2workflow/convert"
+METRICS_ROUTE = "/metadata2workflow/metrics"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Items per request and per executor job
+MAX_ITEMS = 1000
+BATCH_SIZE = 32
+
+# Form and JSON fields that are options rather than inputs
+OPTION_FIELDS = ("template", "model_name", "vae_name")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_registered = False
+
+
+class TooManyItemsError(ValueError):
+    """
+    A request holds more than MAX_ITEMS items
+    """
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool the conversions run on, created on first use
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                       thread_name_prefix="metadata2workflow")
+    return _executor
+
+
+def _decode_image(value: str) -> bytes:
+    """
+    Decode a base64 image, with or without a data: URL prefix
+    """
+    if value.startswith("data:"):
+        value = value.split(",", 1)[-1]
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("image is not valid base64")
+
+
+def parse_request_items(payload: Any) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Turn a JSON request body into conversion items and options
+    
+    Items are {"source": ..., "text": ...} or {"source": ..., "image": bytes}.
+    
+    Raises:
+        ValueError: The body has no usable input or an invalid option
+    """
+    if isinstance(payload, str):
+        payload = {"text": payload}
+    if not isinstance(payload, dict):
+        raise ValueError("request body must be a JSON object")
+    
+    if "items" in payload:
+        raw_items = payload["items"]
+        if not isinstance(raw_items, list):
+            raise ValueError("items must be a list")
+    else:
+        raw_items = [{key: payload[key] for key in ("text", "image", "name") if key in payload}]
+    
+    items = []
+    for index, raw_item in enumerate(raw_items):
+        if isinstance(raw_item, str):
+            raw_item = {"text": raw_item}
+        if not isinstance(raw_item, dict):
+            raise ValueError(f"item {index} must be a string or an object")
+        
+        source = str(raw_item.get("name") or f"item-{index}")
+        if isinstance(raw_item.get("text"), str):
+            items.append({"source": source, "text": raw_item["text"]})
+        elif isinstance(raw_item.get("image"), str):
+            items.append({"source": source, "image": _decode_image(raw_item["image"])})
+        else:
+            raise ValueError(f"item {index} needs a text or a base64 image")
+    
+    options = {field: payload[field] for field in OPTION_FIELDS if payload.get(field) is not None}
+    return items, validate_options(items, options)
+
+
+def validate_options(items: List[Dict[str, Any]], options: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Check the item count and the options of a request
+    
+    Raises:
+        ValueError: No items, too many, or an unknown template
+    """
+    if not items:
+        raise ValueError("no text or image to convert")
+    if len(items) > MAX_ITEMS:
+        raise TooManyItemsError(f"at most {MAX_ITEMS} items per request")
+    
+    for field, value in options.items():
+        if not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+    
+    template = options.get("template", "basic")
+    if template not in workflow_template_names():
+        raise ValueError(f"unknown template '{template}', available: {', '.join(workflow_template_names())}")
+    return options
+
+
+def convert_item(item: Dict[str, Any], template: str = "basic", model_name: str = "",
+                 vae_name: str = "") -> Dict[str, Any]:
+    """
+    Convert one text or image item into a result dict
+    """
+    text = item.get("text")
+    if "image" in item:
+        try:
+            text, embedded_workflow = extract_image_metadata(item["image"])
+        except Exception as e:
+            return {"source": item["source"], "error": f"{type(e).__name__}: {str(e)}"}
+        if embedded_workflow is not None:
+            if metrics.enabled:
+                metrics.increment("workflows_total", template="embedded")
+            return {"source": item["source"], "workflow": embedded_workflow, "embedded": True}
+    
+    if not text or not text.strip():
+        return {"source": item["source"], "error": "No metadata found"}
+    
+    return convert_metadata({"source": item["source"], "metadata": text}, template, model_name, vae_name)
+
+
+def convert_batch(items: List[Dict[str, Any]], template: str = "basic", model_name: str = "",
+                  vae_name: str = "") -> List[Dict[str, Any]]:
+    """
+    Convert a batch of items, one executor job
+    """
+    return [convert_item(item, template, model_name, vae_name) for item in items]
+
+
+async def convert_items(items: List[Dict[str, Any]], template: str = "basic", model_name: str = "",
+                        vae_name: str = "") -> List[Dict[str, Any]]:
+    """
+    Convert items on the thread pool in batches of BATCH_SIZE, keeping their order
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    batches = await asyncio.gather(*(
+        loop.run_in_executor(executor, convert_batch, items[start:start + BATCH_SIZE], template, model_name, vae_name)
+        for start in range(0, len(items), BATCH_SIZE)
+    ))
+    return [result for batch in batches for result in batch]
+
+
+async def _read_request(request: Any) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Read the items and options of a JSON, multipart or raw request
+    """
+    content_type = request.content_type
+    
+    if content_type == "application/json":
+        return parse_request_items(await request.json())
+    
+    if content_type == "multipart/form-data":
+        items = []
+        options = {}
+        reader = await request.multipart()
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            if part.filename:
+                items.append({"source": part.filename, "image": bytes(await part.read())})
+            elif part.name in OPTION_FIELDS:
+                options[part.name] = await part.text()
+            elif part.name in ("text", "metadata"):
+                items.append({"source": f"item-{len(items)}", "text": await part.text()})
+            if len(items) > MAX_ITEMS:
+                raise TooManyItemsError(f"at most {MAX_ITEMS} items per request")
+        return items, validate_options(items, options)
+    
+    options = {field: request.query[field] for field in OPTION_FIELDS if field in request.query}
+    if content_type.startswith("image/") or content_type == "application/octet-stream":
+        items = [{"source": "item-0", "image": await request.read()}]
+    else:
+        items = [{"source": "item-0", "text": await request.text()}]
+    return items, validate_options(items, options)
+
+
+async def handle_convert(request: Any) -> Any:
+    """
+    POST handler: convert the request's texts and images into workflows
+    """
+    try:
+        items, options = await _read_request(request)
+    except TooManyItemsError as e:
+        return web.json_response({"error": str(e)}, status=413)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    
+    results = await convert_items(items, options.get("template", "basic"),
+                                  options.get("model_name", ""), options.get("vae_name", ""))
+    return web.json_response({"results": results})
+
+
+async def handle_metrics(request: Any) -> Any:
+    """
+    GET handler: the collected metrics in the Prometheus text format
+    """
+    return web.Response(body=render_prometheus().encode("utf-8"), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+def register_routes(server: Any = None) -> bool:
+    """
+    Add the endpoints to ComfyUI's PromptServer
+    
+    Returns False, without doing anything, outside a running ComfyUI server.
+    """
+    global _registered
+    
+    if _registered:
+        return True
+    
+    if server is None:
+        try:
+            from server import PromptServer
+        except ImportError:
+            return False
+        server = getattr(PromptServer, "instance", None)
+    
+    if server is None or web is None:
+        return False
+    
+    server.routes.post(ROUTE)(handle_convert)
+    server.routes.get(METRICS_ROUTE)(handle_metrics)
+    _registered = True
+    return True
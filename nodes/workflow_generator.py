@@ -1,5 +1,45 @@
 import json
-from typing import Dict, Any, Tuple, List
+from time import perf_counter
+from typing import Dict, Any, Tuple, List, Optional
+
+from . import metrics
+from .model_index import embedding_resolver, lora_hashes, resolve_checkpoint, resolve_lora
+from .samplers import resolve_sampler
+from .workflow_graph import Socket, WorkflowGraph
+from .workflow_templates import CompiledTemplate, get_workflow_template, workflow_template_names
+
+
+def serialize_workflow(workflow: Dict[str, Any], compact: bool = False) -> str:
+    """
+    Serialize a workflow dict to JSON
+    
+    compact drops the indentation and the spaces after separators, for
+    callers that submit the text to the API rather than display it.
+    """
+    timed = metrics.enabled
+    if timed:
+        start = perf_counter()
+    
+    if compact:
+        text = json.dumps(workflow, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(workflow, indent=2)
+    
+    if timed:
+        metrics.observe("stage_seconds", perf_counter() - start, stage="serialization")
+    return text
+
+
+def _dimensions(data: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Parse the "WIDTHxHEIGHT" size, falling back to 512x512
+    """
+    size = data.get("size", "512x512")
+    try:
+        width, height = map(int, size.split("x"))
+    except:
+        width, height = 512, 512
+    return width, height
 
 
 class WorkflowGeneratorNode:
@@ -15,435 +55,162 @@ class WorkflowGeneratorNode:
             },
             "optional": {
                 "model_name": ("STRING", {
-                    "default": "sd_xl_base_1.0.safetensors",
-                    "placeholder": "Model checkpoint name"
+                    "default": "",
+                    "placeholder": "Checkpoint name, empty to use the one in the metadata"
                 }),
                 "vae_name": ("STRING", {
                     "default": "sdxl_vae.safetensors",
                     "placeholder": "VAE name"
                 }),
-                "workflow_template": (["basic", "advanced", "img2img"], {"default": "basic"}),
+                "workflow_template": (workflow_template_names(), {"default": "basic"}),
+                "json_format": (["pretty", "compact"], {"default": "pretty"}),
             }
         }
     
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("workflow_json",)
+    RETURN_TYPES = ("STRING", "WORKFLOW")
+    RETURN_NAMES = ("workflow_json", "workflow")
     
     FUNCTION = "generate_workflow"
     CATEGORY = "Metadata2Workflow"
     
-    def generate_workflow(self, parsed_data: Dict[str, Any], model_name: str = "", vae_name: str = "", workflow_template: str = "basic") -> Tuple[str]:
+    def generate_workflow(self, parsed_data: Dict[str, Any], model_name: str = "", vae_name: str = "",
+                          workflow_template: str = "basic", json_format: str = "pretty") -> Tuple[str, Dict[str, Any]]:
         """
         Generate ComfyUI workflow from parsed metadata with LoRA support
-        """
-        try:
-            if workflow_template == "basic":
-                workflow = self._generate_basic_workflow(parsed_data, model_name, vae_name)
-            elif workflow_template == "advanced":
-                workflow = self._generate_advanced_workflow(parsed_data, model_name, vae_name)
-            elif workflow_template == "img2img":
-                workflow = self._generate_img2img_workflow(parsed_data, model_name, vae_name)
-            else:
-                workflow = self._generate_basic_workflow(parsed_data, model_name, vae_name)
-            
-            return (json.dumps(workflow, indent=2),)
-            
-        except Exception as e:
-            print(f"Error generating workflow: {str(e)}")
-            return (json.dumps(self._get_empty_workflow(), indent=2),)
-    
-    def _generate_basic_workflow(self, data: Dict[str, Any], model_name: str, vae_name: str) -> Dict[str, Any]:
-        """
-        Generate basic txt2img workflow with LoRA support
-        """
-        # Extract dimensions
-        size = data.get("size", "512x512")
-        try:
-            width, height = map(int, size.split("x"))
-        except:
-            width, height = 512, 512
-        
-        # Get LoRAs
-        loras = data.get("loras", [])
-        
-        workflow = {
-            "4": {
-                "inputs": {
-                    "ckpt_name": model_name or data.get("model", "sd_xl_base_1.0.safetensors")
-                },
-                "class_type": "CheckpointLoaderSimple",
-                "_meta": {
-                    "title": "Load Checkpoint"
-                }
-            },
-            "5": {
-                "inputs": {
-                    "width": width,
-                    "height": height,
-                    "batch_size": 1
-                },
-                "class_type": "EmptyLatentImage",
-                "_meta": {
-                    "title": "Empty Latent Image"
-                }
-            }
-        }
-        
-        # Add LoRA loaders if present
-        if loras:
-            model_clip_connections = self._add_lora_loaders(workflow, loras)
-        else:
-            model_clip_connections = {
-                "model": ["4", 0],
-                "clip": ["4", 1]
-            }
-        
-        # Add text encoders
-        workflow.update({
-            "6": {
-                "inputs": {
-                    "text": data.get("positive_prompt", ""),
-                    "clip": model_clip_connections["clip"]
-                },
-                "class_type": "CLIPTextEncode",
-                "_meta": {
-                    "title": "CLIP Text Encode (Prompt)"
-                }
-            },
-            "7": {
-                "inputs": {
-                    "text": data.get("negative_prompt", ""),
-                    "clip": model_clip_connections["clip"]
-                },
-                "class_type": "CLIPTextEncode",
-                "_meta": {
-                    "title": "CLIP Text Encode (Negative)"
-                }
-            }
-        })
-        
-        # Add KSampler
-        workflow["3"] = {
-            "inputs": {
-                "seed": data.get("seed", -1),
-                "steps": data.get("steps", 20),
-                "cfg": data.get("cfg_scale", 7.0),
-                "sampler_name": self._map_sampler(data.get("sampler", "Euler a")),
-                "scheduler": self._map_scheduler(data.get("scheduler", "normal")),
-                "denoise": 1.0,
-                "model": model_clip_connections["model"],
-                "positive": ["6", 0],
-                "negative": ["7", 0],
-                "latent_image": ["5", 0]
-            },
-            "class_type": "KSampler",
-            "_meta": {
-                "title": "KSampler"
-            }
-        }
-        
-        # Add VAE decode and save
-        vae_connection = ["4", 2]
-        if vae_name and vae_name.strip():
-            workflow["10"] = {
-                "inputs": {
-                    "vae_name": vae_name
-                },
-                "class_type": "VAELoader",
-                "_meta": {
-                    "title": "Load VAE"
-                }
-            }
-            vae_connection = ["10", 0]
-        
-        workflow.update({
-            "8": {
-                "inputs": {
-                    "samples": ["3", 0],
-                    "vae": vae_connection
-                },
-                "class_type": "VAEDecode",
-                "_meta": {
-                    "title": "VAE Decode"
-                }
-            },
-            "9": {
-                "inputs": {
-                    "filename_prefix": "ComfyUI",
-                    "images": ["8", 0]
-                },
-                "class_type": "SaveImage",
-                "_meta": {
-                    "title": "Save Image"
-                }
-            }
-        })
-        
-        return workflow
-    
-    def _add_lora_loaders(self, workflow: Dict[str, Any], loras: List[Dict[str, Any]]) -> Dict[str, str]:
-        """
-        Add LoRA loader nodes to the workflow
         
-        Returns the final model and clip connections
+        Returns both the JSON text and the workflow dict, so consumers that
+        submit the prompt directly don't have to parse the text back.
         """
-        # Start with checkpoint connections
-        prev_model = ["4", 0]
-        prev_clip = ["4", 1]
-        
-        for i, lora in enumerate(loras):
-            node_id = str(100 + i)  # Start LoRA nodes from ID 100
-            
-            workflow[node_id] = {
-                "inputs": {
-                    "lora_name": lora["name"],
-                    "strength_model": lora["strength"],
-                    "strength_clip": lora["strength"],
-                    "model": prev_model,
-                    "clip": prev_clip
-                },
-                "class_type": "LoraLoader",
-                "_meta": {
-                    "title": f"Load LoRA - {lora['name']}"
-                }
-            }
-            
-            # Update connections for next LoRA or final use
-            prev_model = [node_id, 0]
-            prev_clip = [node_id, 1]
-        
-        return {
-            "model": prev_model,
-            "clip": prev_clip
-        }
+        workflow = self.build_workflow(parsed_data, model_name, vae_name, workflow_template)
+        return (serialize_workflow(workflow, compact=json_format == "compact"), workflow)
     
-    def _generate_advanced_workflow(self, data: Dict[str, Any], model_name: str, vae_name: str) -> Dict[str, Any]:
+    def build_workflow(self, parsed_data: Dict[str, Any], model_name: str = "", vae_name: str = "",
+                       workflow_template: str = "basic") -> Dict[str, Any]:
         """
-        Generate advanced workflow with LoRA support and upscaling
+        Generate the workflow as a dict, without serializing it
         """
-        basic_workflow = self._generate_basic_workflow(data, model_name, vae_name)
+        timed = metrics.enabled
+        if timed:
+            start = perf_counter()
         
-        # Extract dimensions
-        size = data.get("size", "512x512")
         try:
-            width, height = map(int, size.split("x"))
-        except:
-            width, height = 512, 512
-        
-        # Get model connection (could be from LoRAs)
-        loras = data.get("loras", [])
-        if loras:
-            model_connection = [f"{100 + len(loras) - 1}", 0]
-            clip_connection = [f"{100 + len(loras) - 1}", 1]
-        else:
-            model_connection = ["4", 0]
-            clip_connection = ["4", 1]
-        
-        # Add upscaling and additional processing
-        advanced_nodes = {
-            "11": {
-                "inputs": {
-                    "upscale_method": "nearest-exact",
-                    "width": width * 2,
-                    "height": height * 2,
-                    "crop": "disabled",
-                    "samples": ["3", 0]
-                },
-                "class_type": "LatentUpscale",
-                "_meta": {
-                    "title": "Upscale Latent"
-                }
-            },
-            "12": {
-                "inputs": {
-                    "seed": data.get("seed", -1),
-                    "steps": max(10, data.get("steps", 20) // 2),
-                    "cfg": data.get("cfg_scale", 7.0),
-                    "sampler_name": self._map_sampler(data.get("sampler", "Euler a")),
-                    "scheduler": self._map_scheduler(data.get("scheduler", "normal")),
-                    "denoise": 0.5,
-                    "model": model_connection,
-                    "positive": ["6", 0],
-                    "negative": ["7", 0],
-                    "latent_image": ["11", 0]
-                },
-                "class_type": "KSampler",
-                "_meta": {
-                    "title": "KSampler (Upscale)"
-                }
-            }
-        }
-        
-        # Update workflow
-        basic_workflow.update(advanced_nodes)
+            template = get_workflow_template(workflow_template) or get_workflow_template("basic")
+            workflow = self._instantiate_template(template, parsed_data, model_name, vae_name)
         
-        # Update VAE decode to use upscaled latent
-        basic_workflow["8"]["inputs"]["samples"] = ["12", 0]
-        
-        return basic_workflow
+        except Exception as e:
+            print(f"Error generating workflow: {str(e)}")
+            if timed:
+                metrics.count_error("generate", e)
+            return self._get_empty_workflow()
+        
+        if timed:
+            elapsed = perf_counter() - start
+            metrics.observe("stage_seconds", elapsed, stage="template_build")
+            metrics.observe("template_build_seconds", elapsed, template=template.name)
+            metrics.increment("workflows_total", template=template.name)
+        return workflow
     
-    def _generate_img2img_workflow(self, data: Dict[str, Any], model_name: str, vae_name: str) -> Dict[str, Any]:
+    def _instantiate_template(self, template: CompiledTemplate, data: Dict[str, Any], model_name: str, vae_name: str) -> Dict[str, Any]:
         """
-        Generate img2img workflow with LoRA support
+        Fill a compiled template's slots and add the LoRA chain and VAE loader it links to
         """
-        # Extract dimensions
-        size = data.get("size", "512x512")
-        try:
-            width, height = map(int, size.split("x"))
-        except:
-            width, height = 512, 512
+        values = self._slot_values(data, model_name, vae_name)
         
-        # Get LoRAs
-        loras = data.get("loras", [])
+        # Derived and template-specific slots
+        if "upscale_steps" in template.slot_names:
+            values["upscale_steps"] = max(10, data.get("steps", 20) // 2)
+        for slot in template.slot_names.difference(values):
+            if slot in data:
+                values[slot] = data[slot]
+            elif slot in template.slot_defaults:
+                values[slot] = template.slot_defaults[slot]
+            else:
+                raise ValueError(f"No value for template slot '{slot}'")
         
-        workflow = {
-            "4": {
-                "inputs": {
-                    "ckpt_name": model_name or data.get("model", "sd_xl_base_1.0.safetensors")
-                },
-                "class_type": "CheckpointLoaderSimple",
-                "_meta": {
-                    "title": "Load Checkpoint"
-                }
-            },
-            "10": {
-                "inputs": {
-                    "image": "input_image_placeholder"
-                },
-                "class_type": "LoadImage",
-                "_meta": {
-                    "title": "Load Image"
-                }
-            }
-        }
+        # Loader nodes get IDs past the template's own
+        graph = WorkflowGraph(template.node_types)
+        links = dict(template.link_sources)
         
         # Add LoRA loaders if present
-        if loras:
-            model_clip_connections = self._add_lora_loaders(workflow, loras)
-        else:
-            model_clip_connections = {
-                "model": ["4", 0],
-                "clip": ["4", 1]
-            }
-        
-        # Add VAE encode for img2img
-        vae_connection = ["4", 2]
-        workflow["13"] = {
-            "inputs": {
-                "pixels": ["10", 0],
-                "vae": vae_connection
-            },
-            "class_type": "VAEEncode",
-            "_meta": {
-                "title": "VAE Encode"
-            }
-        }
-        
-        # Add text encoders and other nodes
-        workflow.update({
-            "6": {
-                "inputs": {
-                    "text": data.get("positive_prompt", ""),
-                    "clip": model_clip_connections["clip"]
-                },
-                "class_type": "CLIPTextEncode",
-                "_meta": {
-                    "title": "CLIP Text Encode (Prompt)"
-                }
-            },
-            "7": {
-                "inputs": {
-                    "text": data.get("negative_prompt", ""),
-                    "clip": model_clip_connections["clip"]
-                },
-                "class_type": "CLIPTextEncode",
-                "_meta": {
-                    "title": "CLIP Text Encode (Negative)"
-                }
-            },
-            "3": {
-                "inputs": {
-                    "seed": data.get("seed", -1),
-                    "steps": data.get("steps", 20),
-                    "cfg": data.get("cfg_scale", 7.0),
-                    "sampler_name": self._map_sampler(data.get("sampler", "Euler a")),
-                    "scheduler": self._map_scheduler(data.get("scheduler", "normal")),
-                    "denoise": data.get("denoising_strength", 0.7),
-                    "model": model_clip_connections["model"],
-                    "positive": ["6", 0],
-                    "negative": ["7", 0],
-                    "latent_image": ["13", 0]
-                },
-                "class_type": "KSampler",
-                "_meta": {
-                    "title": "KSampler"
-                }
-            },
-            "8": {
-                "inputs": {
-                    "samples": ["3", 0],
-                    "vae": vae_connection
-                },
-                "class_type": "VAEDecode",
-                "_meta": {
-                    "title": "VAE Decode"
-                }
-            },
-            "9": {
-                "inputs": {
-                    "filename_prefix": "ComfyUI",
-                    "images": ["8", 0]
-                },
-                "class_type": "SaveImage",
-                "_meta": {
-                    "title": "Save Image"
-                }
-            }
-        })
-        
+        loras = data.get("loras", [])
+        if loras and ("model" in template.link_slots or "clip" in template.link_slots):
+            model, clip = self._add_lora_loaders(graph, loras, graph.output(*links["model"]), graph.output(*links["clip"]),
+                                                 lora_hashes(data))
+            links["model"] = model.link()
+            links["clip"] = clip.link()
+        
+        if "vae" in template.link_slots and vae_name and vae_name.strip():
+            node_id = graph.add_node("VAELoader", {"vae_name": vae_name}, title="Load VAE")
+            links["vae"] = [node_id, 0]
+        
+        workflow = template.instantiate(values, links)
+        workflow.update(graph.nodes)
         return workflow
     
-    def _map_sampler(self, sampler: str) -> str:
+    def _slot_values(self, data: Dict[str, Any], model_name: str, vae_name: str) -> Dict[str, Any]:
         """
-        Map Civitai sampler names to ComfyUI sampler names
+        Values of the standard template slots
         """
-        sampler_map = {
-            "Euler a": "euler_ancestral",
-            "Euler": "euler",
-            "DPM++ 2M": "dpmpp_2m",
-            "DPM++ 2M SDE": "dpmpp_2m_sde",
-            "DPM++ 2M Karras": "dpmpp_2m",
-            "DPM++ 2M SDE Karras": "dpmpp_2m_sde",
-            "DPM++ SDE": "dpmpp_sde",
-            "DPM++ SDE Karras": "dpmpp_sde",
-            "DPM2": "dpm_2",
-            "DPM2 Karras": "dpm_2",
-            "DPM2 a": "dpm_2_ancestral",
-            "DPM2 a Karras": "dpm_2_ancestral",
-            "DDIM": "ddim",
-            "PLMS": "plms",
-            "LMS": "lms",
-            "Heun": "heun",
-            "DPM fast": "dpm_fast",
-            "DPM adaptive": "dpm_adaptive",
-        }
+        width, height = _dimensions(data)
+        sampler_name, scheduler = resolve_sampler(data.get("sampler", "Euler a"), data.get("scheduler", "normal"))
+        positive_prompt = data.get("positive_prompt", "")
+        negative_prompt = data.get("negative_prompt", "")
         
-        return sampler_map.get(sampler, "euler_ancestral")
-    
-    def _map_scheduler(self, scheduler: str) -> str:
-        """
-        Map scheduler names to ComfyUI scheduler names
-        """
-        scheduler_map = {
-            "normal": "normal",
-            "karras": "karras",
-            "exponential": "exponential",
-            "sgm_uniform": "sgm_uniform",
-            "simple": "simple",
-            "ddim_uniform": "ddim_uniform",
+        # Embeddings named in TI hashes become embedding:file
+        resolve_embeddings = embedding_resolver(data)
+        if resolve_embeddings is not None:
+            positive_prompt = resolve_embeddings(positive_prompt)
+            negative_prompt = resolve_embeddings(negative_prompt)
+        
+        return {
+            "ckpt_name": model_name or resolve_checkpoint(data),
+            "vae_name": vae_name,
+            "positive_prompt": positive_prompt,
+            "negative_prompt": negative_prompt,
+            "width": width,
+            "height": height,
+            "upscale_width": width * 2,
+            "upscale_height": height * 2,
+            "seed": data.get("seed", -1),
+            "steps": data.get("steps", 20),
+            "cfg": data.get("cfg_scale", 7.0),
+            "sampler_name": sampler_name,
+            "scheduler": scheduler,
+            "denoising_strength": data.get("denoising_strength", 0.7),
         }
+    
+    def _add_lora_loaders(self, graph: WorkflowGraph, loras: List[Dict[str, Any]],
+                          model: Socket, clip: Socket, hashes: Optional[Dict[str, str]] = None) -> Tuple[Socket, Socket]:
+        """
+        Chain LoRA (and hypernetwork) loader nodes after the model and clip sockets
+        
+        LoRA names resolve to local files through their entry in hashes
+        (from "Lora hashes") or their name.
+        
+        Returns the final model and clip sockets
+        """
+        hashes = hashes or {}
+        for lora in loras:
+            # Hypernetworks only patch the model, CLIP passes through
+            if lora.get("type") == "hypernet":
+                node_id = graph.add_node("HypernetworkLoader", {
+                    "hypernetwork_name": lora["name"],
+                    "strength": lora["strength"]
+                }, {"model": model}, title=f"Load Hypernetwork - {lora['name']}")
+                model = graph.output(node_id, 0)
+                continue
+            
+            node_id = graph.add_node("LoraLoader", {
+                "lora_name": resolve_lora(lora["name"], hashes.get(lora["name"])),
+                "strength_model": lora["strength"],
+                "strength_clip": lora.get("strength_clip", lora["strength"])
+            }, {"model": model, "clip": clip}, title=f"Load LoRA - {lora['name']}")
+            
+            # Update connections for next LoRA or final use
+            model = graph.output(node_id, 0)
+            clip = graph.output(node_id, 1)
         
-        return scheduler_map.get(scheduler.lower(), "normal")
+        return model, clip
     
     def _get_empty_workflow(self) -> Dict[str, Any]:
         """
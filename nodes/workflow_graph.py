@@ -0,0 +1,369 @@
+import json
+from typing import Any, Collection, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+# Output socket types of the ComfyUI nodes the generator emits
+NODE_OUTPUT_TYPES: Dict[str, Tuple[str, ...]] = {
+    "CheckpointLoaderSimple": ("MODEL", "CLIP", "VAE"),
+    "LoraLoader": ("MODEL", "CLIP"),
+    "LoraLoaderModelOnly": ("MODEL",),
+    "HypernetworkLoader": ("MODEL",),
+    "VAELoader": ("VAE",),
+    "CLIPTextEncode": ("CONDITIONING",),
+    "CLIPSetLastLayer": ("CLIP",),
+    "EmptyLatentImage": ("LATENT",),
+    "LatentUpscale": ("LATENT",),
+    "KSampler": ("LATENT",),
+    "KSamplerAdvanced": ("LATENT",),
+    "VAEEncode": ("LATENT",),
+    "VAEDecode": ("IMAGE",),
+    "LoadImage": ("IMAGE", "MASK"),
+    "SaveImage": (),
+    "PreviewImage": (),
+}
+
+# Socket types of the link inputs of those nodes
+NODE_INPUT_TYPES: Dict[str, Dict[str, str]] = {
+    "LoraLoader": {"model": "MODEL", "clip": "CLIP"},
+    "LoraLoaderModelOnly": {"model": "MODEL"},
+    "HypernetworkLoader": {"model": "MODEL"},
+    "CLIPTextEncode": {"clip": "CLIP"},
+    "CLIPSetLastLayer": {"clip": "CLIP"},
+    "LatentUpscale": {"samples": "LATENT"},
+    "KSampler": {"model": "MODEL", "positive": "CONDITIONING", "negative": "CONDITIONING", "latent_image": "LATENT"},
+    "KSamplerAdvanced": {"model": "MODEL", "positive": "CONDITIONING", "negative": "CONDITIONING", "latent_image": "LATENT"},
+    "VAEEncode": {"pixels": "IMAGE", "vae": "VAE"},
+    "VAEDecode": {"samples": "LATENT", "vae": "VAE"},
+    "SaveImage": {"images": "IMAGE"},
+    "PreviewImage": {"images": "IMAGE"},
+}
+
+
+# Nodes that load model files; merging workflows shares identical ones
+LOADER_CLASS_TYPES = frozenset({
+    "CheckpointLoaderSimple",
+    "CheckpointLoader",
+    "VAELoader",
+    "LoraLoader",
+    "LoraLoaderModelOnly",
+    "HypernetworkLoader",
+    "CLIPLoader",
+    "DualCLIPLoader",
+    "UNETLoader",
+    "CLIPVisionLoader",
+    "ControlNetLoader",
+    "UpscaleModelLoader",
+})
+
+
+def is_node_link(value: Any) -> bool:
+    """
+    True for a literal [node_id, output_index] link
+    """
+    return (isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+            and isinstance(value[1], int) and not isinstance(value[1], bool))
+
+
+_NO_LINK_INPUTS: Dict[str, str] = {}
+
+_tuple_new = tuple.__new__
+
+
+class Socket(NamedTuple):
+    """
+    An output socket of a node, type is None for node classes without a known signature
+    """
+    node_id: str
+    index: int
+    type: Optional[str]
+    
+    def link(self) -> List[Any]:
+        """
+        The [node_id, output_index] value ComfyUI uses for a link
+        """
+        return [self.node_id, self.index]
+
+
+def socket_type(class_type: str, index: int) -> Optional[str]:
+    """
+    Type of an output socket, None when the node class is unknown
+    
+    Raises:
+        ValueError: The node class is known and has no such output
+    """
+    outputs = NODE_OUTPUT_TYPES.get(class_type)
+    if outputs is None:
+        return None
+    if not 0 <= index < len(outputs):
+        raise ValueError(f"{class_type} has no output {index}")
+    return outputs[index]
+
+
+def check_link(class_type: str, input_name: str, target_class_type: str, index: int) -> None:
+    """
+    Validate that output index of a target_class_type node may feed input_name of a class_type node
+    
+    Raises:
+        ValueError: The output doesn't exist or its type doesn't match the input
+    """
+    source_type = socket_type(target_class_type, index)
+    expected_type = NODE_INPUT_TYPES.get(class_type, {}).get(input_name)
+    if source_type is not None and expected_type is not None and source_type != expected_type:
+        raise ValueError(
+            f"{class_type}.{input_name} expects {expected_type}, got {source_type} from {target_class_type} output {index}"
+        )
+
+
+class WorkflowGraph:
+    """
+    Builder for ComfyUI API-format workflows
+    
+    Node IDs are allocated from a counter past the highest numeric ID in
+    use, so chains of any length never collide with template nodes, and
+    every link is checked against the output signatures of its target when
+    the node is added. Adding a node costs O(its inputs).
+    """
+    
+    def __init__(self, existing: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            existing: node_id -> class_type of nodes that live outside the
+                builder (e.g. a template instance); their IDs are never
+                allocated and links to them are validated
+        """
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._class_types: Dict[str, str] = {}
+        self._next_id = 1
+        
+        # (class_type, inputs JSON) -> node ID of nodes shared by add_workflow
+        self._shared: Dict[Tuple[str, str], str] = {}
+        
+        if existing:
+            self.reserve(existing.items())
+    
+    def reserve(self, nodes: Iterable[Tuple[str, str]]) -> None:
+        """
+        Register (node_id, class_type) pairs of nodes built elsewhere
+        """
+        for node_id, class_type in nodes:
+            self._register(str(node_id), class_type)
+    
+    def allocate_id(self) -> str:
+        """
+        Return an unused node ID
+        
+        The counter stays past every numeric ID registered so far, so the
+        next value is always free.
+        """
+        node_id = str(self._next_id)
+        self._next_id += 1
+        return node_id
+    
+    def add_node(self, class_type: str, inputs: Optional[Dict[str, Any]] = None,
+                 links: Optional[Dict[str, Any]] = None, title: Optional[str] = None,
+                 node_id: Optional[str] = None) -> str:
+        """
+        Add a node and return its ID
+        
+        Args:
+            class_type: ComfyUI node class
+            inputs: Widget values; the dict becomes the node's inputs, it is not copied
+            links: Link inputs as Sockets or [node_id, index] lists, validated
+                against the target node and added after the widget values
+            title: Optional _meta title
+            node_id: Explicit ID instead of an allocated one
+        
+        Raises:
+            ValueError: node_id is taken or a link is invalid
+        """
+        if node_id is None:
+            node_id = str(self._next_id)
+            self._next_id += 1
+            self._class_types[node_id] = class_type
+        elif node_id in self._class_types:
+            raise ValueError(f"Node ID {node_id} is already in use")
+        else:
+            self._register(node_id, class_type)
+        
+        if inputs is None:
+            inputs = {}
+        
+        if links:
+            expected_types = NODE_INPUT_TYPES.get(class_type, _NO_LINK_INPUTS)
+            for input_name, link in links.items():
+                if type(link) is Socket:
+                    # Sockets come from output(), which already checked the target
+                    expected_type = expected_types.get(input_name)
+                    if expected_type is not None and link[2] is not None and link[2] != expected_type:
+                        raise ValueError(f"{class_type}.{input_name} expects {expected_type}, got {link[2]} "
+                                         f"from node {link[0]} output {link[1]}")
+                elif is_node_link(link):
+                    self._check_input(class_type, input_name, link[0], link[1])
+                else:
+                    raise ValueError(f"{class_type}.{input_name} is not a link: {link!r}")
+                inputs[input_name] = [link[0], link[1]]
+        
+        if title is None:
+            self.nodes[node_id] = {"inputs": inputs, "class_type": class_type}
+        else:
+            self.nodes[node_id] = {"inputs": inputs, "class_type": class_type, "_meta": {"title": title}}
+        return node_id
+    
+    def add_workflow(self, workflow: Dict[str, Any], share: Collection[str] = (),
+                     label: Optional[str] = None) -> Dict[str, str]:
+        """
+        Copy a workflow's nodes into the graph under fresh IDs
+        
+        Nodes listed in share are reused instead of copied when a node with
+        the same class_type and inputs was shared before; inputs are compared
+        after rewiring, so a LoRA loader is only reused when everything
+        upstream of it was reused too.
+        
+        Args:
+            workflow: API-format workflow
+            share: IDs of the workflow's nodes that may be shared
+            label: Appended to the titles of the nodes that are not shared
+        
+        Returns:
+            Map from the workflow's node IDs to the graph's
+        
+        Raises:
+            ValueError: The shared nodes link in a cycle
+        """
+        id_map: Dict[str, str] = {}
+        for node_id in workflow:
+            if node_id not in share:
+                id_map[node_id] = str(self._next_id)
+                self._next_id += 1
+        
+        added = set(id_map.values())
+        resolving = set()
+        
+        def resolve(node_id: str) -> str:
+            if node_id in id_map:
+                return id_map[node_id]
+            if node_id in resolving:
+                raise ValueError(f"Shared node {node_id} links to itself")
+            resolving.add(node_id)
+            
+            node = workflow[node_id]
+            for value in node["inputs"].values():
+                if is_node_link(value) and value[0] in workflow:
+                    resolve(value[0])
+            
+            key = (node["class_type"], json.dumps(_rewire(node["inputs"], id_map), sort_keys=True, default=repr))
+            shared_id = self._shared.get(key)
+            if shared_id is None:
+                shared_id = str(self._next_id)
+                self._next_id += 1
+                self._shared[key] = shared_id
+                added.add(shared_id)
+            id_map[node_id] = shared_id
+            return shared_id
+        
+        for node_id in share:
+            if node_id in workflow:
+                resolve(node_id)
+        
+        for node_id, node in workflow.items():
+            new_id = id_map[node_id]
+            if new_id not in added:
+                continue
+            copied = dict(node)
+            copied["inputs"] = _rewire(node["inputs"], id_map)
+            if "_meta" in node:
+                copied["_meta"] = dict(node["_meta"])
+                if label and node_id not in share and "title" in copied["_meta"]:
+                    copied["_meta"]["title"] = f"{copied['_meta']['title']} [{label}]"
+            self.nodes[new_id] = copied
+            self._class_types[new_id] = node["class_type"]
+        
+        return id_map
+    
+    def merge(self, workflow: Dict[str, Any], label: Optional[str] = None) -> Dict[str, str]:
+        """
+        Add a workflow, sharing its loader nodes with identical ones already in the graph
+        
+        See add_workflow; the shared nodes are those in LOADER_CLASS_TYPES.
+        """
+        share = {node_id for node_id, node in workflow.items() if node.get("class_type") in LOADER_CLASS_TYPES}
+        return self.add_workflow(workflow, share, label)
+    
+    def output(self, node_id: str, index: int = 0) -> Socket:
+        """
+        Return an output socket of a node
+        
+        Raises:
+            ValueError: No such node or output
+        """
+        class_type = self._class_types.get(node_id)
+        if class_type is None:
+            raise ValueError(f"Unknown node {node_id}")
+        
+        outputs = NODE_OUTPUT_TYPES.get(class_type)
+        if outputs is None:
+            return Socket(node_id, index, None)
+        if not 0 <= index < len(outputs):
+            raise ValueError(f"{class_type} has no output {index}")
+        # Skips the NamedTuple constructor, this runs once per link in a chain
+        return _tuple_new(Socket, (node_id, index, outputs[index]))
+    
+    def outputs(self, node_id: str) -> Tuple[Socket, ...]:
+        """
+        Return every output socket of a node of a known class
+        """
+        class_type = self._class_types.get(node_id)
+        return tuple(self.output(node_id, index) for index in range(len(NODE_OUTPUT_TYPES.get(class_type, ()))))
+    
+    def _register(self, node_id: str, class_type: str) -> None:
+        """
+        Record a node's class and keep the ID counter past it
+        """
+        self._class_types[node_id] = class_type
+        if node_id.isdigit() and int(node_id) >= self._next_id:
+            self._next_id = int(node_id) + 1
+    
+    def _check_input(self, class_type: str, input_name: str, target: str, index: int) -> None:
+        """
+        Validate a link from an input to an existing node's output
+        """
+        target_class_type = self._class_types.get(target)
+        if target_class_type is None:
+            raise ValueError(f"{class_type}.{input_name} links to unknown node {target}")
+        check_link(class_type, input_name, target_class_type, index)
+
+
+def merge_workflows(workflows: Iterable[Dict[str, Any]],
+                    labels: Optional[Iterable[Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    Merge workflows into one that loads every distinct model once
+    
+    Identical loader nodes (same class_type and inputs, titles ignored) are
+    collapsed into one and their consumers rewired to it. A LoRA chain is
+    shared as far as its loaders match link by link, so workflows on the
+    same checkpoint that differ only in their last LoRA share everything
+    before it. Duplicate loaders inside a single workflow are collapsed too.
+    
+    Args:
+        workflows: API-format workflows
+        labels: Optional per-workflow labels appended to the titles of their
+            own (unshared) nodes
+    """
+    graph = WorkflowGraph()
+    if labels is None:
+        for workflow in workflows:
+            graph.merge(workflow)
+    else:
+        for workflow, label in zip(workflows, labels):
+            graph.merge(workflow, label)
+    return graph.nodes
+
+
+def _rewire(inputs: Dict[str, Any], id_map: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Copy of inputs with links to mapped nodes pointing at their new IDs
+    """
+    return {
+        name: [id_map[value[0]], value[1]] if is_node_link(value) and value[0] in id_map else value
+        for name, value in inputs.items()
+    }
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Tuple
+
+from .workflow_generator import serialize_workflow
+from .workflow_graph import merge_workflows
+
+
+def _collect_workflows(*inputs: Any) -> List[Dict[str, Any]]:
+    """
+    Flatten workflow inputs, each a workflow dict or a list of them (a separate-mode sweep)
+    """
+    workflows = []
+    for value in inputs:
+        if value is None:
+            continue
+        for workflow in (value if isinstance(value, list) else [value]):
+            # Skip the placeholder a generator returns on errors
+            if isinstance(workflow, dict) and workflow and "error" not in workflow:
+                workflows.append(workflow)
+    return workflows
+
+
+class WorkflowMergeNode:
+    """
+    ComfyUI node merging generated workflows into one prompt with shared loaders
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "workflow": ("WORKFLOW", {}),
+            },
+            "optional": {
+                "workflow_2": ("WORKFLOW", {}),
+                "workflow_3": ("WORKFLOW", {}),
+                "workflow_4": ("WORKFLOW", {}),
+                "json_format": (["pretty", "compact"], {"default": "pretty"}),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "WORKFLOW")
+    RETURN_NAMES = ("workflow_json", "workflow")
+    
+    FUNCTION = "merge"
+    CATEGORY = "Metadata2Workflow"
+    
+    def merge(self, workflow: Any, workflow_2: Any = None, workflow_3: Any = None, workflow_4: Any = None,
+              json_format: str = "pretty") -> Tuple[str, Dict[str, Any]]:
+        """
+        Merge the input workflows, loading each checkpoint, VAE and LoRA chain once
+        """
+        try:
+            merged = merge_workflows(_collect_workflows(workflow, workflow_2, workflow_3, workflow_4))
+        except Exception as e:
+            print(f"Error merging workflows: {str(e)}")
+            merged = {
+                "error": "Failed to merge workflows",
+                "message": str(e)
+            }
+        
+        return (serialize_workflow(merged, compact=json_format == "compact"), merged)
@@ -0,0 +1,321 @@
+"""
+Parameter sweeps: one parsed metadata dict expanded over value axes
+
+Axes use the X/Y/Z plot syntax of the A1111 web UI, one axis per line
+(or separated by ";"):
+
+    seed: 1000-1003
+    cfg: 5, 7.5, 9
+    steps: 20-40 (+10)
+    lora:style_anime: 0.4-1.0 [4]
+
+Every combination becomes one workflow. The workflows can be generated one
+by one, or merged into a single workflow in which the checkpoint, VAE and
+LoRA loaders are shared, so ComfyUI loads each model once for the whole
+sweep and the result can be queued as one prompt.
+"""
+
+import itertools
+import math
+import re
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .workflow_generator import WorkflowGeneratorNode, serialize_workflow
+from .workflow_graph import WorkflowGraph
+from .workflow_templates import get_workflow_template, workflow_template_names
+
+
+# Upper bound on the combinations WorkflowSweepNode expands
+MAX_SWEEP_VARIANTS = 4096
+
+LORA_AXIS_PREFIX = "lora:"
+
+# Axis name -> (parsed_data key, value type)
+SWEEP_AXES: Dict[str, Tuple[str, type]] = {
+    "seed": ("seed", int),
+    "steps": ("steps", int),
+    "cfg": ("cfg_scale", float),
+    "cfg_scale": ("cfg_scale", float),
+    "sampler": ("sampler", str),
+    "scheduler": ("scheduler", str),
+    "size": ("size", str),
+    "denoise": ("denoising_strength", float),
+    "denoising_strength": ("denoising_strength", float),
+}
+
+_AXIS_LINE_RE = re.compile(r'^\s*(lora:[^:]+?|[\w ]+?)\s*[:=]\s*(.*?)\s*$', re.IGNORECASE)
+
+_NUMBER = r'[+-]?(?:\d+\.?\d*|\.\d+)'
+
+# "1-5", "1-5 (+2)" and "0.5-1 [3]", as in the A1111 X/Y/Z plot
+_RANGE_RE = re.compile(
+    rf'^({_NUMBER})\s*-\s*({_NUMBER})\s*(?:\(\s*({_NUMBER})\s*\)|\[\s*(\d+)\s*\])?$'
+)
+
+_SIZE_RE = re.compile(r'^\d+x\d+$')
+
+_GENERATOR = WorkflowGeneratorNode()
+
+
+class SweepAxis(NamedTuple):
+    """
+    One sweep axis: the axis name as written and its values
+    """
+    name: str
+    values: Tuple[Any, ...]
+
+
+def _expand_range(item: str, value_type: type) -> Optional[List[Any]]:
+    """
+    Values of a range item, None when item is not a range
+    """
+    match = _RANGE_RE.match(item)
+    if match is None:
+        return None
+    
+    start, end = float(match.group(1)), float(match.group(2))
+    if match.group(4) is not None:
+        count = int(match.group(4))
+        if count < 1:
+            raise ValueError(f"Range '{item}' needs at least one value")
+        step = (end - start) / (count - 1) if count > 1 else 0.0
+    else:
+        step = float(match.group(3)) if match.group(3) else (1.0 if end >= start else -1.0)
+        if step == 0 or (end - start) * step < 0:
+            raise ValueError(f"Range '{item}' never reaches its end")
+        count = int(math.floor((end - start) / step + 1e-9)) + 1
+    
+    if count > MAX_SWEEP_VARIANTS:
+        raise ValueError(f"Range '{item}' has more than {MAX_SWEEP_VARIANTS} values")
+    
+    values = [start + i * step for i in range(count)]
+    if value_type is int:
+        return [int(round(value)) for value in values]
+    return [round(value, 10) for value in values]
+
+
+def _parse_axis_values(name: str, text: str, value_type: type) -> Tuple[Any, ...]:
+    """
+    Parse the comma-separated values (and ranges) of one axis
+    """
+    values = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        
+        if value_type is not str:
+            expanded = _expand_range(item, value_type)
+            if expanded is not None:
+                values.extend(expanded)
+                continue
+            try:
+                values.append(value_type(float(item)) if value_type is int else value_type(item))
+            except ValueError:
+                raise ValueError(f"Axis '{name}' has a non-numeric value '{item}'")
+            continue
+        
+        if name == "size" and not _SIZE_RE.match(item):
+            raise ValueError(f"Axis 'size' expects WIDTHxHEIGHT, got '{item}'")
+        values.append(item)
+    
+    if not values:
+        raise ValueError(f"Axis '{name}' has no values")
+    return tuple(values)
+
+
+def _axis_type(name: str) -> type:
+    """
+    Value type of an axis
+    
+    Raises:
+        ValueError: Unknown axis name
+    """
+    if name.startswith(LORA_AXIS_PREFIX):
+        return float
+    if name not in SWEEP_AXES:
+        raise ValueError(f"Unknown sweep axis '{name}', expected one of {', '.join(SWEEP_AXES)} or lora:NAME")
+    return SWEEP_AXES[name][1]
+
+
+def parse_sweep_axes(spec: Union[str, Dict[str, Iterable[Any]]]) -> List[SweepAxis]:
+    """
+    Parse an axis spec, either the text form or a {name: values} dict
+    
+    Raises:
+        ValueError: Unknown axis, malformed value or a repeated axis
+    """
+    axes = []
+    
+    if isinstance(spec, dict):
+        for name, values in spec.items():
+            name = name.strip()
+            if not name.startswith(LORA_AXIS_PREFIX):
+                name = name.lower()
+            value_type = _axis_type(name)
+            values = tuple(values)
+            if not values:
+                raise ValueError(f"Axis '{name}' has no values")
+            axes.append(SweepAxis(name, tuple(value_type(value) for value in values)))
+    else:
+        for line in re.split(r'[;\n]', spec):
+            if not line.strip():
+                continue
+            match = _AXIS_LINE_RE.match(line)
+            if match is None:
+                raise ValueError(f"Malformed sweep axis '{line.strip()}', expected 'name: values'")
+            
+            name = match.group(1).strip()
+            if name.lower().startswith(LORA_AXIS_PREFIX):
+                name = LORA_AXIS_PREFIX + name[len(LORA_AXIS_PREFIX):].strip()
+            else:
+                name = name.lower().replace(" ", "_")
+            axes.append(SweepAxis(name, _parse_axis_values(name, match.group(2), _axis_type(name))))
+    
+    names = [axis.name for axis in axes]
+    for name in names:
+        if names.count(name) > 1:
+            raise ValueError(f"Axis '{name}' is given more than once")
+    return axes
+
+
+def sweep_size(axes: List[SweepAxis]) -> int:
+    """
+    Number of combinations of the axes
+    """
+    return math.prod(len(axis.values) for axis in axes)
+
+
+def _apply_axis(variant: Dict[str, Any], name: str, value: Any) -> None:
+    """
+    Set one axis value on a shallow copy of the parsed data
+    """
+    if name.startswith(LORA_AXIS_PREFIX):
+        lora_name = name[len(LORA_AXIS_PREFIX):]
+        loras = variant.get("loras", [])
+        if not any(lora["name"] == lora_name for lora in loras):
+            raise ValueError(f"No LoRA named '{lora_name}' in the parsed metadata")
+        variant["loras"] = [
+            dict(lora, strength=value, strength_clip=value) if lora["name"] == lora_name else lora
+            for lora in loras
+        ]
+        return
+    
+    variant[SWEEP_AXES[name][0]] = value
+
+
+def iter_sweep_variants(parsed_data: Dict[str, Any],
+                        axes: List[SweepAxis]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Yield (axis values, parsed data) for every combination, the first axis varying slowest
+    
+    Each parsed data is a shallow copy; the loras list is only copied when a
+    LoRA axis changes it.
+    """
+    names = [axis.name for axis in axes]
+    for combination in itertools.product(*(axis.values for axis in axes)):
+        variant = dict(parsed_data)
+        for name, value in zip(names, combination):
+            _apply_axis(variant, name, value)
+        yield dict(zip(names, combination)), variant
+
+
+def iter_sweep_workflows(parsed_data: Dict[str, Any], axes: List[SweepAxis], model_name: str = "",
+                         vae_name: str = "", workflow_template: str = "basic") -> Iterator[Dict[str, Any]]:
+    """
+    Yield one workflow per combination, lazily
+    """
+    template = get_workflow_template(workflow_template) or get_workflow_template("basic")
+    for _, variant in iter_sweep_variants(parsed_data, axes):
+        yield _GENERATOR._instantiate_template(template, variant, model_name, vae_name)
+
+
+def build_merged_sweep(parsed_data: Dict[str, Any], axes: List[SweepAxis], model_name: str = "",
+                       vae_name: str = "", workflow_template: str = "basic") -> Dict[str, Any]:
+    """
+    Build every combination into a single workflow with shared loaders
+    
+    The template's link sources (the checkpoint loader) and the LoRA and
+    VAE loaders added for it are shared between all variants with the same
+    inputs, so a sweep over seeds has one loader chain and a sweep over a
+    LoRA strength has one chain per strength. Titles of the per-variant
+    nodes get the variant's axis values appended.
+    """
+    template = get_workflow_template(workflow_template) or get_workflow_template("basic")
+    source_ids = {source[0] for source in template.link_sources.values()}
+    
+    graph = WorkflowGraph()
+    for values, variant in iter_sweep_variants(parsed_data, axes):
+        workflow = _GENERATOR._instantiate_template(template, variant, model_name, vae_name)
+        
+        # Nodes outside the template were added by the generator: the loaders
+        loader_ids = source_ids.union(node_id for node_id in workflow if node_id not in template.node_types)
+        label = ", ".join(f"{name}={value}" for name, value in values.items())
+        graph.add_workflow(workflow, loader_ids, label)
+    
+    return graph.nodes
+
+
+class WorkflowSweepNode:
+    """
+    ComfyUI node expanding parsed metadata over seed, CFG, steps, sampler and LoRA strength axes
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "parsed_data": ("DICT", {}),
+                "sweep_axes": ("STRING", {
+                    "multiline": True,
+                    "default": "seed: 1-4",
+                    "placeholder": "seed: 1-4\ncfg: 5, 7\nlora:name: 0.5-1.0 [3]"
+                }),
+            },
+            "optional": {
+                "mode": (["merged", "separate"], {"default": "merged"}),
+                "model_name": ("STRING", {
+                    "default": "",
+                    "placeholder": "Checkpoint name, empty to use the one in the metadata"
+                }),
+                "vae_name": ("STRING", {
+                    "default": "sdxl_vae.safetensors",
+                    "placeholder": "VAE name"
+                }),
+                "workflow_template": (workflow_template_names(), {"default": "basic"}),
+                "json_format": (["pretty", "compact"], {"default": "pretty"}),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "WORKFLOW", "INT")
+    RETURN_NAMES = ("workflow_json", "workflow", "count")
+    
+    FUNCTION = "generate_sweep"
+    CATEGORY = "Metadata2Workflow"
+    
+    def generate_sweep(self, parsed_data: Dict[str, Any], sweep_axes: str, mode: str = "merged",
+                       model_name: str = "", vae_name: str = "", workflow_template: str = "basic",
+                       json_format: str = "pretty") -> Tuple[str, Any, int]:
+        """
+        Generate the sweep
+        
+        In merged mode the outputs are one workflow holding every variant; in
+        separate mode they are a list of workflows (a JSON array).
+        """
+        try:
+            axes = parse_sweep_axes(sweep_axes)
+            count = sweep_size(axes)
+            if count > MAX_SWEEP_VARIANTS:
+                raise ValueError(f"Sweep has {count} combinations, the limit is {MAX_SWEEP_VARIANTS}")
+            
+            if mode == "separate":
+                workflow = list(iter_sweep_workflows(parsed_data, axes, model_name, vae_name, workflow_template))
+            else:
+                workflow = build_merged_sweep(parsed_data, axes, model_name, vae_name, workflow_template)
+            
+            return (serialize_workflow(workflow, compact=json_format == "compact"), workflow, count)
+        
+        except Exception as e:
+            print(f"Error generating sweep: {str(e)}")
+            workflow = _GENERATOR._get_empty_workflow()
+            return (serialize_workflow(workflow), workflow, 0)
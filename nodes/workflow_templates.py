@@ -0,0 +1,331 @@
+import copy
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from .workflow_graph import NODE_INPUT_TYPES, check_link, is_node_link
+
+
+# Environment variable listing directories of user templates (os.pathsep separated)
+TEMPLATES_PATH_ENV = "METADATA2WORKFLOW_TEMPLATES"
+
+# Placeholder markers inside template inputs:
+#   {"$slot": "seed"}                  value filled from the parsed metadata
+#   {"$slot": "eta", "default": 0.0}   same, with a fallback when it is missing
+#   {"$link": "model"}                 link resolved by the generator
+SLOT_KEY = "$slot"
+DEFAULT_KEY = "default"
+LINK_KEY = "$link"
+
+# Links the generator resolves: the end of the LoRA chain (model, clip) and
+# the VAE output (a VAELoader when a VAE name is given)
+LINK_SLOTS = ("model", "clip", "vae")
+
+# Socket type each link carries
+_LINK_TYPES = {"model": "MODEL", "clip": "CLIP", "vae": "VAE"}
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _copier(value: Any) -> Optional[Callable[[Any], Any]]:
+    """
+    Cheapest function giving an unshared copy of a template constant, None
+    for immutable values
+    """
+    if isinstance(value, _SCALAR_TYPES):
+        return None
+    if isinstance(value, list) and all(isinstance(item, _SCALAR_TYPES) for item in value):
+        return list
+    if isinstance(value, dict) and all(isinstance(item, _SCALAR_TYPES) for item in value.values()):
+        return dict
+    return copy.deepcopy
+
+
+class CompiledTemplate:
+    """
+    A workflow template compiled once into an immutable skeleton
+    
+    Compiling validates the template once and splits every node into its
+    constant inputs and a list of fill paths, (node_id, input name, slot or
+    link name). Instantiating is not patch-only: it makes a shallow copy of
+    every node (its input dict, mutable constants such as node links, and
+    _meta) and then assigns the fill paths, so its cost grows with the
+    template's size. Copying keeps every returned workflow independent of
+    the skeleton and of other instances, so callers may edit it. Templates
+    are data; no code is generated from them.
+    """
+    
+    __slots__ = ("name", "node_types", "slots", "slot_names", "slot_defaults", "link_slots", "link_sources",
+                 "_skeleton", "_slot_fills", "_link_fills")
+    
+    def __init__(self, name: str, nodes: Dict[str, Any], link_sources: Optional[Dict[str, List[Any]]] = None):
+        """
+        Args:
+            name: Template name
+            nodes: ComfyUI API-format workflow ({node_id: {"class_type", "inputs", "_meta"}})
+                with slot and link markers in its inputs
+            link_sources: Start of the model/clip/vae links, {"model": [node_id, index], ...};
+                taken from the first CheckpointLoaderSimple when omitted
+        """
+        if not isinstance(nodes, dict) or not nodes:
+            raise ValueError(f"Template '{name}' has no nodes")
+        
+        slots = {}
+        slot_defaults = {}
+        link_slots = set()
+        # (node_id, class_type, constant inputs, (input name, copier) of mutable inputs, _meta, _meta copier)
+        skeleton = []
+        slot_fills = []
+        link_fills = []
+        
+        for node_id, node in nodes.items():
+            if not isinstance(node, dict) or not isinstance(node.get("class_type"), str):
+                raise ValueError(f"Template '{name}' node {node_id} has no class_type")
+            
+            inputs = node.get("inputs", {})
+            if not isinstance(inputs, dict):
+                raise ValueError(f"Template '{name}' node {node_id} inputs must be an object")
+            
+            node_id = str(node_id)
+            # Filled inputs keep their place in the dict through a None placeholder
+            constant_inputs = {}
+            mutable_inputs = []
+            for input_name, value in inputs.items():
+                input_name = str(input_name)
+                if isinstance(value, dict) and SLOT_KEY in value:
+                    slot = value[SLOT_KEY]
+                    if not isinstance(slot, str):
+                        raise ValueError(f"Template '{name}' node {node_id} has an invalid slot name")
+                    slots[slot] = None
+                    if DEFAULT_KEY in value:
+                        slot_defaults[slot] = value[DEFAULT_KEY]
+                    constant_inputs[input_name] = None
+                    slot_fills.append((node_id, input_name, slot))
+                elif isinstance(value, dict) and LINK_KEY in value:
+                    link = value[LINK_KEY]
+                    if link not in LINK_SLOTS:
+                        raise ValueError(f"Template '{name}' node {node_id} uses unknown link '{link}'")
+                    expected_type = NODE_INPUT_TYPES.get(node["class_type"], {}).get(input_name)
+                    if expected_type is not None and expected_type != _LINK_TYPES[link]:
+                        raise ValueError(f"Template '{name}' node {node_id} input {input_name} "
+                                         f"expects {expected_type}, not the {link} link")
+                    link_slots.add(link)
+                    constant_inputs[input_name] = None
+                    link_fills.append((node_id, input_name, link))
+                else:
+                    if is_node_link(value):
+                        target = nodes.get(value[0])
+                        if not isinstance(target, dict) or not isinstance(target.get("class_type"), str):
+                            raise ValueError(f"Template '{name}' node {node_id} links to missing node {value[0]}")
+                        try:
+                            check_link(node["class_type"], input_name, target["class_type"], value[1])
+                        except ValueError as e:
+                            raise ValueError(f"Template '{name}' node {node_id}: {str(e)}")
+                    # Private copy, so later changes to the caller's dict don't leak in
+                    value = copy.deepcopy(value)
+                    constant_inputs[input_name] = value
+                    copier = _copier(value)
+                    if copier is not None:
+                        mutable_inputs.append((input_name, copier))
+            
+            meta = copy.deepcopy(node["_meta"]) if node.get("_meta") else None
+            skeleton.append((node_id, node["class_type"], constant_inputs, tuple(mutable_inputs),
+                             meta, _copier(meta)))
+        
+        if link_sources is None:
+            link_sources = self._default_link_sources(nodes)
+        
+        # The LoRA chain patches model and clip together
+        required_links = set(link_slots)
+        if required_links & {"model", "clip"}:
+            required_links |= {"model", "clip"}
+        for link in required_links:
+            if link not in link_sources:
+                raise ValueError(f"Template '{name}' uses the {link} link but has no source for it")
+        
+        self.name = name
+        self.node_types = {str(node_id): node["class_type"] for node_id, node in nodes.items()}
+        self.slots = tuple(slots)
+        self.slot_names = frozenset(slots)
+        self.slot_defaults = slot_defaults
+        self.link_slots = frozenset(link_slots)
+        self.link_sources = {link: list(source) for link, source in link_sources.items()}
+        self._skeleton = tuple(skeleton)
+        self._slot_fills = tuple(slot_fills)
+        self._link_fills = tuple(link_fills)
+    
+    @staticmethod
+    def _default_link_sources(nodes: Dict[str, Any]) -> Dict[str, List[Any]]:
+        """
+        Link sources of the first checkpoint loader in the template
+        """
+        for node_id, node in nodes.items():
+            if isinstance(node, dict) and node.get("class_type") == "CheckpointLoaderSimple":
+                return {"model": [str(node_id), 0], "clip": [str(node_id), 1], "vae": [str(node_id), 2]}
+        return {}
+    
+    def instantiate(self, values: Dict[str, Any], links: Dict[str, List[Any]]) -> Dict[str, Any]:
+        """
+        Build a fresh workflow dict from the skeleton, copying every node
+        
+        Args:
+            values: Value of every name in self.slots
+            links: [node_id, index] of every name in self.link_slots
+        """
+        workflow = {}
+        for node_id, class_type, constant_inputs, mutable_inputs, meta, meta_copier in self._skeleton:
+            inputs = dict(constant_inputs)
+            for input_name, copier in mutable_inputs:
+                inputs[input_name] = copier(inputs[input_name])
+            node = {"inputs": inputs, "class_type": class_type}
+            if meta is not None:
+                node["_meta"] = meta if meta_copier is None else meta_copier(meta)
+            workflow[node_id] = node
+        
+        for node_id, input_name, slot in self._slot_fills:
+            workflow[node_id]["inputs"][input_name] = values[slot]
+        for node_id, input_name, link in self._link_fills:
+            workflow[node_id]["inputs"][input_name] = list(links[link])
+        return workflow
+
+
+def _node(class_type: str, title: str, **inputs: Any) -> Dict[str, Any]:
+    """
+    Template node literal
+    """
+    return {"inputs": inputs, "class_type": class_type, "_meta": {"title": title}}
+
+
+def _slot(name: str) -> Dict[str, str]:
+    """
+    Slot marker
+    """
+    return {SLOT_KEY: name}
+
+
+def _link(name: str) -> Dict[str, str]:
+    """
+    Link marker
+    """
+    return {LINK_KEY: name}
+
+
+_BASIC_TEMPLATE = {
+    "4": _node("CheckpointLoaderSimple", "Load Checkpoint", ckpt_name=_slot("ckpt_name")),
+    "5": _node("EmptyLatentImage", "Empty Latent Image",
+               width=_slot("width"), height=_slot("height"), batch_size=1),
+    "6": _node("CLIPTextEncode", "CLIP Text Encode (Prompt)", text=_slot("positive_prompt"), clip=_link("clip")),
+    "7": _node("CLIPTextEncode", "CLIP Text Encode (Negative)", text=_slot("negative_prompt"), clip=_link("clip")),
+    "3": _node("KSampler", "KSampler",
+               seed=_slot("seed"), steps=_slot("steps"), cfg=_slot("cfg"),
+               sampler_name=_slot("sampler_name"), scheduler=_slot("scheduler"), denoise=1.0,
+               model=_link("model"), positive=["6", 0], negative=["7", 0], latent_image=["5", 0]),
+    "8": _node("VAEDecode", "VAE Decode", samples=["3", 0], vae=_link("vae")),
+    "9": _node("SaveImage", "Save Image", filename_prefix="ComfyUI", images=["8", 0]),
+}
+
+# Basic plus a latent upscale and a second sampling pass
+_ADVANCED_TEMPLATE = dict(_BASIC_TEMPLATE)
+_ADVANCED_TEMPLATE.update({
+    "8": _node("VAEDecode", "VAE Decode", samples=["12", 0], vae=_link("vae")),
+    "11": _node("LatentUpscale", "Upscale Latent",
+                upscale_method="nearest-exact", width=_slot("upscale_width"), height=_slot("upscale_height"),
+                crop="disabled", samples=["3", 0]),
+    "12": _node("KSampler", "KSampler (Upscale)",
+                seed=_slot("seed"), steps=_slot("upscale_steps"), cfg=_slot("cfg"),
+                sampler_name=_slot("sampler_name"), scheduler=_slot("scheduler"), denoise=0.5,
+                model=_link("model"), positive=["6", 0], negative=["7", 0], latent_image=["11", 0]),
+})
+
+_IMG2IMG_TEMPLATE = {
+    "4": _node("CheckpointLoaderSimple", "Load Checkpoint", ckpt_name=_slot("ckpt_name")),
+    "10": _node("LoadImage", "Load Image", image="input_image_placeholder"),
+    "13": _node("VAEEncode", "VAE Encode", pixels=["10", 0], vae=_link("vae")),
+    "6": _node("CLIPTextEncode", "CLIP Text Encode (Prompt)", text=_slot("positive_prompt"), clip=_link("clip")),
+    "7": _node("CLIPTextEncode", "CLIP Text Encode (Negative)", text=_slot("negative_prompt"), clip=_link("clip")),
+    "3": _node("KSampler", "KSampler",
+               seed=_slot("seed"), steps=_slot("steps"), cfg=_slot("cfg"),
+               sampler_name=_slot("sampler_name"), scheduler=_slot("scheduler"),
+               denoise=_slot("denoising_strength"),
+               model=_link("model"), positive=["6", 0], negative=["7", 0], latent_image=["13", 0]),
+    "8": _node("VAEDecode", "VAE Decode", samples=["3", 0], vae=_link("vae")),
+    "9": _node("SaveImage", "Save Image", filename_prefix="ComfyUI", images=["8", 0]),
+}
+
+_TEMPLATES: Dict[str, CompiledTemplate] = {}
+
+
+def register_workflow_template(name: str, template: Dict[str, Any]) -> CompiledTemplate:
+    """
+    Compile a template and make it available to WorkflowGeneratorNode
+    
+    template is either an API-format workflow with slot and link markers,
+    or {"nodes": {...}, "link_sources": {...}}. Registering an existing
+    name replaces it.
+    """
+    if isinstance(template, dict) and isinstance(template.get("nodes"), dict):
+        compiled = CompiledTemplate(name, template["nodes"], template.get("link_sources"))
+    else:
+        compiled = CompiledTemplate(name, template)
+    
+    _TEMPLATES[name] = compiled
+    return compiled
+
+
+def load_workflow_template(path: str, name: Optional[str] = None) -> CompiledTemplate:
+    """
+    Register a template from a JSON file, named after the file unless given
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        template = json.load(f)
+    
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    return register_workflow_template(name, template)
+
+
+def load_workflow_templates(directory: str) -> List[str]:
+    """
+    Register every *.json template in a directory, returning the loaded names
+    """
+    loaded = []
+    
+    try:
+        filenames = sorted(os.listdir(directory))
+    except OSError as e:
+        print(f"Error reading template directory {directory}: {str(e)}")
+        return loaded
+    
+    for filename in filenames:
+        if not filename.lower().endswith(".json"):
+            continue
+        try:
+            loaded.append(load_workflow_template(os.path.join(directory, filename)).name)
+        except (OSError, ValueError) as e:
+            print(f"Error loading workflow template {filename}: {str(e)}")
+    
+    return loaded
+
+
+def get_workflow_template(name: str) -> Optional[CompiledTemplate]:
+    """
+    Return a registered template, None if there is no such name
+    """
+    return _TEMPLATES.get(name)
+
+
+def workflow_template_names() -> List[str]:
+    """
+    Names of the registered templates, built-in ones first
+    """
+    return list(_TEMPLATES)
+
+
+BUILTIN_TEMPLATES = ("basic", "advanced", "img2img")
+
+register_workflow_template("basic", _BASIC_TEMPLATE)
+register_workflow_template("advanced", _ADVANCED_TEMPLATE)
+register_workflow_template("img2img", _IMG2IMG_TEMPLATE)
+
+for _directory in filter(None, os.environ.get(TEMPLATES_PATH_ENV, "").split(os.pathsep)):
+    load_workflow_templates(_directory)
@@ -0,0 +1,920 @@
+#!/usr/bin/env python3
+"""
+Test script for the server-side image metadata readers
+"""
+
+import sys
+import os
+import struct
+import tempfile
+import zlib
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nodes.png_reader import iter_png_text_chunks, read_png_text_chunks, extract_png_parameters
+from nodes.exif_reader import extract_jpeg_parameters, extract_webp_parameters, decode_user_comment
+
+TEST_PARAMETERS = """masterpiece, best quality, 1girl, <lora:style_anime:0.8>
+Negative prompt: ugly, blurry
+Steps: 30, Sampler: Euler a, CFG scale: 7, Seed: 1234567890, Size: 1024x1024, Model: sd_xl_base_1.0"""
+
+
+def _png_chunk(chunk_type, data):
+    """Build a PNG chunk with its CRC"""
+    crc = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def _write_temp_file(data, suffix):
+    """Write bytes to a temporary file and return its path"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _build_png(text_chunks, idat_size=64 * 1024):
+    """Build a minimal PNG with the given text chunks placed around the image data"""
+    header = _png_chunk(b'IHDR', struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+    idat = _png_chunk(b'IDAT', b'\x00' * idat_size)
+    return b'\x89PNG\r\n\x1a\n' + header + b''.join(text_chunks) + idat + _png_chunk(b'IEND', b'')
+
+
+def _build_exif(user_comment, byte_order=">"):
+    """Build a TIFF block with an Exif IFD holding only a UserComment"""
+    tiff_header = (b'MM' if byte_order == ">" else b'II') + struct.pack(byte_order + "HI", 42, 8)
+    # IFD0 at 8 with one entry pointing to the Exif IFD at 26
+    ifd0 = struct.pack(byte_order + "HHHII", 1, 0x8769, 4, 1, 26) + struct.pack(byte_order + "I", 0)
+    # Exif IFD at 26 with the UserComment stored right after it at 44
+    exif_ifd = struct.pack(byte_order + "HHHII", 1, 0x9286, 7, len(user_comment), 44) + struct.pack(byte_order + "I", 0)
+    return tiff_header + ifd0 + exif_ifd + user_comment
+
+
+def _build_jpeg(segments):
+    """Build a JPEG with the given (marker, payload) segments followed by scan data"""
+    body = b''.join(b'\xff' + bytes([marker]) + struct.pack(">H", len(payload) + 2) + payload
+                    for marker, payload in segments)
+    return b'\xff\xd8' + body + b'\xff\xda\x00\x02' + b'\x00' * 64 * 1024 + b'\xff\xd9'
+
+
+def _build_webp(chunks):
+    """Build a WebP RIFF container from (fourcc, payload) chunks"""
+    body = b''.join(fourcc + struct.pack("<I", len(payload)) + payload + b'\x00' * (len(payload) & 1)
+                    for fourcc, payload in chunks)
+    return b'RIFF' + struct.pack("<I", len(body) + 4) + b'WEBP' + body
+
+
+def test_png_text_chunks():
+    """Test tEXt, zTXt and iTXt extraction from PNG files"""
+    
+    print("Testing PNG text chunk reader...")
+    
+    png = _build_png([
+        _png_chunk(b'tEXt', b'Software\x00test'),
+        _png_chunk(b'zTXt', b'comment\x00\x00' + zlib.compress("compressed text".encode("utf-8"))),
+        _png_chunk(b'iTXt', b'title\x00\x01\x00en\x00\x00' + zlib.compress("标题".encode("utf-8"))),
+        _png_chunk(b'iTXt', b'parameters\x00\x00\x00\x00\x00' + TEST_PARAMETERS.encode("utf-8")),
+        _png_chunk(b'tEXt', b'after\x00not reached'),
+    ])
+    path = _write_temp_file(png, ".png")
+    
+    try:
+        chunks = list(iter_png_text_chunks(path))
+        print(f"Found chunks: {[(keyword, chunk_type) for keyword, _, chunk_type in chunks]}")
+        assert len(chunks) == 5
+        
+        texts = read_png_text_chunks(path, stop_at_parameters=True)
+        assert texts == {
+            "Software": "test",
+            "comment": "compressed text",
+            "title": "标题",
+            "parameters": TEST_PARAMETERS,
+        }
+        
+        assert extract_png_parameters(path) == TEST_PARAMETERS
+    finally:
+        os.remove(path)
+
+
+def test_png_invalid_files():
+    """Test that non-PNG and truncated files are handled"""
+    
+    print("\n\nTesting invalid PNG input...")
+    
+    path = _write_temp_file(b'not a png file', ".png")
+    try:
+        try:
+            extract_png_parameters(path)
+            assert False, "Expected ValueError for invalid signature"
+        except ValueError as e:
+            print(f"Invalid signature: {e}")
+    finally:
+        os.remove(path)
+    
+    # Truncated image data: the walk stops without error
+    png = _build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))])
+    path = _write_temp_file(png[:-1000], ".png")
+    try:
+        assert extract_png_parameters(path) == TEST_PARAMETERS
+    finally:
+        os.remove(path)
+
+
+def test_user_comment_encodings():
+    """Test EXIF UserComment decoding for the common character codes"""
+    
+    print("\n\nTesting UserComment decoding...")
+    
+    assert decode_user_comment(b'UNICODE\x00' + TEST_PARAMETERS.encode("utf-16-be")) == TEST_PARAMETERS
+    assert decode_user_comment(b'UNICODE\x00' + TEST_PARAMETERS.encode("utf-16-le")) == TEST_PARAMETERS
+    assert decode_user_comment(b'UNICODE\x00' + "中文 prompt".encode("utf-16")) == "中文 prompt"
+    assert decode_user_comment(b'ASCII\x00\x00\x00' + b'Steps: 20\x00') == "Steps: 20"
+
+
+def test_jpeg_parameters():
+    """Test JPEG metadata extraction from the EXIF and COM segments"""
+    
+    print("\n\nTesting JPEG metadata reader...")
+    
+    user_comment = b'UNICODE\x00' + TEST_PARAMETERS.encode("utf-16-be")
+    jpeg = _build_jpeg([
+        (0xE0, b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'),
+        (0xE1, b'Exif\x00\x00' + _build_exif(user_comment)),
+    ])
+    path = _write_temp_file(jpeg, ".jpg")
+    try:
+        parameters = extract_jpeg_parameters(path)
+        print(f"JPEG parameters: {parameters[:60]}...")
+        assert parameters == TEST_PARAMETERS
+    finally:
+        os.remove(path)
+    
+    # Little-endian TIFF and a comment segment fallback
+    jpeg = _build_jpeg([(0xE1, b'Exif\x00\x00' + _build_exif(b'\x00' * 8, "<")), (0xFE, b'Steps: 20, Seed: 1')])
+    path = _write_temp_file(jpeg, ".jpg")
+    try:
+        assert extract_jpeg_parameters(path) == "Steps: 20, Seed: 1"
+    finally:
+        os.remove(path)
+
+
+def test_webp_parameters():
+    """Test WebP metadata extraction from the EXIF and XMP chunks"""
+    
+    print("\n\nTesting WebP metadata reader...")
+    
+    user_comment = b'UNICODE\x00' + TEST_PARAMETERS.encode("utf-16-le")
+    webp = _build_webp([(b'VP8 ', b'\x00' * 4097), (b'EXIF', _build_exif(user_comment, "<"))])
+    path = _write_temp_file(webp, ".webp")
+    try:
+        assert extract_webp_parameters(path) == TEST_PARAMETERS
+    finally:
+        os.remove(path)
+    
+    xmp = (b'<x:xmpmeta><rdf:RDF><rdf:Description><exif:UserComment><rdf:Alt>'
+           b'<rdf:li xml:lang="x-default">Steps: 20, Sampler: Euler &amp; co</rdf:li>'
+           b'</rdf:Alt></exif:UserComment></rdf:Description></rdf:RDF></x:xmpmeta>')
+    webp = _build_webp([(b'VP8 ', b'\x00' * 100), (b'XMP ', xmp)])
+    path = _write_temp_file(webp, ".webp")
+    try:
+        assert extract_webp_parameters(path) == "Steps: 20, Sampler: Euler & co"
+    finally:
+        os.remove(path)
+
+
+def test_png_json_metadata():
+    """Test the InvokeAI and NovelAI chunks read when there is no parameters chunk"""
+    
+    import json
+    from nodes.image_metadata import extract_image_parameters
+    from nodes.metadata_parser import MetadataParserNode
+    
+    print("\n\nTesting PNG JSON metadata...")
+    
+    comment = json.dumps({"uc": "lowres", "steps": 28, "scale": 5.0, "seed": 42, "sampler": "k_euler"})
+    png = _build_png([
+        _png_chunk(b'tEXt', b'Software\x00NovelAI'),
+        _png_chunk(b'tEXt', b'Description\x001girl, smile'),
+        _png_chunk(b'tEXt', b'Comment\x00' + comment.encode("utf-8")),
+    ])
+    text = extract_image_parameters(png)
+    parsed = MetadataParserNode()._parse_text(text)
+    print(f"NovelAI: {parsed}")
+    assert parsed["positive_prompt"] == "1girl, smile" and parsed["sampler"] == "euler"
+    
+    invokeai = json.dumps({"positive_prompt": "a castle", "steps": 30, "app_version": "4.2.0"})
+    png = _build_png([
+        _png_chunk(b'tEXt', b'Comment\x00not json'),
+        _png_chunk(b'iTXt', b'invokeai_metadata\x00\x00\x00\x00\x00' + invokeai.encode("utf-8")),
+    ])
+    assert extract_image_parameters(png) == invokeai
+    
+    # A parameters chunk always wins
+    png = _build_png([
+        _png_chunk(b'tEXt', b'Comment\x00' + comment.encode("utf-8")),
+        _png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8")),
+    ])
+    assert extract_image_parameters(png) == TEST_PARAMETERS
+    assert extract_image_parameters(_build_png([_png_chunk(b'tEXt', b'Comment\x00hello')])) is None
+
+
+def test_embedded_workflow():
+    """Test passing through the prompt ComfyUI embeds in its PNGs"""
+    
+    import asyncio
+    import json
+    import shutil
+    from nodes.async_pipeline import convert_paths
+    from nodes.image_metadata import extract_embedded_workflow, extract_image_metadata, extract_image_parameters
+    from nodes.pipeline import convert_directory, write_merged_workflow
+    from nodes.server_routes import convert_item
+    
+    print("\n\nTesting embedded ComfyUI workflows...")
+    
+    prompt = {
+        "9": {"class_type": "SaveImage", "inputs": {"images": ["8", 0], "filename_prefix": "ComfyUI"}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 832, "height": 1216, "batch_size": 1}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a lighthouse at dusk", "clip": ["4", 1]}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["4", 1]}},
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": 42, "steps": 25, "cfg": 6.5, "sampler_name": "dpmpp_2m", "scheduler": "karras", "denoise": 1.0,
+            "model": ["4", 0], "positive": ["6", 0], "negative": ["7", 0], "latent_image": ["5", 0]}},
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["3", 0], "vae": ["4", 2]}},
+    }
+    png = _build_png([
+        _png_chunk(b'tEXt', b'prompt\x00' + json.dumps(prompt).encode("utf-8")),
+        _png_chunk(b'tEXt', b'workflow\x00' + json.dumps({"nodes": [], "links": []}).encode("utf-8")),
+    ])
+    
+    text, workflow = extract_image_metadata(png)
+    assert workflow == prompt
+    assert list(workflow) == list(prompt)
+    assert extract_embedded_workflow(png) == prompt
+    # Without passthrough the prompt is still parsed as ComfyUI metadata
+    assert text == extract_image_parameters(png) and json.loads(text) == prompt
+    
+    plain = _build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))])
+    assert extract_image_metadata(plain) == (TEST_PARAMETERS, None)
+    # A "prompt" chunk that is not an API prompt is ignored
+    assert extract_embedded_workflow(_build_png([_png_chunk(b'tEXt', b'prompt\x00a cat')])) is None
+    assert extract_embedded_workflow(_build_png([_png_chunk(b'tEXt', b'prompt\x00{"steps": 20}')])) is None
+    
+    # Saver nodes that write parameters before the prompt, with image data between
+    saver = _build_png([
+        _png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8")),
+        _png_chunk(b'IDAT', b'\x00' * 64),
+        _png_chunk(b'tEXt', b'prompt\x00' + json.dumps(prompt).encode("utf-8")),
+    ])
+    assert extract_image_metadata(saver) == (TEST_PARAMETERS, prompt)
+    assert extract_image_parameters(saver) == TEST_PARAMETERS
+    
+    root = tempfile.mkdtemp()
+    try:
+        for name, data in (("a_comfy.png", png), ("b_plain.png", plain)):
+            with open(os.path.join(root, name), "wb") as f:
+                f.write(data)
+        
+        for cpu_workers in (1, 2):
+            results = list(convert_directory(root, cpu_workers=cpu_workers, model_name="override.safetensors"))
+            assert results[0]["workflow"] == prompt and results[0]["embedded"] is True
+            assert "embedded" not in results[1]
+            assert results[1]["workflow"]["4"]["inputs"]["ckpt_name"] == "override.safetensors"
+        
+        regenerated = list(convert_directory(root, cpu_workers=1, passthrough=False))[0]
+        print(f"Regenerated: {regenerated['workflow']['3']['inputs']}")
+        assert "embedded" not in regenerated
+        assert regenerated["workflow"]["3"]["inputs"]["seed"] == 42
+        assert regenerated["workflow"]["3"]["inputs"]["sampler_name"] == "dpmpp_2m"
+        
+        async def collect(iterator):
+            return [result async for result in iterator]
+        
+        paths = [os.path.join(root, "a_comfy.png"), os.path.join(root, "b_plain.png")]
+        results = asyncio.run(collect(convert_paths(paths, cpu_workers=1, ordered=True)))
+        assert results[0]["workflow"] == prompt and "embedded" not in results[1]
+        
+        output_path = os.path.join(root, "merged.json")
+        assert write_merged_workflow(convert_directory(root, cpu_workers=1), output_path) == (2, 0)
+        with open(output_path, encoding="utf-8") as f:
+            merged = json.load(f)
+        assert sum(node["class_type"] == "SaveImage" for node in merged.values()) == 2
+    finally:
+        shutil.rmtree(root)
+    
+    result = convert_item({"source": "a.png", "image": png}, template="advanced")
+    assert result == {"source": "a.png", "workflow": prompt, "embedded": True}
+
+
+def test_convert_directory():
+    """Test the directory to workflow pipeline"""
+    
+    import json
+    import shutil
+    from nodes.pipeline import convert_directory, write_jsonl, write_merged_workflow
+    
+    print("\n\nTesting directory conversion pipeline...")
+    
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, "sub"))
+        with open(os.path.join(root, "a.png"), "wb") as f:
+            f.write(_build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))]))
+        with open(os.path.join(root, "sub", "b.jpg"), "wb") as f:
+            user_comment = b'UNICODE\x00' + TEST_PARAMETERS.encode("utf-16-be")
+            f.write(_build_jpeg([(0xE1, b'Exif\x00\x00' + _build_exif(user_comment))]))
+        with open(os.path.join(root, "sub", "empty.png"), "wb") as f:
+            f.write(_build_png([]))
+        with open(os.path.join(root, "notes.txt"), "w") as f:
+            f.write("not an image")
+        
+        results = list(convert_directory(root, io_workers=2, cpu_workers=1, queue_size=2))
+        print(f"Results: {[(os.path.basename(r['source']), r.get('error')) for r in results]}")
+        
+        assert [os.path.basename(r["source"]) for r in results] == ["a.png", "b.jpg", "empty.png"]
+        for result in results[:2]:
+            workflow = result["workflow"]
+            assert workflow["3"]["inputs"]["seed"] == 1234567890
+            lora_loader = workflow[workflow["3"]["inputs"]["model"][0]]
+            assert lora_loader["inputs"]["lora_name"] == "style_anime"
+        assert results[2]["error"] == "No metadata found"
+        
+        output_path = os.path.join(root, "out.jsonl")
+        converted, failed = write_jsonl(convert_directory(root, cpu_workers=2), output_path)
+        assert (converted, failed) == (2, 1)
+        with open(output_path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        assert lines == results
+        
+        # Both images use the same checkpoint and LoRAs, merged they load once
+        merged_path = os.path.join(root, "merged.json")
+        converted, failed = write_merged_workflow(iter(results), merged_path)
+        assert (converted, failed) == (2, 1)
+        with open(merged_path, encoding="utf-8") as f:
+            merged = json.load(f)
+        class_types = [node["class_type"] for node in merged.values()]
+        assert class_types.count("KSampler") == 2
+        assert class_types.count("CheckpointLoaderSimple") == 1
+        assert class_types.count("LoraLoader") == len(results[0]["workflow"]) - 7
+    finally:
+        shutil.rmtree(root)
+
+
+def test_jsonl_store():
+    """Test the streaming JSONL writer, compression and resumed runs"""
+    
+    import shutil
+    from nodes.jsonl_store import JsonlWriter, file_sha256, iter_jsonl, read_jsonl_sources
+    from nodes.pipeline import main
+    
+    print("\n\nTesting JSONL storage...")
+    
+    root = tempfile.mkdtemp()
+    try:
+        records = [{"source": f"{i}.png", "workflow": {"3": {"inputs": {"text": "ü"}}}} for i in range(5)]
+        records.append({"source": "5.png", "error": "No metadata found"})
+        
+        for name in ("out.jsonl", "out.jsonl.gz", "out.jsonl.xz"):
+            path = os.path.join(root, name)
+            with JsonlWriter(path, flush_every=2) as writer:
+                writer.write_all(records[:4])
+            assert (writer.converted, writer.failed) == (4, 0)
+            assert list(iter_jsonl(path)) == records[:4]
+            
+            with JsonlWriter(path, append=True) as writer:
+                writer.write_all(records[4:])
+            assert (writer.converted, writer.failed) == (1, 1)
+            assert list(iter_jsonl(path)) == records
+            print(f"{name}: {os.path.getsize(path)} bytes")
+        
+        # Every flush reported through on_flush can be read back, as after a
+        # crash right after it, whatever the compression
+        for name in ("crash.jsonl", "crash.jsonl.gz", "crash.jsonl.xz"):
+            path = os.path.join(root, name)
+            snapshot = os.path.join(root, "snapshot-" + name)
+            flushed = []
+            
+            def on_flush():
+                shutil.copyfile(path, snapshot)
+                flushed.append(len(list(iter_jsonl(snapshot))))
+            
+            writer = JsonlWriter(path, flush_every=2, on_flush=on_flush)
+            writer.write_all(records[:5])
+            assert flushed == [2, 4]
+            
+            # A crash before close leaves every flushed record readable
+            with JsonlWriter(snapshot, append=True) as resumed:
+                resumed.write(records[5])
+            assert list(iter_jsonl(snapshot)) == records[:4] + records[5:]
+            writer.close()
+            assert flushed == [2, 4, 5]
+            assert list(iter_jsonl(path)) == records[:5]
+        
+        # A record cut off by an interrupted run is dropped before appending
+        path = os.path.join(root, "out.jsonl")
+        with open(path, "rb") as f:
+            data = f.read()
+        assert data.count(b"\n") == len(records) and b"\n " not in data
+        with open(path, "wb") as f:
+            f.write(data[:-10])
+        assert list(iter_jsonl(path)) == records[:-1]
+        with JsonlWriter(path, append=True) as writer:
+            writer.write(records[-1])
+        assert list(iter_jsonl(path)) == records
+        
+        # Appending to an intact compressed file adds a member or stream
+        # without rewriting the file; a cut-off one is repaired first
+        for name in ("out.jsonl.gz", "out.jsonl.xz"):
+            path = os.path.join(root, name)
+            inode = os.stat(path).st_ino
+            with JsonlWriter(path, append=True) as writer:
+                writer.write(records[0])
+            assert os.stat(path).st_ino == inode
+            assert list(iter_jsonl(path)) == records + records[:1]
+            
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path, "wb") as f:
+                f.write(data + data[:len(data) // 2])
+            with JsonlWriter(path, append=True) as writer:
+                writer.write(records[1])
+            assert os.stat(path).st_ino != inode
+            assert list(iter_jsonl(path))[-1] == records[1]
+        
+        # --resume converts only the images missing from the output
+        images = os.path.join(root, "images")
+        os.makedirs(images)
+        for name in ("a.png", "b.png"):
+            with open(os.path.join(images, name), "wb") as f:
+                f.write(_build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))]))
+        output = os.path.join(root, "images.jsonl.gz")
+        assert main([images, "-o", output, "--cpu-workers", "1", "--hash"]) == 0
+        first = list(iter_jsonl(output))
+        assert [record["sha256"] for record in first] == [file_sha256(record["source"]) for record in first]
+        
+        with open(os.path.join(images, "c.png"), "wb") as f:
+            f.write(_build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))]))
+        assert main([images, "-o", output, "--cpu-workers", "1", "--resume"]) == 0
+        resumed = list(iter_jsonl(output))
+        assert resumed[:2] == first
+        assert [os.path.basename(record["source"]) for record in resumed] == ["a.png", "b.png", "c.png"]
+        assert read_jsonl_sources(output) == {record["source"] for record in resumed}
+    finally:
+        shutil.rmtree(root)
+
+
+def test_manifest():
+    """Test incremental conversion runs with the SQLite manifest"""
+    
+    import shutil
+    import time
+    from nodes.jsonl_store import file_sha256, iter_jsonl, iter_jsonl_latest
+    from nodes.manifest import Manifest
+    from nodes.pipeline import main
+    
+    print("\n\nTesting manifest...")
+    
+    root = tempfile.mkdtemp()
+    try:
+        images = os.path.join(root, "images")
+        os.makedirs(images)
+        png = _build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))])
+        for name in ("a.png", "b.png"):
+            with open(os.path.join(images, name), "wb") as f:
+                f.write(png)
+        with open(os.path.join(images, "empty.png"), "wb") as f:
+            f.write(_build_png([]))
+        with open(os.path.join(images, "broken.png"), "wb") as f:
+            f.write(b"not a png")
+        
+        manifest_path = os.path.join(root, "manifest.sqlite")
+        output = os.path.join(root, "out.jsonl")
+        args = [images, "-o", output, "--cpu-workers", "1", "--manifest", manifest_path]
+        
+        def sources():
+            return [os.path.basename(record["source"]) for record in iter_jsonl(output)]
+        
+        assert main(args) == 0
+        assert sources() == ["a.png", "b.png", "broken.png", "empty.png"]
+        with Manifest(manifest_path) as manifest:
+            assert manifest.counts() == {"converted": 2, "failed": 1, "no_metadata": 1}
+            row = manifest.get(os.path.join(images, "a.png"))
+            assert row["sha256"] == file_sha256(os.path.join(images, "a.png"))
+            assert row["output"] == output and row["size"] == len(png)
+        
+        # Unchanged images are skipped, failures are retried
+        assert main(args) == 0
+        assert sources() == ["a.png", "b.png", "broken.png", "empty.png", "broken.png"]
+        assert main(args + ["--no-retry-failed"]) == 0
+        assert len(sources()) == 5
+        
+        # A touched image keeps its content and is skipped; its new mtime is
+        # recorded, so the next run does not hash it again
+        a_path = os.path.join(images, "a.png")
+        stat = os.stat(a_path)
+        os.utime(a_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert main(args + ["--no-retry-failed"]) == 0
+        assert len(sources()) == 5
+        with Manifest(manifest_path) as manifest:
+            assert manifest.get(a_path)["mtime_ns"] == stat.st_mtime_ns + 10 ** 9
+        
+        # New and modified images are converted again, even at the same size
+        with open(os.path.join(images, "c.png"), "wb") as f:
+            f.write(png)
+        parameters = TEST_PARAMETERS.replace("Seed: 1234567890", "Seed: 9876543210")
+        modified = _build_png([_png_chunk(b'tEXt', b'parameters\x00' + parameters.encode("utf-8"))])
+        assert len(modified) == len(png)
+        with open(a_path, "wb") as f:
+            f.write(modified)
+        os.utime(a_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        assert main(args + ["--no-retry-failed"]) == 0
+        assert sources()[5:] == ["a.png", "c.png"]
+        
+        # Records of reconverted images are marked, and the last one of each source wins
+        records = list(iter_jsonl(output))
+        assert [record.get("updated", False) for record in records] == [False] * 4 + [True, True, False]
+        latest = list(iter_jsonl_latest(output))
+        assert [os.path.basename(record["source"]) for record in latest] == ["b.png", "empty.png", "broken.png",
+                                                                             "a.png", "c.png"]
+        assert latest[3] == records[5] and latest[3]["workflow"] != records[0]["workflow"]
+        
+        # With --format files the manifest records each workflow file
+        output_dir = os.path.join(root, "workflows")
+        files_manifest = os.path.join(root, "files.sqlite")
+        assert main([images, "-o", output_dir, "--format", "files", "--cpu-workers", "1",
+                     "--manifest", files_manifest]) == 0
+        with Manifest(files_manifest) as manifest:
+            row = manifest.get(os.path.join(images, "c.png"))
+            assert row["output"] == os.path.join(output_dir, "c.json")
+            assert os.path.exists(row["output"])
+            assert manifest.get(os.path.join(images, "empty.png"))["output"] is None
+    finally:
+        shutil.rmtree(root)
+
+
+def test_model_index():
+    """Test resolving checkpoints by Model hash and name through the hash cache"""
+    
+    import hashlib
+    import pickle
+    import shutil
+    from nodes.model_index import ModelIndex, file_hashes, set_model_index
+    from nodes.pipeline import convert_images
+    
+    print("\n\nTesting model index...")
+    
+    root = tempfile.mkdtemp()
+    try:
+        models = os.path.join(root, "checkpoints")
+        os.makedirs(os.path.join(models, "SDXL"))
+        checkpoint = os.path.join(models, "SDXL", "sd_xl_base_1.0.safetensors")
+        data = os.urandom(0x120000)
+        with open(checkpoint, "wb") as f:
+            f.write(data)
+        with open(os.path.join(models, "other.ckpt"), "wb") as f:
+            f.write(b"small")
+        with open(os.path.join(models, "notes.txt"), "w") as f:
+            f.write("not a model")
+        
+        # A link back up the tree does not make the scan loop
+        os.symlink(models, os.path.join(models, "SDXL", "parent"))
+        
+        sha256 = hashlib.sha256(data).hexdigest()
+        autov1 = hashlib.sha256(data[0x100000:0x110000]).hexdigest()[:8]
+        assert file_hashes(checkpoint) == (sha256, autov1, None)
+        
+        cache_path = os.path.join(root, "hashes.sqlite")
+        index = ModelIndex([models])
+        assert index.scan() == 2
+        assert sorted(index.files) == [os.path.join("SDXL", "sd_xl_base_1.0.safetensors"), "other.ckpt"]
+        assert index.hash_files(cache_path) == 2
+        
+        name = os.path.join("SDXL", "sd_xl_base_1.0.safetensors")
+        for model_hash in (sha256, sha256[:10].upper(), autov1):
+            assert index.resolve(model_hash) == name
+        for model_name in ("sd_xl_base_1.0", "SD_XL_BASE_1.0.safetensors", "SDXL/sd_xl_base_1.0", "other"):
+            assert index.resolve(name=model_name) is not None
+        assert index.resolve("0123456789", "missing") is None
+        # A hash match wins over the name
+        assert index.resolve(sha256[:10], "other") == name
+        
+        # Unchanged files come from the cache, modified ones are hashed again
+        cached = ModelIndex([models])
+        cached.scan()
+        assert cached.hash_files(cache_path) == 0 and cached.resolve(autov1) == name
+        with open(os.path.join(models, "other.ckpt"), "ab") as f:
+            f.write(b"!")
+        rescanned = pickle.loads(pickle.dumps(cached))
+        assert rescanned.hash_files(cache_path) == 1 and rescanned.resolve(autov1) == name
+        
+        # A cache that can't be created leaves the hashes in memory
+        unwritable = ModelIndex([models])
+        unwritable.scan()
+        assert unwritable.hash_files(os.path.join(models, "notes.txt", "hashes.sqlite")) == 2
+        assert unwritable.resolve(autov1) == name
+        
+        image_dir = os.path.join(root, "images")
+        os.makedirs(image_dir)
+        metadata = TEST_PARAMETERS.replace("Model: sd_xl_base_1.0", f"Model hash: {sha256[:10]}, Model: renamed")
+        with open(os.path.join(image_dir, "a.png"), "wb") as f:
+            f.write(_build_png([_png_chunk(b'tEXt', b'parameters\x00' + metadata.encode("utf-8"))]))
+        
+        set_model_index("checkpoints", index)
+        try:
+            for cpu_workers in (1, 2):
+                result = next(convert_images([os.path.join(image_dir, "a.png")], cpu_workers=cpu_workers))
+                assert result["workflow"]["4"]["inputs"]["ckpt_name"] == name
+            result = next(convert_images([os.path.join(image_dir, "a.png")], cpu_workers=1, model_name="x.safetensors"))
+            assert result["workflow"]["4"]["inputs"]["ckpt_name"] == "x.safetensors"
+            
+            # The generator node's default model_name leaves the checkpoint to the index
+            from nodes.metadata_parser import MetadataParserNode
+            from nodes.workflow_generator import WorkflowGeneratorNode
+            default_model = WorkflowGeneratorNode.INPUT_TYPES()["optional"]["model_name"][1]["default"]
+            parsed = MetadataParserNode().parse_metadata(metadata)[8]
+            workflow = WorkflowGeneratorNode().generate_workflow(parsed, default_model)[1]
+            assert workflow["4"]["inputs"]["ckpt_name"] == name
+        finally:
+            set_model_index("checkpoints", None)
+        
+        # Without an index the parsed name is used as is
+        result = next(convert_images([os.path.join(image_dir, "a.png")], cpu_workers=1))
+        assert result["workflow"]["4"]["inputs"]["ckpt_name"] == "renamed"
+    finally:
+        shutil.rmtree(root)
+
+
+def test_lora_index():
+    """Test resolving LoRAs by Lora hashes and embeddings by TI hashes"""
+    
+    import hashlib
+    import json
+    import shutil
+    from nodes.metadata_parser import MetadataParserNode
+    from nodes.model_index import HashCache, ModelIndex, file_hashes, set_model_index
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    
+    print("\n\nTesting LoRA index...")
+    
+    root = tempfile.mkdtemp()
+    try:
+        loras = os.path.join(root, "loras")
+        embeddings = os.path.join(root, "embeddings")
+        os.makedirs(os.path.join(loras, "styles"))
+        os.makedirs(embeddings)
+        
+        # A safetensors file: header length, JSON header, tensor data
+        header = json.dumps({"__metadata__": {"ss_output_name": "anime"}}).encode("utf-8")
+        tensors = os.urandom(4096)
+        lora = os.path.join(loras, "styles", "anime_v2.safetensors")
+        with open(lora, "wb") as f:
+            f.write(len(header).to_bytes(8, "little") + header + tensors)
+        with open(os.path.join(loras, "add-detail.safetensors"), "wb") as f:
+            f.write((2).to_bytes(8, "little") + b"{}" + b"detail")
+        embedding = os.path.join(embeddings, "easynegative.pt")
+        with open(embedding, "wb") as f:
+            f.write(b"embedding")
+        
+        addnet = hashlib.sha256(tensors).hexdigest()
+        ti_hash = hashlib.sha256(b"embedding").hexdigest()[:12]
+        assert file_hashes(lora, addnet=True)[2] == addnet
+        assert file_hashes(embedding, addnet=True)[2] is None
+        
+        cache_path = os.path.join(root, "hashes.sqlite")
+        lora_index = ModelIndex([loras], addnet_hashes=True)
+        lora_index.scan()
+        assert lora_index.hash_files(cache_path) == 2
+        embedding_index = ModelIndex([embeddings])
+        embedding_index.scan()
+        embedding_index.hash_files(cache_path)
+        
+        lora_name = os.path.join("styles", "anime_v2.safetensors")
+        assert lora_index.resolve(addnet[:12]) == lora_name
+        # Letters and digits of the name are enough
+        assert lora_index.resolve(name="Add Detail") == "add-detail.safetensors"
+        
+        # Hashes cached without addnet are computed again for a LoRA index
+        with HashCache(cache_path) as cache:
+            stat = os.stat(lora)
+            cache.put(lora, stat.st_size, stat.st_mtime_ns, "0" * 64, "00000000")
+        cached = ModelIndex([loras], addnet_hashes=True)
+        cached.scan()
+        assert cached.hash_files(cache_path) == 1 and cached.resolve(addnet[:12]) == lora_name
+        
+        text = (
+            "1girl, <lora:renamed_anime:0.8>, <lora:Add_Detail:0.5>\n"
+            "Negative prompt: easynegative, (EasyNegative:1.2), easynegative_v2\n"
+            "Steps: 20, Sampler: Euler a, CFG scale: 7, Seed: 1, Size: 512x512, "
+            f'Lora hashes: "renamed_anime: {addnet[:12]}", TI hashes: "easynegative: {ti_hash}"'
+        )
+        parsed = MetadataParserNode()._parse_text(text)
+        assert parsed["lora_hashes"] == {"renamed_anime": addnet[:12]}
+        assert parsed["ti_hashes"] == {"easynegative": ti_hash}
+        
+        generator = WorkflowGeneratorNode()
+        set_model_index("loras", lora_index)
+        set_model_index("embeddings", embedding_index)
+        try:
+            workflow = generator.build_workflow(parsed, workflow_template="basic")
+            loaders = [node for node in workflow.values() if node["class_type"] == "LoraLoader"]
+            assert [node["inputs"]["lora_name"] for node in loaders] == [lora_name, "add-detail.safetensors"]
+            assert loaders[0]["_meta"]["title"] == "Load LoRA - renamed_anime"
+            negative = [node["inputs"]["text"] for node in workflow.values()
+                        if node["class_type"] == "CLIPTextEncode" and "easynegative" in node["inputs"]["text"].lower()]
+            assert negative == ["embedding:easynegative.pt, (embedding:easynegative.pt:1.2), easynegative_v2"]
+            
+            # Civitai "Hashes" entries resolve the same way
+            civitai = {"loras": parsed["loras"][:1], "hashes": {"LORA:renamed_anime": addnet[:10]}}
+            workflow = generator.build_workflow(civitai, workflow_template="basic")
+            assert any(node["inputs"].get("lora_name") == lora_name for node in workflow.values())
+        finally:
+            set_model_index("loras", None)
+            set_model_index("embeddings", None)
+        
+        # Without an index the tag names are used as is
+        workflow = generator.build_workflow(parsed, workflow_template="basic")
+        assert any(node["inputs"].get("lora_name") == "renamed_anime" for node in workflow.values())
+    finally:
+        shutil.rmtree(root)
+
+
+def test_comfyui_model_index():
+    """Test that ComfyUI's model folders are indexed on the first lookup, not before"""
+    
+    import shutil
+    import threading
+    import types
+    from nodes import model_index
+    from nodes.model_index import get_model_index, resolve_checkpoint, set_model_index
+    
+    print("\n\nTesting ComfyUI model index...")
+    
+    root = tempfile.mkdtemp()
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.get_folder_paths = lambda kind: [os.path.join(root, kind)]
+    folder_paths.get_user_directory = lambda: os.path.join(root, "user")
+    sys.modules["folder_paths"] = folder_paths
+    model_index._comfyui_indexed = False
+    try:
+        os.makedirs(os.path.join(root, "checkpoints"))
+        os.makedirs(os.path.join(root, "user"))
+        with open(os.path.join(root, "checkpoints", "dreamshaper_8.safetensors"), "wb") as f:
+            f.write(b"checkpoint")
+        
+        assert get_model_index("checkpoints") is None
+        assert resolve_checkpoint({"model": "DreamShaper 8"}) == "dreamshaper_8.safetensors"
+        assert len(get_model_index("checkpoints")) == 1
+        
+        # Later lookups reuse the index
+        assert not model_index.index_comfyui_models()
+        for thread in threading.enumerate():
+            if thread.name == "metadata2workflow-model-index":
+                thread.join()
+        # Hashes are cached in ComfyUI's user directory
+        assert os.path.exists(os.path.join(root, "user", "metadata2workflow", "model_hashes.sqlite"))
+    finally:
+        del sys.modules["folder_paths"]
+        set_model_index("checkpoints", None)
+        shutil.rmtree(root)
+
+
+def test_convert_paths_async():
+    """Test the asyncio conversion API"""
+    
+    import asyncio
+    import shutil
+    from nodes.async_pipeline import convert_directory_async, convert_paths
+    from nodes.pipeline import convert_directory
+    
+    print("\n\nTesting asyncio conversion...")
+    
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, "sub"))
+        with open(os.path.join(root, "a.png"), "wb") as f:
+            f.write(_build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))]))
+        with open(os.path.join(root, "sub", "b.jpg"), "wb") as f:
+            user_comment = b'UNICODE\x00' + TEST_PARAMETERS.encode("utf-16-be")
+            f.write(_build_jpeg([(0xE1, b'Exif\x00\x00' + _build_exif(user_comment))]))
+        with open(os.path.join(root, "sub", "empty.png"), "wb") as f:
+            f.write(_build_png([]))
+        
+        expected = list(convert_directory(root, cpu_workers=1))
+        paths = [result["source"] for result in expected]
+        
+        async def collect(results):
+            return [result async for result in results]
+        
+        results = asyncio.run(collect(convert_directory_async(root, cpu_workers=1, concurrency=2, ordered=True)))
+        print(f"Results: {[(os.path.basename(r['source']), r.get('error')) for r in results]}")
+        assert results == expected
+        
+        results = asyncio.run(collect(convert_paths(reversed(paths), cpu_workers=2, concurrency=1)))
+        assert results == expected[::-1]
+        
+        async def async_paths():
+            for path in paths:
+                yield path
+        
+        results = asyncio.run(collect(convert_paths(async_paths(), cpu_workers=1)))
+        assert sorted(results, key=lambda r: r["source"]) == sorted(expected, key=lambda r: r["source"])
+        
+        # Stopping early cancels the rest
+        async def first():
+            results = convert_paths(paths * 10, cpu_workers=1, concurrency=4)
+            result = await results.__anext__()
+            await results.aclose()
+            return result
+        
+        assert asyncio.run(first())["source"] in paths
+        
+        try:
+            asyncio.run(collect(convert_paths(paths, concurrency=0)))
+            assert False, "concurrency=0 should be rejected"
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(root)
+
+
+def test_server_conversion():
+    """Test the request handling behind the REST endpoint"""
+    
+    import asyncio
+    import base64
+    from nodes.image_metadata import extract_image_parameters
+    from nodes.server_routes import (BATCH_SIZE, TooManyItemsError, convert_items, parse_request_items,
+                                     register_routes)
+    
+    print("\n\nTesting server conversion...")
+    
+    png = _build_png([_png_chunk(b'tEXt', b'parameters\x00' + TEST_PARAMETERS.encode("utf-8"))])
+    jpeg = _build_jpeg([(0xE1, b'Exif\x00\x00' + _build_exif(b'ASCII\x00\x00\x00' + TEST_PARAMETERS.encode("ascii")))])
+    assert extract_image_parameters(png) == TEST_PARAMETERS
+    assert extract_image_parameters(bytearray(jpeg)) == TEST_PARAMETERS
+    
+    encoded = base64.b64encode(png).decode("ascii")
+    items, options = parse_request_items({
+        "items": [TEST_PARAMETERS, {"image": "data:image/png;base64," + encoded, "name": "a.png"},
+                  {"image": base64.b64encode(_build_png([])).decode("ascii")}],
+        "template": "advanced",
+    })
+    assert [item["source"] for item in items] == ["item-0", "a.png", "item-2"]
+    assert options == {"template": "advanced"}
+    
+    results = asyncio.run(convert_items(items * BATCH_SIZE, **options))
+    assert len(results) == 3 * BATCH_SIZE
+    assert [result["source"] for result in results[:3]] == ["item-0", "a.png", "item-2"]
+    assert results[0]["workflow"] == results[1]["workflow"]
+    assert results[0]["workflow"]["3"]["inputs"]["seed"] == 1234567890
+    assert results[2]["error"] == "No metadata found"
+    
+    for payload in ({}, {"image": "not base64!"}, {"items": [1]}, {"text": "x", "template": "missing"}, []):
+        try:
+            parse_request_items(payload)
+        except ValueError as e:
+            print(f"  rejected: {e}")
+        else:
+            raise AssertionError(f"Invalid request was accepted: {payload}")
+    try:
+        parse_request_items({"items": ["x"] * 1001})
+    except TooManyItemsError:
+        pass
+    else:
+        raise AssertionError("Oversized request was accepted")
+    
+    # Outside ComfyUI there is no PromptServer to register on
+    assert register_routes() is False
+
+
+if __name__ == "__main__":
+    print("ComfyUI Metadata2Workflow Plugin - Image Metadata Tests")
+    print("=" * 60)
+    
+    try:
+        test_png_text_chunks()
+        test_png_invalid_files()
+        test_user_comment_encodings()
+        test_jpeg_parameters()
+        test_webp_parameters()
+        test_png_json_metadata()
+        test_embedded_workflow()
+        test_convert_directory()
+        test_jsonl_store()
+        test_manifest()
+        test_model_index()
+        test_lora_index()
+        test_comfyui_model_index()
+        test_convert_paths_async()
+        test_server_conversion()
+        
+        print("\n" + "="*60)
+        print("All tests completed successfully!")
+        print("="*60)
+    
+    except Exception as e:
+        print(f"\nTest failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -152,6 +152,473 @@ def test_edge_cases():
         result = parser.parse_metadata(test_case, True)
         print(f"    Case {i+1}: '{test_case}' -> LoRAs: {result[9]}")
 
+def test_network_tag_variants():
+    """Test LyCORIS/hypernetwork tags, split weights and duplicate tags"""
+    
+    parser = MetadataParserNode()
+    
+    print("\n\nTesting extra network tag variants...")
+    
+    prompt = ("<lora:detail:0.8:0.5>, 1girl, <lyco:style:0.6>, <hypernet:anime:0.3>, "
+              "<lora:light:te=0.4:unet=0.9>, <lora:detail:0.8:0.5>, <lora:neg:-0.5>")
+    loras, clean_prompt = parser._extract_loras_from_prompt(prompt)
+    
+    for lora in loras:
+        print(f"  {lora['type']}: {lora['name']} model={lora['strength']} clip={lora['strength_clip']}")
+    
+    assert clean_prompt == "1girl"
+    assert [(l["type"], l["name"], l["strength"], l["strength_clip"]) for l in loras] == [
+        ("lora", "detail", 0.5, 0.8),
+        ("lyco", "style", 0.6, 0.6),
+        ("hypernet", "anime", 0.3, 0.3),
+        ("lora", "light", 0.9, 0.4),
+        ("lora", "neg", -0.5, -0.5),
+    ]
+    
+    # Old forms keep their behavior
+    loras, clean_prompt = parser._extract_loras_from_prompt("a, <lora:x>, b <lora:y:>")
+    assert clean_prompt == "a, b"
+    assert [(l["name"], l["strength"]) for l in loras] == [("x", 1.0), ("y", 1.0)]
+
+def test_keep_unknown_params():
+    """Test that unknown parameters are kept when requested"""
+    
+    parser = MetadataParserNode()
+    
+    test_metadata = """masterpiece, 1girl, <lora:style_anime:0.7>
+Negative prompt: ugly, blurry
+Steps: 28, Sampler: DPM++ 2M, CFG scale: 6.5, Seed: 42, Size: 832x1216, Hires upscale: 1.5, Hires upscaler: 4x-UltraSharp, Lora hashes: "style_anime: 0123abcd, other: 4567ef01", Version: v1.7.0"""
+    
+    print("\n\nTesting unknown parameter retention...")
+    
+    # Default mode drops unknown keys
+    result = parser.parse_metadata(test_metadata, True)
+    assert "extra_params" not in result[8]
+    
+    result = parser.parse_metadata(test_metadata, True, True)
+    parsed_data = result[8]
+    print(f"Extra params: {parsed_data['extra_params']}")
+    
+    assert parsed_data["positive_prompt"] == "masterpiece, 1girl"
+    assert parsed_data["negative_prompt"] == "ugly, blurry"
+    assert parsed_data["steps"] == 28
+    assert parsed_data["cfg_scale"] == 6.5
+    assert parsed_data["extra_params"] == {
+        "Hires upscale": "1.5",
+        "Hires upscaler": "4x-UltraSharp",
+        "Version": "v1.7.0",
+    }
+    # Hash lists have their own field
+    assert parsed_data["lora_hashes"] == {"style_anime": "0123abcd", "other": "4567ef01"}
+
+def test_lazy_parsed_metadata():
+    """Test on-demand field decoding of ParsedMetadata"""
+    
+    import copy
+    import json
+    import pickle
+    from nodes.metadata_parser import ParsedMetadata, parse_lazy
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    
+    print("\n\nTesting lazy parsed metadata...")
+    
+    text = """Prompt: masterpiece, <lora:style:0.5>, 1girl
+Negative prompt: ugly, blurry
+Steps: 30, Sampler: DPM++ 2M, CFG scale: 6.5, Seed: 42, Model: xl_base, Hires upscale: 1.5"""
+    
+    parsed_data = parse_lazy(text)
+    assert isinstance(parsed_data, ParsedMetadata)
+    assert (parsed_data["seed"], parsed_data["model"]) == (42, "xl_base")
+    # Only the fields read so far are decoded
+    assert set(parsed_data._values) == {"seed", "model", "scheduler", "size"}
+    assert "loras" in parsed_data and "extra_params" not in parsed_data
+    assert parsed_data.get("denoising_strength", 0.7) == 0.7
+    
+    # Same keys, order and values as a plain dict
+    expected = {
+        "positive_prompt": "masterpiece, 1girl",
+        "loras": [{"name": "style", "strength": 0.5, "strength_clip": 0.5, "type": "lora",
+                   "full_tag": "<lora:style:0.5>"}],
+        "negative_prompt": "ugly, blurry",
+        "steps": 30,
+        "cfg_scale": 6.5,
+        "sampler": "DPM++ 2M",
+        "seed": 42,
+        "model": "xl_base",
+        "scheduler": "normal",
+        "size": "512x512",
+    }
+    assert parsed_data == expected and expected == parsed_data
+    assert list(parsed_data) == list(expected) and len(parsed_data) == len(expected)
+    assert json.loads(json.dumps(dict(parsed_data))) == expected
+    assert type(pickle.loads(pickle.dumps(parsed_data))) is dict
+    assert copy.copy(parsed_data) == expected
+    assert parse_lazy(text, keep_unknown=True)["extra_params"] == {"Hires upscale": "1.5"}
+    
+    # Mutable like the dict it replaces
+    parsed_data["seed"] = 7
+    parsed_data["custom"] = True
+    del parsed_data["negative_prompt"]
+    assert parsed_data["seed"] == 7 and parsed_data["custom"] is True
+    assert "negative_prompt" not in parsed_data and list(parsed_data)[-1] == "custom"
+    
+    # The node's DICT output is a plain dict, whether or not it was cached
+    from nodes.parse_cache import configure_parse_cache
+    node_text = text.replace("Seed: 42", "Seed: 43")
+    for _ in range(2):
+        node_data = MetadataParserNode().parse_metadata(node_text)[8]
+        assert type(node_data) is dict and json.loads(json.dumps(node_data))["seed"] == 43
+    try:
+        configure_parse_cache(enabled=False)
+        assert type(MetadataParserNode().parse_metadata(node_text)[8]) is dict
+    finally:
+        configure_parse_cache()
+    
+    # Downstream nodes accept it in place of the dict
+    generator = WorkflowGeneratorNode()
+    lazy_workflow = generator.generate_workflow(parse_lazy(text), "xl.safetensors", "", "basic")[1]
+    assert lazy_workflow == generator.generate_workflow(expected, "xl.safetensors", "", "basic")[1]
+
+
+def test_metrics():
+    """Test stage latency histograms, counters and the Prometheus rendering"""
+    
+    from nodes import metrics
+    from nodes.metadata_parser import parse_lazy
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    
+    print("\n\nTesting metrics...")
+    
+    text = "masterpiece, <lora:style:0.5>\nNegative prompt: ugly\nSteps: 20, Seed: 7"
+    parser = MetadataParserNode()
+    generator = WorkflowGeneratorNode()
+    was_enabled = metrics.enabled
+    try:
+        metrics.reset_metrics()
+        metrics.enable_metrics(False)
+        generator.generate_workflow(parse_lazy(text))
+        assert metrics.snapshot() == {"counters": {}, "histograms": {}}
+        
+        metrics.enable_metrics()
+        parsed_data = parse_lazy(text)
+        generator.generate_workflow(parsed_data, workflow_template="advanced")
+        parser.parse_metadata(b"Steps: 20")
+        generator.build_workflow({"loras": [{"strength": 1.0}]}, workflow_template="basic")
+        
+        data = metrics.snapshot()
+        stages = {labels["stage"]: histogram["count"] for labels, histogram in data["histograms"]["stage_seconds"]}
+        print(f"Stage counts: {stages}")
+        assert stages["section_split"] == 1 and stages["lora_extraction"] == 1
+        assert stages["parameter_extraction"] >= 2
+        assert stages["template_build"] == 1 and stages["serialization"] == 1
+        assert data["counters"]["parses_total"] == [({"format": "a1111"}, 1)]
+        assert data["counters"]["workflows_total"] == [({"template": "advanced"}, 1)]
+        errors = {(labels["stage"], labels["reason"]): value for labels, value in data["counters"]["errors_total"]}
+        assert errors == {("parse", "AttributeError"): 1, ("generate", "KeyError"): 1}
+        
+        text_format = metrics.render_prometheus()
+        assert "# TYPE metadata2workflow_stage_seconds histogram" in text_format
+        assert 'metadata2workflow_stage_seconds_bucket{stage="section_split",le="+Inf"} 1' in text_format
+        assert 'metadata2workflow_template_build_seconds_count{template="advanced"} 1' in text_format
+        assert 'metadata2workflow_errors_total{reason="KeyError",stage="generate"} 1' in text_format
+        
+        # Large and fractional counts keep every digit
+        metrics.increment("parses_total", 1234566, format="a1111")
+        metrics.increment("workflows_total", 0.25, template="advanced")
+        text_format = metrics.render_prometheus()
+        assert 'metadata2workflow_parses_total{format="a1111"} 1234567\n' in text_format
+        assert 'metadata2workflow_workflows_total{template="advanced"} 1.25\n' in text_format
+    finally:
+        metrics.enable_metrics(was_enabled)
+        metrics.reset_metrics()
+
+
+def test_metadata_formats():
+    """Test format sniffing and the JSON metadata parsers"""
+    
+    import json
+    from nodes.metadata_parser import detect_metadata_format
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    
+    print("\n\nTesting metadata formats...")
+    
+    parser = MetadataParserNode()
+    a1111 = """masterpiece, <lora:style_anime:0.8>, 1girl
+Negative prompt: ugly
+Steps: 28, Sampler: DPM++ 2M, Schedule type: Karras, CFG scale: 6.5, Seed: 1234, Size: 832x1216, Model hash: 31e35c80fc, Model: xl_base, Clip skip: 2"""
+    
+    civitai = {
+        "id": 1,
+        "baseModel": "SDXL 1.0",
+        "meta": {
+            "prompt": "masterpiece, <lora:style_anime:0.8>, 1girl",
+            "negativePrompt": "ugly",
+            "cfgScale": 6.5,
+            "steps": 28,
+            "sampler": "DPM++ 2M",
+            "Schedule type": "Karras",
+            "seed": 1234,
+            "Size": "832x1216",
+            "Model": "xl_base",
+            "Model hash": "31e35c80fc",
+            "Clip skip": "2",
+            "Hires upscale": 1.5,
+            "resources": [{"type": "lora", "name": "detail", "weight": 0.4},
+                          {"type": "lora", "name": "style_anime", "weight": 0.8}],
+        },
+    }
+    novelai = {"prompt": "1girl, {{masterpiece}}", "uc": "lowres", "steps": 28, "scale": 5.0, "seed": 42,
+               "sampler": "k_euler_ancestral", "noise_schedule": "karras", "width": 832, "height": 1216,
+               "n_samples": 1}
+    invokeai = {"generation_mode": "txt2img", "positive_prompt": "a castle", "negative_prompt": "blurry",
+                "steps": 30, "cfg_scale": 7.5, "scheduler": "dpmpp_2m_k", "seed": 9, "width": 1024, "height": 768,
+                "model": {"name": "juggernautXL", "base": "sdxl"},
+                "loras": [{"model": {"name": "add_detail"}, "weight": 0.6}]}
+    invokeai_v2 = {"model_weights": "sd-1.5", "image": {"prompt": [{"prompt": "a cat", "weight": 1}],
+                                                        "steps": 20, "cfg_scale": 7, "sampler": "k_euler_a",
+                                                        "seed": 5, "width": 512, "height": 768}}
+    
+    reference = parser._parse_text(a1111)
+    comfyui = WorkflowGeneratorNode().build_workflow(reference, "xl_base.safetensors")
+    
+    assert detect_metadata_format(a1111) == "a1111"
+    assert detect_metadata_format("{red|blue} hair, 1girl\nSteps: 20") == "a1111"
+    assert detect_metadata_format(json.dumps(civitai)) == "civitai"
+    assert detect_metadata_format(json.dumps(comfyui)) == "comfyui"
+    assert detect_metadata_format(json.dumps(novelai)) == "novelai"
+    assert detect_metadata_format(json.dumps(invokeai)) == "invokeai"
+    assert detect_metadata_format(json.dumps(invokeai_v2)) == "invokeai"
+    
+    # Dynamic prompt syntax is still A1111 text
+    assert parser._parse_text("{red|blue} hair\nSteps: 12")["steps"] == 12
+    
+    parsed = parser._parse_text(json.dumps(civitai), keep_unknown=True)
+    print(f"Civitai JSON: {parsed}")
+    for key in ("positive_prompt", "negative_prompt", "steps", "cfg_scale", "sampler", "scheduler", "seed",
+                "size", "model", "model_hash", "clip_skip"):
+        assert parsed[key] == reference[key], key
+    assert parsed["base_model"] == "SDXL 1.0"
+    assert [(lora["name"], lora["strength"]) for lora in parsed["loras"]] == [("style_anime", 0.8), ("detail", 0.4)]
+    assert parsed["extra_params"] == {"Hires upscale": "1.5"}
+    
+    # Regenerating from a ComfyUI prompt gives back the same prompt
+    parsed = parser._parse_text(json.dumps(comfyui))
+    print(f"ComfyUI prompt: {parsed}")
+    assert parsed["positive_prompt"] == reference["positive_prompt"]
+    assert parsed["negative_prompt"] == "ugly" and parsed["size"] == "832x1216"
+    assert (parsed["sampler"], parsed["scheduler"]) == ("dpmpp_2m", "karras")
+    assert parsed["loras"][0]["name"] == "style_anime" and parsed["loras"][0]["strength"] == 0.8
+    assert WorkflowGeneratorNode().build_workflow(parsed, "xl_base.safetensors") == comfyui
+    
+    # 64-bit seeds survive, numeric strings like "20.0" still convert
+    big_seed = 123456789012345678
+    comfyui["3"]["inputs"]["seed"] = big_seed
+    comfyui["3"]["inputs"]["steps"] = "20.0"
+    parsed = parser._parse_text(json.dumps(comfyui))
+    assert parsed["seed"] == big_seed and parsed["steps"] == 20
+    assert parser._parse_text(json.dumps({"prompt": "a cat", "seed": str(big_seed)}))["seed"] == big_seed
+    
+    # SamplerCustomAdvanced keeps its settings in the nodes it links to
+    custom = {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "flux.safetensors"}},
+        "5": {"class_type": "EmptySD3LatentImage", "inputs": {"width": 1024, "height": 768, "batch_size": 1}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a red fox", "clip": ["4", 1]}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["4", 1]}},
+        "10": {"class_type": "CFGGuider", "inputs": {"model": ["4", 0], "positive": ["6", 0],
+                                                     "negative": ["7", 0], "cfg": 3.5}},
+        "11": {"class_type": "RandomNoise", "inputs": {"noise_seed": big_seed}},
+        "12": {"class_type": "KSamplerSelect", "inputs": {"sampler_name": "euler"}},
+        "13": {"class_type": "BasicScheduler", "inputs": {"model": ["4", 0], "scheduler": "simple",
+                                                          "steps": 28, "denoise": 1.0}},
+        "14": {"class_type": "SamplerCustomAdvanced", "inputs": {"noise": ["11", 0], "guider": ["10", 0],
+                                                                 "sampler": ["12", 0], "sigmas": ["13", 0],
+                                                                 "latent_image": ["5", 0]}},
+    }
+    parsed = parser._parse_text(json.dumps(custom))
+    assert (parsed["positive_prompt"], parsed["negative_prompt"]) == ("a red fox", "blurry")
+    assert (parsed["steps"], parsed["cfg_scale"], parsed["seed"]) == (28, 3.5, big_seed)
+    assert (parsed["sampler"], parsed["scheduler"]) == ("euler", "simple")
+    assert (parsed["model"], parsed["size"]) == ("flux.safetensors", "1024x768")
+    
+    # Graphs without a known sampler still give their prompts, model and size
+    del custom["14"]
+    custom["15"] = {"class_type": "SomeCustomSampler", "inputs": {"guider": ["10", 0]}}
+    parsed = parser._parse_text(json.dumps(custom))
+    assert (parsed["positive_prompt"], parsed["negative_prompt"]) == ("a red fox", "blurry")
+    assert (parsed["model"], parsed["size"], parsed["steps"]) == ("flux.safetensors", "1024x768", 20)
+    
+    parsed = parser._parse_text(json.dumps(novelai))
+    assert (parsed["positive_prompt"], parsed["negative_prompt"]) == ("1girl, {{masterpiece}}", "lowres")
+    assert (parsed["steps"], parsed["cfg_scale"], parsed["seed"], parsed["size"]) == (28, 5.0, 42, "832x1216")
+    assert (parsed["sampler"], parsed["scheduler"]) == ("euler_ancestral", "karras")
+    
+    parsed = parser._parse_text(json.dumps(invokeai))
+    assert (parsed["sampler"], parsed["scheduler"], parsed["model"]) == ("dpmpp_2m", "karras", "juggernautXL")
+    assert parsed["loras"][0]["name"] == "add_detail" and parsed["loras"][0]["strength"] == 0.6
+    assert parsed["size"] == "1024x768" and parsed["negative_prompt"] == "blurry"
+    
+    parsed = parser._parse_text(json.dumps(invokeai_v2))
+    assert (parsed["positive_prompt"], parsed["sampler"], parsed["model"]) == ("a cat", "euler_ancestral", "sd-1.5")
+    assert parsed["scheduler"] == "normal" and parsed["negative_prompt"] == ""
+    
+    # The node outputs work the same for every format
+    outputs = parser.parse_metadata(json.dumps(novelai))
+    assert outputs[:8] == ("1girl, {{masterpiece}}", "lowres", 28, 5.0, "euler_ancestral", "karras", 42, "832x1216")
+
+
+def test_parse_many():
+    """Test batch parsing with a process pool"""
+    
+    from nodes.metadata_parser import parse_many
+    
+    print("\n\nTesting batch parsing...")
+    
+    parser = MetadataParserNode()
+    texts = [f"prompt {i}\nNegative prompt: bad\nSteps: {i + 1}, Seed: {i}" for i in range(50)]
+    texts.append(None)  # Invalid item must not stop the batch
+    
+    results = list(parse_many(texts, workers=2, chunksize=8))
+    print(f"Parsed {len(results)} items, last error: {results[-1][2]}")
+    
+    assert [index for index, _, _ in results] == list(range(len(texts)))
+    for index, parsed_data, error in results[:-1]:
+        assert error is None
+        assert parsed_data == parser.parse_metadata(texts[index])[8]
+    assert results[-1][1] is None and results[-1][2]
+    
+    unordered = list(parse_many(texts, workers=2, chunksize=8, ordered=False))
+    assert sorted(index for index, _, _ in unordered) == list(range(len(texts)))
+
+def test_parse_cache():
+    """Test the content-addressed parse cache and its disk tier"""
+    
+    import tempfile
+    from nodes.parse_cache import ParseCache
+    
+    print("\n\nTesting parse cache...")
+    
+    parser = MetadataParserNode()
+    calls = []
+    
+    def counting_parse(text, keep_unknown):
+        calls.append(text)
+        return parser._parse_civitai_metadata(text, keep_unknown)
+    
+    text = "masterpiece, <lora:style:0.5>\nNegative prompt: ugly\nSteps: 20, Seed: 7"
+    cache = ParseCache(max_bytes=4096)
+    
+    first = cache.get_or_parse(text, False, counting_parse)
+    first["steps"] = 999  # Callers may modify their copy
+    second = cache.get_or_parse("  " + text + "\n", False, counting_parse)
+    assert len(calls) == 1
+    # A miss returns the same plain dict type as a hit
+    assert type(first) is dict and type(second) is dict
+    assert second == parser._parse_civitai_metadata(text)
+    
+    # keep_unknown results are cached separately
+    cache.get_or_parse(text, True, counting_parse)
+    assert len(calls) == 2
+    
+    stats = cache.stats()
+    print(f"Cache stats: {stats}")
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["bytes"] <= 4096
+    
+    # Size limit evicts least recently used entries
+    for i in range(100):
+        cache.get_or_parse(f"prompt {i}\nSteps: {i}", False, counting_parse)
+    assert cache.stats()["bytes"] <= 4096
+    assert cache.stats()["evictions"] > 0
+    
+    # The disk tier survives a new cache instance
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk_path = os.path.join(tmp_dir, "cache.sqlite")
+        disk_cache = ParseCache(disk_path=disk_path)
+        disk_cache.get_or_parse(text, False, counting_parse)
+        disk_cache.close()
+        
+        calls.clear()
+        reopened = ParseCache(disk_path=disk_path)
+        assert reopened.get_or_parse(text, False, counting_parse) == second
+        assert calls == []
+        assert reopened.stats()["disk_hits"] == 1
+        reopened.close()
+        
+        # Disk hits are recorded without a commit and still count for eviction
+        import sqlite3
+        import time
+        lru_path = os.path.join(tmp_dir, "lru.sqlite")
+        writer = ParseCache(disk_path=lru_path)
+        for i in range(3):
+            writer.get_or_parse(f"prompt {i}\nSteps: {i}", False, counting_parse)
+        row_size = writer.stats()["disk_bytes"] // 3
+        writer.close()
+        time.sleep(0.01)
+        
+        reader = ParseCache(max_bytes=0, disk_path=lru_path, max_disk_bytes=row_size * 3)
+        assert reader.get(reader.key_for("prompt 0\nSteps: 0"))["steps"] == 0
+        with sqlite3.connect(lru_path) as other:
+            oldest = other.execute("SELECT key FROM parse_cache ORDER BY last_used LIMIT 1").fetchone()[0]
+        assert oldest == reader.key_for("prompt 0\nSteps: 0")
+        reader.get_or_parse("prompt 3\nSteps: 3", False, counting_parse)
+        assert reader.get(reader.key_for("prompt 0\nSteps: 0")) is not None
+        assert reader.get(reader.key_for("prompt 1\nSteps: 1")) is None
+        reader.close()
+
+def test_register_parameter():
+    """Test extending the parser with custom parameters"""
+    
+    from nodes import metadata_parser
+    
+    print("\n\nTesting parameter registration...")
+    
+    parser = MetadataParserNode()
+    test_metadata = """1girl
+Negative prompt: ugly
+Steps: 30, Sampler: Euler a, Hires upscale: 1.5, Hires steps: 12, ADetailer model: face_yolov8n.pt"""
+    
+    # Cached before registration, must not be served afterwards
+    assert "hires_upscale" not in parser.parse_metadata(test_metadata)[8]
+    
+    original_registry = metadata_parser._REGISTRY
+    try:
+        metadata_parser.register_parameter("hires_upscale", "Hires upscale", r'\s*([\d.]+)', float)
+        metadata_parser.register_parameter("hires_steps", "Hires steps", r'\s*(\d+)', int)
+        metadata_parser.register_parameter("adetailer_model", "ADetailer model")
+        
+        parsed_data = parser._parse_civitai_metadata(test_metadata, keep_unknown=True)
+        print(f"Parsed with custom parameters: {parsed_data}")
+        
+        assert parsed_data["hires_upscale"] == 1.5
+        assert parsed_data["hires_steps"] == 12
+        assert parsed_data["steps"] == 30
+        assert parsed_data["adetailer_model"] == "face_yolov8n.pt"
+        # Registered parameters are no longer reported as unknown
+        assert parsed_data["extra_params"] == {}
+        assert parser.parse_metadata(test_metadata)[8]["hires_upscale"] == 1.5
+        
+        # Lambdas share a __qualname__, yet each one gets its own cache entries
+        metadata_parser.register_parameter("hires_steps", "Hires steps", r'\s*(\d+)', lambda value: int(value) * 2)
+        assert parser.parse_metadata(test_metadata)[8]["hires_steps"] == 24
+        metadata_parser.register_parameter("hires_steps", "Hires steps", r'\s*(\d+)', lambda value: int(value) * 3)
+        assert parser.parse_metadata(test_metadata)[8]["hires_steps"] == 36
+        
+        # Values that JSON can't hold are returned, just not cached
+        from decimal import Decimal
+        metadata_parser.register_parameter("hires_upscale", "Hires upscale", r'\s*([\d.]+)', Decimal)
+        for _ in range(2):
+            assert parser.parse_metadata(test_metadata)[8]["hires_upscale"] == Decimal("1.5")
+        
+        try:
+            metadata_parser.register_parameter("bad", "Bad", r'\s*\d+')
+            assert False, "Expected ValueError for a pattern without a group"
+        except ValueError as e:
+            print(f"Rejected pattern: {e}")
+    finally:
+        metadata_parser._REGISTRY = original_registry
+    
+    assert "hires_upscale" not in parser._parse_civitai_metadata(test_metadata)
+
 def test_workflow_generator():
     """Test workflow generation with LoRA support"""
     
@@ -230,11 +697,339 @@ Steps: 25, Sampler: DPM++ 2M, CFG scale: 7.5, Seed: 98765, Size: 1024x1024"""
                 print(f"    CLIP Strength: {inputs.get('strength_clip')}")
                 print(f"    Model Input: {inputs.get('model')}")
                 print(f"    CLIP Input: {inputs.get('clip')}")
-        
+    
     except json.JSONDecodeError as e:
         print(f"Error parsing workflow JSON: {e}")
         print(f"Raw workflow: {workflow_result[0][:200]}...")
 
+def test_workflow_output_formats():
+    """Test the dict output and the compact JSON option of the workflow generator"""
+    
+    import json
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    
+    print("\n\n3. Testing workflow output formats...")
+    
+    generator = WorkflowGeneratorNode()
+    parser = MetadataParserNode()
+    parsed_data = parser.parse_metadata("""1girl, <lora:style_anime:0.7>
+Negative prompt: ugly
+Steps: 20, Sampler: Euler a, CFG scale: 7, Seed: 1, Size: 512x768""", True)[8]
+    
+    pretty_json, workflow = generator.generate_workflow(parsed_data, "model.safetensors", "", "basic")
+    compact_json, compact_workflow = generator.generate_workflow(parsed_data, "model.safetensors", "", "basic", "compact")
+    
+    print(f"  pretty: {len(pretty_json)} bytes, compact: {len(compact_json)} bytes")
+    
+    assert isinstance(workflow, dict)
+    assert json.loads(pretty_json) == workflow
+    assert json.loads(compact_json) == compact_workflow == workflow
+    assert "\n" not in compact_json and len(compact_json) < len(pretty_json)
+    assert generator.build_workflow(parsed_data, "model.safetensors", "", "basic") == workflow
+
+def test_workflow_templates():
+    """Test compiled templates and templates registered from JSON files"""
+    
+    import json
+    import tempfile
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    from nodes.workflow_templates import load_workflow_template, workflow_template_names
+    
+    print("\n\n4. Testing workflow templates...")
+    
+    generator = WorkflowGeneratorNode()
+    parsed_data = {"positive_prompt": "1girl", "negative_prompt": "ugly", "steps": 30, "seed": 7,
+                   "loras": [{"name": "style", "strength": 0.5, "strength_clip": 0.5, "type": "lora"}]}
+    
+    # Instances never share mutable parts of the skeleton
+    first = generator.build_workflow(parsed_data, "model.safetensors", "", "advanced")
+    first["3"]["inputs"]["positive"][0] = "changed"
+    first["12"]["_meta"]["title"] = "changed"
+    second = generator.build_workflow(parsed_data, "model.safetensors", "", "advanced")
+    assert second["3"]["inputs"]["positive"] == ["6", 0]
+    assert second["12"]["_meta"]["title"] == "KSampler (Upscale)"
+    assert second["12"]["inputs"]["steps"] == 15
+    assert second["12"]["inputs"]["model"] == second["3"]["inputs"]["model"]
+    assert second[second["12"]["inputs"]["model"][0]]["class_type"] == "LoraLoader"
+    
+    template = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": {"$slot": "ckpt_name"}}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": {"$slot": "positive_prompt"}, "clip": {"$link": "clip"}}},
+        "3": {"class_type": "SamplerCustom", "inputs": {
+            "model": {"$link": "model"},
+            "positive": ["2", 0],
+            "noise_seed": {"$slot": "seed"},
+            "eta": {"$slot": "eta", "default": 0.25},
+            "sigmas": [1.0, 0.5],
+        }},
+    }
+    with tempfile.NamedTemporaryFile("w", suffix=".json", prefix="custom_", delete=False) as f:
+        json.dump(template, f)
+    try:
+        name = load_workflow_template(f.name).name
+    finally:
+        os.unlink(f.name)
+    
+    assert name in workflow_template_names()
+    workflow = json.loads(generator.generate_workflow(parsed_data, "model.safetensors", "", name)[0])
+    print(f"  {name}: {sorted(workflow)}")
+    
+    assert workflow["1"]["inputs"]["ckpt_name"] == "model.safetensors"
+    assert workflow["3"]["inputs"]["eta"] == 0.25
+    assert workflow["3"]["inputs"]["sigmas"] == [1.0, 0.5]
+    assert workflow["3"]["inputs"]["noise_seed"] == 7
+    # The LoRA loader gets the first ID past the template's nodes
+    assert workflow["4"]["inputs"]["model"] == ["1", 0]
+    assert workflow["3"]["inputs"]["model"] == ["4", 0]
+    assert workflow["2"]["inputs"]["clip"] == ["4", 1]
+    
+    # Template values are data: strings that look like code stay strings, and
+    # changing the registered dict afterwards does not reach the skeleton
+    from nodes.workflow_templates import CompiledTemplate, register_workflow_template
+    code_like = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "__import__('os').getcwd()"},
+              "_meta": {"title": "'}, __import__('os'), {'"}},
+        "2": {"class_type": "EmptyLatentImage", "inputs": {"width": {"$slot": "a'] + _values['b"}}},
+    }
+    compiled = CompiledTemplate("code_like", code_like)
+    code_like["1"]["inputs"]["ckpt_name"] = "changed"
+    workflow = compiled.instantiate({"a'] + _values['b": 512}, {})
+    assert workflow["1"]["inputs"]["ckpt_name"] == "__import__('os').getcwd()"
+    assert workflow["1"]["_meta"]["title"] == "'}, __import__('os'), {'"
+    assert workflow["2"]["inputs"]["width"] == 512
+    
+    # Broken templates are rejected when they are registered
+    for broken in ({}, {"1": {"inputs": {}}}, {"1": {"class_type": "X", "inputs": {"a": ["9", 0]}}},
+                   {"1": {"class_type": "X", "inputs": {"model": {"$link": "model"}}}},
+                   {"1": {"class_type": "EmptyLatentImage", "inputs": {}},
+                    "2": {"class_type": "VAEDecode", "inputs": {"samples": ["1", 0], "vae": ["1", 0]}}}):
+        try:
+            register_workflow_template("broken", broken)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Template was accepted: {broken}")
+    assert "broken" not in workflow_template_names()
+
+def test_workflow_graph():
+    """Test node ID allocation and link validation of the graph builder"""
+    
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    from nodes.workflow_graph import WorkflowGraph
+    
+    print("\n\n5. Testing workflow graph builder...")
+    
+    generator = WorkflowGeneratorNode()
+    loras = [{"name": f"lora_{i}", "strength": 0.5, "strength_clip": 0.5, "type": "hypernet" if i % 10 == 0 else "lora"}
+             for i in range(150)]
+    parsed_data = {"positive_prompt": "1girl", "loras": loras}
+    
+    for template in ("basic", "advanced", "img2img"):
+        workflow = generator.build_workflow(parsed_data, "model.safetensors", "vae.safetensors", template)
+        print(f"  {template}: {len(workflow)} nodes")
+        
+        assert "error" not in workflow
+        assert len(workflow) == len(set(workflow))
+        
+        # Walk the model chain back from the sampler to the checkpoint
+        chain = []
+        node_id = workflow["3"]["inputs"]["model"][0]
+        while workflow[node_id]["class_type"] != "CheckpointLoaderSimple":
+            chain.append(workflow[node_id]["inputs"].get("lora_name") or workflow[node_id]["inputs"]["hypernetwork_name"])
+            node_id = workflow[node_id]["inputs"]["model"][0]
+        assert chain[::-1] == [lora["name"] for lora in loras]
+        
+        # Every template links its VAE inputs to the loaded VAE
+        vae_node = workflow[workflow["8"]["inputs"]["vae"][0]]
+        assert vae_node["class_type"] == "VAELoader" and vae_node["inputs"]["vae_name"] == "vae.safetensors"
+    
+    graph = WorkflowGraph({"4": "CheckpointLoaderSimple", "x": "CustomNode"})
+    lora_id = graph.add_node("LoraLoader", {"lora_name": "a"}, {"model": graph.output("4", 0), "clip": graph.output("4", 1)})
+    assert lora_id == "5"
+    assert graph.nodes["5"]["inputs"] == {"lora_name": "a", "model": ["4", 0], "clip": ["4", 1]}
+    assert graph.add_node("CustomNode", links={"anything": graph.output("x", 3)}) == "6"
+    
+    for class_type, links in (
+        ("LoraLoader", {"model": graph.output("4", 1)}),       # CLIP into MODEL
+        ("VAEDecode", {"vae": ["missing", 0]}),                 # unknown node
+        ("VAEDecode", {"vae": ["4", 5]}),                       # no such output
+        ("VAEDecode", {"vae": "4"}),                            # not a link
+    ):
+        try:
+            graph.add_node(class_type, {}, links)
+        except ValueError as e:
+            print(f"  rejected: {e}")
+        else:
+            raise AssertionError(f"Invalid link was accepted: {links}")
+    
+    try:
+        graph.add_node("VAELoader", node_id="5")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Duplicate node ID was accepted")
+
+
+def test_sampler_resolution():
+    """Test mapping of A1111 sampler and schedule type names to ComfyUI"""
+    
+    from nodes.samplers import COMFYUI_SAMPLERS, resolve_sampler
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    
+    print("\n\nTesting sampler resolution...")
+    
+    cases = [
+        (("DPM++ 2M Karras", "normal"), ("dpmpp_2m", "karras")),
+        (("DPM++ 2M", "Karras"), ("dpmpp_2m", "karras")),
+        (("dpm++  2m karras", None), ("dpmpp_2m", "karras")),
+        (("DPM++ 2M SDE Exponential", "normal"), ("dpmpp_2m_sde", "exponential")),
+        (("DPM++ SDE Karras", "SGM Uniform"), ("dpmpp_sde", "sgm_uniform")),
+        (("DPM++ 2M", "Automatic"), ("dpmpp_2m", "karras")),
+        (("Euler a", "normal"), ("euler_ancestral", "normal")),
+        (("UniPC", "sgm uniform"), ("uni_pc", "sgm_uniform")),
+        (("dpmpp_2m_sde_gpu", "karras"), ("dpmpp_2m_sde_gpu", "karras")),
+        (("euler_ancestral_karras", None), ("euler_ancestral", "karras")),
+        (("DPM++ 2M SDE Heun", "Automatic"), ("dpmpp_2m_sde", "exponential")),
+        (("DPM++ 2M SDE Heun Karras", None), ("dpmpp_2m_sde", "karras")),
+        (("DPM++ 2M SDE Heun GPU", "Karras"), ("dpmpp_2m_sde_gpu", "karras")),
+        (("DPM++ 3M SDE Exponential", None), ("dpmpp_3m_sde", "exponential")),
+        (("DPM++ 3M SDE GPU", "Automatic"), ("dpmpp_3m_sde_gpu", "exponential")),
+        (("Restart", "Automatic"), ("heun", "karras")),
+        (("DPM2", None), ("dpm_2", "normal")),
+        (("DPM2 a", "Automatic"), ("dpm_2_ancestral", "karras")),
+        (("Unknown sampler", "Unknown"), ("euler_ancestral", "normal")),
+    ]
+    for (sampler, scheduler), expected in cases:
+        assert resolve_sampler(sampler, scheduler) == expected, (sampler, scheduler, resolve_sampler(sampler, scheduler))
+    
+    # Falling back to the default sampler is counted
+    from nodes import metrics
+    was_enabled = metrics.enabled
+    try:
+        metrics.reset_metrics()
+        metrics.enable_metrics()
+        resolve_sampler("Unknown sampler")
+        resolve_sampler("DPM++ 2M SDE Heun")
+        assert metrics.snapshot()["counters"]["sampler_fallbacks_total"] == [({"sampler": "Unknown sampler"}, 1)]
+    finally:
+        metrics.enable_metrics(was_enabled)
+        metrics.reset_metrics()
+    for sampler in COMFYUI_SAMPLERS:
+        assert resolve_sampler(sampler)[0] == sampler
+    
+    workflow = WorkflowGeneratorNode().build_workflow({"sampler": "DPM++ 2M Karras", "scheduler": "normal"})
+    assert (workflow["3"]["inputs"]["sampler_name"], workflow["3"]["inputs"]["scheduler"]) == ("dpmpp_2m", "karras")
+    print("✓ Combined sampler names resolved")
+
+
+def test_workflow_sweep():
+    """Test sweep axis parsing and the separate and merged sweep outputs"""
+    
+    import json
+    from collections import Counter
+    from nodes.workflow_sweep import WorkflowSweepNode, iter_sweep_workflows, parse_sweep_axes
+    
+    print("\n\n6. Testing parameter sweeps...")
+    
+    axes = parse_sweep_axes("seed: 1-3; CFG: 5, 7.5\nlora:style_anime: 0.5-1.0 [2]\nsteps: 20-40 (+10)")
+    assert [(axis.name, axis.values) for axis in axes] == [
+        ("seed", (1, 2, 3)), ("cfg", (5.0, 7.5)), ("lora:style_anime", (0.5, 1.0)), ("steps", (20, 30, 40))
+    ]
+    assert parse_sweep_axes({"seed": range(2)})[0].values == (0, 1)
+    for spec in ("bogus: 1", "seed: a, b", "seed: 5-1 (+1)", "size: 512", "seed: 1; seed: 2"):
+        try:
+            parse_sweep_axes(spec)
+        except ValueError as e:
+            print(f"  rejected: {e}")
+        else:
+            raise AssertionError(f"Invalid sweep spec was accepted: {spec}")
+    
+    parsed_data = {
+        "positive_prompt": "1girl", "negative_prompt": "ugly", "seed": 7, "steps": 20, "cfg_scale": 7.0,
+        "sampler": "Euler a", "size": "512x768",
+        "loras": [
+            {"name": "character_v1", "strength": 0.8, "strength_clip": 0.8, "type": "lora"},
+            {"name": "style_anime", "strength": 1.0, "strength_clip": 1.0, "type": "lora"},
+        ],
+    }
+    axes = parse_sweep_axes("seed: 1-3\nlora:style_anime: 0.5, 1.0")
+    
+    workflows = list(iter_sweep_workflows(parsed_data, axes, "model.safetensors"))
+    assert len(workflows) == 6
+    assert [workflow["3"]["inputs"]["seed"] for workflow in workflows] == [1, 1, 2, 2, 3, 3]
+    assert parsed_data["loras"][1]["strength"] == 1.0
+    
+    node = WorkflowSweepNode()
+    workflow_json, merged, count = node.generate_sweep(parsed_data, "seed: 1-3\nlora:style_anime: 0.5, 1.0",
+                                                       "merged", "model.safetensors", "vae.safetensors")
+    assert count == 6 and json.loads(workflow_json) == merged
+    
+    class_types = Counter(node["class_type"] for node in merged.values())
+    print(f"  merged: {len(merged)} nodes, {dict(class_types)}")
+    assert class_types["KSampler"] == 6 and class_types["SaveImage"] == 6
+    # One checkpoint and VAE, the first LoRA once and the swept one per strength
+    assert class_types["CheckpointLoaderSimple"] == 1 and class_types["VAELoader"] == 1
+    assert class_types["LoraLoader"] == 3
+    for node_data in merged.values():
+        for value in node_data["inputs"].values():
+            if isinstance(value, list):
+                assert value[0] in merged
+    
+    _, separate, count = node.generate_sweep(parsed_data, "cfg: 5, 7", "separate")
+    assert count == 2 and [workflow["3"]["inputs"]["cfg"] for workflow in separate] == [5.0, 7.0]
+    
+    _, failed, count = node.generate_sweep(parsed_data, "lora:missing: 1")
+    assert count == 0 and "error" in failed
+
+
+def test_merge_workflows():
+    """Test loader sharing when merging generated workflows"""
+    
+    from collections import Counter
+    from nodes.workflow_generator import WorkflowGeneratorNode
+    from nodes.workflow_graph import merge_workflows
+    from nodes.workflow_merge import WorkflowMergeNode
+    
+    print("\n\n7. Testing workflow merging...")
+    
+    generator = WorkflowGeneratorNode()
+    loras = [{"name": "character_v1", "strength": 0.8, "type": "lora"}, {"name": "style_anime", "strength": 1.0, "type": "lora"}]
+    first = generator.build_workflow({"seed": 1, "loras": loras}, "model.safetensors", "vae.safetensors")
+    # Same checkpoint and first LoRA, different second LoRA strength
+    second = generator.build_workflow({"seed": 2, "loras": [loras[0], dict(loras[1], strength=0.5)]},
+                                      "model.safetensors", "vae.safetensors", "advanced")
+    # Other checkpoint: nothing to share but the VAE
+    third = generator.build_workflow({"seed": 3, "loras": loras}, "other.safetensors", "vae.safetensors")
+    
+    merged = merge_workflows([first, second, third], labels=["a", "b", "c"])
+    class_types = Counter(node["class_type"] for node in merged.values())
+    print(f"  merged: {len(merged)} nodes, {dict(class_types)}")
+    assert class_types["CheckpointLoaderSimple"] == 2
+    assert class_types["VAELoader"] == 1
+    assert class_types["LoraLoader"] == 5
+    assert class_types["KSampler"] == 4
+    assert len(merged) == len(first) + len(second) + len(third) - 4
+    
+    # Every sampler still sees its own LoRA chain
+    for node in merged.values():
+        if node["class_type"] == "KSampler" and not node["_meta"]["title"].startswith("KSampler (Upscale)"):
+            strengths = []
+            node_id = node["inputs"]["model"][0]
+            while merged[node_id]["class_type"] == "LoraLoader":
+                strengths.append(merged[node_id]["inputs"]["strength_model"])
+                node_id = merged[node_id]["inputs"]["model"][0]
+            expected = {"a": [1.0, 0.8], "b": [0.5, 0.8], "c": [1.0, 0.8]}[node["_meta"]["title"][-2]]
+            assert strengths == expected
+    
+    # Duplicate loaders inside one workflow collapse as well
+    duplicated = dict(first)
+    duplicated["40"] = dict(first["4"])
+    duplicated["6"] = dict(first["6"], inputs=dict(first["6"]["inputs"], clip=["40", 1]))
+    assert sum(node["class_type"] == "CheckpointLoaderSimple" for node in merge_workflows([duplicated]).values()) == 1
+    
+    _, node_output = WorkflowMergeNode().merge(first, [second, generator._get_empty_workflow()], None, third)
+    assert node_output == merge_workflows([first, second, third])
+
 if __name__ == "__main__":
     print("ComfyUI Metadata2Workflow Plugin - Test Suite")
     print("=" * 60)
@@ -245,14 +1040,28 @@ if __name__ == "__main__":
         test_complex_metadata_parsing()
         test_lora_metadata_parsing()
         test_edge_cases()
+        test_network_tag_variants()
+        test_keep_unknown_params()
+        test_lazy_parsed_metadata()
+        test_metrics()
+        test_metadata_formats()
+        test_parse_many()
+        test_parse_cache()
+        test_register_parameter()
         test_workflow_generator()
         test_workflow_generator_with_loras()
+        test_workflow_output_formats()
+        test_sampler_resolution()
+        test_workflow_templates()
+        test_workflow_graph()
+        test_workflow_sweep()
+        test_merge_workflows()
         
         print("\n" + "="*60)
         print("All tests completed successfully!")
         print("LoRA support has been successfully implemented!")
         print("="*60)
-        
+    
     except Exception as e:
         print(f"\nTest failed with error: {e}")
         import traceback